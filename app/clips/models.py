@@ -1,6 +1,7 @@
 # app/clips/models.py
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy import Integer, String, DateTime, ForeignKey, func, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from app.db.base import Base
 
 
@@ -18,6 +19,33 @@ class Clip(Base):
     # ruta relativa dentro de /media (ej: "clips/xxxx.mp4")
     media_path: Mapped[str] = mapped_column(String(255), nullable=False)
 
+    # 🧬 asset de media compartido (dedupe por contenido). NULL = clip viejo
+    asset_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("media_assets.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
+
+    # 📦 estado del archivo (processing/ready/failed), ver app/media/status.py
+    media_status: Mapped[str] = mapped_column(
+        String(16),
+        nullable=False,
+        server_default="ready",
+    )
+
+    # 🎬 HLS del clip (None = no aplica / clip viejo → MP4)
+    hls_status: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    # carpeta en /hls/<hls_key>/ (clave del asset)
+    hls_key: Mapped[str | None] = mapped_column(String(80), nullable=True)
+
+    # 🖼️ poster / preview animado (rutas en /media, copiadas del asset)
+    poster_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    preview_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    # 🖼️ imágenes: variantes WebP por ancho (copiadas del asset)
+    media_variants: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
     # id de la canción asociada (opcional)
     music_track_id: Mapped[str | None] = mapped_column(
         String(64),
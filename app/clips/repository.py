@@ -5,14 +5,32 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.clips.models import Clip, ClipView, ClipStar
 from app.users.models import User
 from app.profile.models import Profile
+from app.media.status import MEDIA_READY
 
 
 async def create_clip(
     db: AsyncSession,
     user_id: int,
     media_path: str,
+    media_status: str = MEDIA_READY,
+    asset_id: int | None = None,
+    hls_status: str | None = None,
+    hls_key: str | None = None,
+    poster_path: str | None = None,
+    preview_path: str | None = None,
+    media_variants: dict | None = None,
 ) -> Clip:
-    clip = Clip(user_id=user_id, media_path=media_path)
+    clip = Clip(
+        user_id=user_id,
+        media_path=media_path,
+        media_status=media_status,
+        asset_id=asset_id,
+        hls_status=hls_status,
+        hls_key=hls_key,
+        poster_path=poster_path,
+        preview_path=preview_path,
+        media_variants=media_variants,
+    )
     db.add(clip)
     await db.flush()
     await db.refresh(clip)
@@ -50,12 +68,14 @@ async def list_clips_with_authors(
 ):
     """
     Lista global de clips (vibes) , más recientes primero.
+    Solo clips con media lista (los que se procesan no salen).
     Devuelve filas (Clip, User, Profile | None).
     """
     q = (
         select(Clip, User, Profile)
         .join(User, User.id == Clip.user_id)
         .outerjoin(Profile, Profile.user_id == User.id)
+        .where(Clip.media_status == MEDIA_READY)
         .order_by(desc(Clip.created_at))
         .limit(limit)
         .offset(offset)
@@ -69,9 +89,11 @@ async def list_clips_by_user(
     user_id: int,
     limit: int = 32,
     offset: int = 0,
+    only_ready: bool = True,
 ):
     """
     Lista de clips (vibes) de UN usuario, más recientes primero.
+    only_ready=False → incluye los que aún se procesan (clips propios).
     Devuelve filas (Clip, User, Profile | None).
     """
     q = (
@@ -83,6 +105,8 @@ async def list_clips_by_user(
         .limit(limit)
         .offset(offset)
     )
+    if only_ready:
+        q = q.where(Clip.media_status == MEDIA_READY)
     res = await db.execute(q)
     return res.all()
 
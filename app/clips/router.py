@@ -6,6 +6,7 @@ from fastapi import (
     Depends,
     UploadFile,
     File,
+    Form,
     HTTPException,
     Query,
 )
@@ -17,11 +18,21 @@ from app.db.session import get_session
 from app.core.security import decode_access_token
 from app.users.models import User
 from app.profile.models import Profile
-from app.media.storage import save_clip_media, delete_post_media
+from app.media.storage import stage_clip_media, delete_post_media, UploadTooLarge
+from app.media.jobs import enqueue_asset_ingest, asset_progress
+from app.media.queue import media_queue
+from app.media.repository import release_asset, sync_from_asset
+from app.media.service import acquire_staged_asset, asset_hls_key, delete_asset_files
+from app.media.status import MEDIA_PROCESSING, HLS_READY
+from app.media.hls import hls_master_rel
+from app.media.images import variant_urls
+from app.media.router import upload_http_error
+from app.media.uploads import UploadSessionError, finalize_upload
 from app.clips import repository as repo
 from app.clips.models import Clip, ClipStar
 from app.clips.schemas import (
     ClipOut,
+    ClipStatusOut,
     ClipAuthorOut,
     ClipMusicIn,
     ClipMusicOut,
@@ -86,14 +97,23 @@ def _author_from(user: User, profile: Profile | None) -> ClipAuthorOut:
         id=user.id,
         username=user.username,
         avatar=avatar,
+        avatar_variants=variant_urls(getattr(profile, "avatar_variants", None), ""),
     )
 
 
 def _clip_media_rel(clip: Clip) -> str:
-    # lo que el front espera como `media`
+    # lo que el front espera como `media`: el master HLS cuando está listo
+    # (hls/<key>/master.m3u8); mientras tanto, el MP4
+    if clip.hls_status == HLS_READY and clip.hls_key:
+        return hls_master_rel(clip.hls_key)
     return f"media/{clip.media_path}"
 
 
+def _clip_file_rel(rel: str | None) -> str | None:
+    # poster/preview: mismo formato que `media` (media/clips/...)
+    return f"media/{rel}" if rel else None
+
+
 async def _user_starred_clip(
     db: AsyncSession, clip_id: int, user_id: int
 ) -> bool:
@@ -110,13 +130,52 @@ async def _user_starred_clip(
 
 @router.post("/", response_model=ClipOut)
 async def create_clip_view(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    upload_id: str | None = Form(None),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_session),
 ):
-    media_rel = save_clip_media(file)
-    clip = await repo.create_clip(db, user_id=user.id, media_path=media_rel)
+    # upload → _tmp por bloques (hash + límite al vuelo), o upload_id de una
+    # subida reanudable ya completa (app/media/uploads.py). Si el mismo
+    # archivo ya se subió se reutiliza su asset; los videos nuevos se
+    # normalizan en segundo plano y el clip nace en media_status="processing"
+    try:
+        if upload_id:
+            staged = await finalize_upload(db, upload_id, user.id, "clip")
+        elif file is not None:
+            staged = await stage_clip_media(file)
+        else:
+            raise HTTPException(status_code=400, detail="file or upload_id required")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadSessionError as e:
+        raise upload_http_error(e)
+    asset, needs_job = await acquire_staged_asset(db, staged)
+
+    clip = await repo.create_clip(
+        db,
+        user_id=user.id,
+        media_path=asset.media_path,
+        media_status=asset.status,
+        asset_id=asset.id,
+        hls_status=asset.hls_status,
+        hls_key=asset_hls_key(asset) if staged.is_video else None,
+        poster_path=asset.poster_path,
+        preview_path=asset.preview_path,
+        media_variants=asset.variants,
+    )
+    if needs_job:
+        await enqueue_asset_ingest(db, asset.id, staged.path, asset.media_path, "clip")
     await db.commit()
+
+    if needs_job:
+        media_queue.notify()
+    elif clip.media_status == MEDIA_PROCESSING:
+        # asset reutilizado aún en proceso (ver publish en feed)
+        await sync_from_asset(db, Clip, clip.id)
+        await db.commit()
+        await db.refresh(clip)
+
     return ClipOut(
         id=clip.id,
         media=_clip_media_rel(clip),
@@ -124,6 +183,10 @@ async def create_clip_view(
         author=_author_from(user, getattr(user, "profile", None)),
         stars_count=0,
         starred=False,
+        media_status=clip.media_status,
+        poster=_clip_file_rel(clip.poster_path),
+        preview=_clip_file_rel(clip.preview_path),
+        media_variants=variant_urls(clip.media_variants, "media/"),
     )
 
 
@@ -148,6 +211,10 @@ async def list_clips_view(
                 author=_author_from(author, profile),
                 stars_count=total_stars,
                 starred=starred,
+                media_status=clip.media_status,
+                poster=_clip_file_rel(clip.poster_path),
+                preview=_clip_file_rel(clip.preview_path),
+                media_variants=variant_urls(clip.media_variants, "media/"),
             )
         )
     return out
@@ -172,6 +239,10 @@ async def my_latest_clip_view(
         author=_author_from(user, getattr(user, "profile", None)),
         stars_count=total_stars,
         starred=starred,
+        media_status=clip.media_status,
+        poster=_clip_file_rel(clip.poster_path),
+        preview=_clip_file_rel(clip.preview_path),
+        media_variants=variant_urls(clip.media_variants, "media/"),
     )
 
 
@@ -183,7 +254,14 @@ async def clips_by_user_view(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_session),
 ):
-    rows = await list_clips_by_user(db, user_id=user_id, limit=limit, offset=offset)
+    # los clips propios que aún se procesan también salen
+    rows = await list_clips_by_user(
+        db,
+        user_id=user_id,
+        limit=limit,
+        offset=offset,
+        only_ready=user_id != current_user.id,
+    )
 
     out: list[ClipOut] = []
     for clip, author, profile in rows:
@@ -198,11 +276,39 @@ async def clips_by_user_view(
                 author=_author_from(author, profile),
                 stars_count=total_stars,
                 starred=starred,
+                media_status=clip.media_status,
+                poster=_clip_file_rel(clip.poster_path),
+                preview=_clip_file_rel(clip.preview_path),
+                media_variants=variant_urls(clip.media_variants, "media/"),
             )
         )
     return out
 
 
+@router.get("/{clip_id}/status/", response_model=ClipStatusOut)
+async def clip_status_view(
+    clip_id: int,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Estado del procesamiento del clip (para hacer polling tras subirlo).
+    """
+    clip = await get_clip_by_id(db, clip_id)
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip no encontrado")
+
+    progress = await asset_progress(db, clip.asset_id)
+    return ClipStatusOut(
+        clip_id=clip.id,
+        media_status=clip.media_status,
+        hls_status=clip.hls_status,
+        stage=progress.get("stage"),
+        error=progress.get("error"),
+        progress=progress.get("progress"),
+    )
+
+
 @router.delete("/{clip_id}/")
 async def delete_clip_view(
     clip_id: int,
@@ -217,12 +323,19 @@ async def delete_clip_view(
         raise HTTPException(status_code=403, detail="No puedes eliminar este clip")
 
     media_rel = clip.media_path
+    asset_id = clip.asset_id
     await db.delete(clip)
+    await db.flush()
+    released = await release_asset(db, asset_id) if asset_id else None
     await db.commit()
 
-    # borrar archivo físico (opcional)
+    # borrar archivo físico (opcional); con asset, solo si era la última referencia
     try:
-        delete_post_media(media_rel)
+        if asset_id:
+            if released is not None:
+                delete_asset_files(released)
+        else:
+            delete_post_media(media_rel)
     except Exception:
         pass
 
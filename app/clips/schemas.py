@@ -1,12 +1,16 @@
 # app/clips/schemas.py
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Any
+
+from app.media.schemas import ImageVariant
 
 
 class ClipAuthorOut(BaseModel):
     id: int
     username: str
     avatar: str | None = None
+    avatar_variants: list[ImageVariant] | None = None
 
     class Config:
         from_attributes = True
@@ -22,10 +26,35 @@ class ClipOut(BaseModel):
     stars_count: int = 0
     starred: bool = False
 
+    # 📦 processing → el video aún se normaliza
+    # (media = hls/<key>/master.m3u8 cuando el HLS está listo; si no, el MP4)
+    media_status: str = "ready"
+
+    # 🖼️ poster JPEG y preview animado WebP (media/...); None si no hay
+    poster: str | None = None
+    preview: str | None = None
+
+    # 🖼️ clips de imagen: versiones WebP (media/..., de menor a mayor)
+    media_variants: list[ImageVariant] | None = None
+
     class Config:
         from_attributes = True
 
 
+class ClipStatusOut(BaseModel):
+    """
+    Estado del procesamiento del clip.
+    stage: queued | probing | transcoding | thumbnails | failed (None si no hay job en curso).
+    """
+    clip_id: int
+    media_status: str
+    hls_status: str | None = None
+    stage: str | None = None
+    error: str | None = None
+    # 📈 FFmpeg: percent, speed, wall, cpu, runs[], outputs{}
+    progress: dict[str, Any] | None = None
+
+
 class ClipMusicIn(BaseModel):
     # id de la canción (string) o null para limpiar
     track_id: str | None = None
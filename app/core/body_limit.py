@@ -0,0 +1,72 @@
+# app/core/body_limit.py
+"""
+Middleware ASGI que corta requests con body demasiado grande MIENTRAS se
+reciben (antes de que Starlette termine de parsear/spoolear el multipart).
+
+- Si viene Content-Length y ya se pasa → 413 sin leer el body.
+- Si no (chunked), cuenta bytes de cada mensaje http.request y corta
+  en cuanto supera el máximo.
+"""
+from __future__ import annotations
+
+from app.core.json import UTF8JSONResponse
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class MaxBodySizeMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, scope, receive, send):
+        response = UTF8JSONResponse({"detail": "upload too large"}, status_code=413)
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    if int(value) > self.max_bytes:
+                        await self._reject(scope, receive, send)
+                        return
+                except ValueError:
+                    pass
+                break
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if exceeded:
+                # el parser pudo convertir el corte en otro error (p.ej. 400):
+                # la respuesta que vale es el 413
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded and not started:
+            await self._reject(scope, receive, send)
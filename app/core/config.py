@@ -14,9 +14,73 @@ class Settings(BaseSettings):
 
     # ⚙️ HLS local (para video tipo TikTok/Instagram sin pagar CDN)
     HLS_DIR: str = "./media/hls"
-    HLS_SEG_SECONDS: int = 2              # duración de cada segmento .ts
+    HLS_SEG_SECONDS: int = 2              # duración de cada segmento
     HLS_USE_LADDER: bool = True           # True: 240/360/480p (ABR). False: 1 calidad
+    HLS_SINGLE_FILE: bool = False         # True: 1 archivo fMP4 por calidad (EXT-X-BYTERANGE)
     HLS_FAST_TRANSCODE: bool = True       # preset "veryfast" para que sea rápido
+    HLS_SINGLE_DECODE: bool = True        # ladder en 1 solo FFmpeg (decodifica 1 vez)
+    HLS_CRF: int = 23                     # calidad objetivo; el bitrate del ladder es el tope
+    HLS_X264_TUNE: str = ""               # film / animation / stillimage… ("" = según contenido)
+    CLIP_HLS_SEG_SECONDS: int = 1         # clips: segmentos cortos (arranque rápido al deslizar)
+
+    # 🖼️ Poster (JPEG) + preview animado (WebP) de cada video, en el job de media
+    POSTER_MAX_WIDTH: int = 720
+    PREVIEW_SECONDS: int = 3
+    PREVIEW_HEIGHT: int = 240
+    PREVIEW_FPS: int = 10
+
+    # 🖼️ Variantes WebP de imágenes (posts, clips, avatares); requiere Pillow
+    IMAGE_VARIANT_WIDTHS: str = "96,320,640,1080"
+    IMAGE_VARIANT_QUALITY: int = 80
+
+    # 📤 Límites de subida (MB). MAX_UPLOAD_MB corta cualquier request más
+    # grande mientras llega; los otros se aplican por tipo al guardar.
+    MAX_UPLOAD_MB: int = 512
+    MAX_VIDEO_UPLOAD_MB: int = 500
+    MAX_IMAGE_UPLOAD_MB: int = 25
+
+    # 📇 Cache de stat/ETag de /media y /hls (app/media/cache.py). 0 = desactivado
+    MEDIA_STAT_CACHE_SIZE: int = 20000
+    # 🔥 Objetos chicos y calientes en RAM (segmentos, playlists, avatares).
+    # Presupuesto por proceso; 0 = desactivado
+    MEDIA_MEMORY_CACHE_MB: int = 0
+    MEDIA_MEMORY_CACHE_MAX_OBJECT_KB: int = 1024
+
+    # 📶 Subidas reanudables (app/media/uploads.py): sesión + PUT por bloques
+    UPLOAD_CHUNK_MAX_MB: int = 16              # tope de cada PUT
+    UPLOAD_SESSION_TTL_HOURS: float = 24.0     # sin recibir bloques → expira
+    UPLOAD_SESSION_REAP_SECONDS: float = 600.0 # cada cuánto se borran las expiradas
+
+    # 🧵 Cola de procesamiento de videos subidos (tabla media_jobs):
+    # workers fijos (FFmpeg fuera del event loop), reintentos con backoff.
+    # Presupuesto de CPU (app/media/scheduler.py): 0 = automático según cores
+    MEDIA_INGEST_WORKERS: int = 0             # jobs en paralelo
+    MEDIA_FFMPEG_THREADS: int = 0             # hilos por job de FFmpeg
+    MEDIA_RESERVED_CORES: int = 1             # cores que FFmpeg deja a la API
+    MEDIA_FFMPEG_NICE: int = 10               # prioridad de CPU (0 = normal)
+    MEDIA_FFMPEG_IONICE: bool = True          # prioridad de disco baja (Linux)
+    MEDIA_JOB_MAX_ATTEMPTS: int = 3
+    MEDIA_JOB_RETRY_SECONDS: float = 30.0     # 30s, 60s, 120s... (tope 1h)
+    MEDIA_JOB_POLL_SECONDS: float = 5.0
+    MEDIA_JOB_HEARTBEAT_SECONDS: float = 15.0 # latido de los jobs `running`
+    MEDIA_JOB_STALE_SECONDS: float = 120.0    # sin latido → el dueño murió
+
+    # 🧹 Barrido de archivos huérfanos (app/media/sweeper.py): media y HLS
+    # en disco que ya no referencia ninguna fila. 0 = sin task periódico
+    # (se puede correr igual a mano: python -m app.media.sweeper)
+    MEDIA_SWEEP_INTERVAL_HOURS: float = 0.0
+    MEDIA_SWEEP_DELETE: bool = False          # False = solo reporta (dry-run)
+    MEDIA_SWEEP_MIN_AGE_HOURS: float = 24.0   # no toca nada más nuevo que esto
+    MEDIA_SWEEP_BATCH: int = 500              # entradas de disco / filas por lote
+    MEDIA_SWEEP_DELETES_PER_SECOND: float = 50.0
+
+    # 👀 Vistas de posts (write-behind): cada cuánto se vuelcan a la DB
+    VIEWS_FLUSH_SECONDS: float = 2.0
+    VIEWS_FLUSH_MAX_PENDING: int = 10000  # si se acumulan más, flush inmediato
+
+    # 🃏 Cache de cards del feed (compartido entre viewers). 0 = desactivado
+    POST_CARD_CACHE_SIZE: int = 5000
+    POST_CARD_CACHE_TTL: float = 60.0
 
     # 👇 Compatibilidad Tenor / GIFs (aunque ahora uses servicio local)
     TENOR_API_KEY: str = "LIVDSRZULELA"
@@ -31,5 +95,9 @@ class Settings(BaseSettings):
             return ["*"]
         return [o.strip() for o in self.ALLOWED_ORIGINS.split(",") if o.strip()]
 
+    @property
+    def image_variant_widths(self) -> List[int]:
+        return sorted({int(w) for w in self.IMAGE_VARIANT_WIDTHS.split(",") if w.strip()})
+
 
 settings = Settings()
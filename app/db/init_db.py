@@ -1,5 +1,6 @@
 # app/db/init_db.py
 import logging
+from sqlalchemy import text
 from app.db.session import engine
 from app.db.base import Base
 
@@ -9,17 +10,92 @@ from app.profile.models import Profile
 from app.feed.models import Post, PostStar
 from app.comments.models import Comment
 from app.clips.models import Clip, ClipView, ClipStar  # 👈 IMPORTANTE
+from app.media.models import MediaAsset, MediaJob, UploadSession
 
 log = logging.getLogger("uvicorn")
 
 
+# 👇 create_all NO altera tablas que ya existen (ni les crea índices nuevos).
+# Aquí van los cambios de esquema sobre tablas existentes, siempre idempotentes
+# (IF NOT EXISTS) porque se ejecutan en cada arranque.
+_SCHEMA_PATCHES: list[str] = [
+    # paginación keyset del feed
+    "CREATE INDEX IF NOT EXISTS ix_posts_created_at_id "
+    "ON posts (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_posts_user_created_at_id "
+    "ON posts (user_id, created_at DESC, id DESC)",
+    # ⭐ contador denormalizado de estrellas (backfill solo la primera vez)
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'posts' AND column_name = 'stars_count'
+        ) THEN
+            ALTER TABLE posts ADD COLUMN stars_count INTEGER NOT NULL DEFAULT 0;
+            UPDATE posts p SET stars_count = (
+                SELECT count(*) FROM post_stars s WHERE s.post_id = p.id
+            );
+        END IF;
+    END $$
+    """,
+    # 🎬 estado del HLS (lo rellena backfill_hls_status al arrancar)
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS hls_status VARCHAR(16)",
+    # 📦 estado del procesamiento de media (lo existente ya está listo)
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS media_status VARCHAR(16) "
+    "NOT NULL DEFAULT 'ready'",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS media_status VARCHAR(16) "
+    "NOT NULL DEFAULT 'ready'",
+    # 🧬 media deduplicada por contenido (media_assets la crea create_all)
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS asset_id INTEGER "
+    "REFERENCES media_assets(id) ON DELETE SET NULL",
+    "CREATE INDEX IF NOT EXISTS ix_posts_asset_id ON posts (asset_id)",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS hls_key VARCHAR(80)",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS asset_id INTEGER "
+    "REFERENCES media_assets(id) ON DELETE SET NULL",
+    "CREATE INDEX IF NOT EXISTS ix_clips_asset_id ON clips (asset_id)",
+    # 🔎 ffprobe del original (ladder adaptativo)
+    "ALTER TABLE media_assets ADD COLUMN IF NOT EXISTS probe JSONB",
+    # 🎬 HLS de clips
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS hls_status VARCHAR(16)",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS hls_key VARCHAR(80)",
+    # 🖼️ poster + preview animado de videos
+    "ALTER TABLE media_assets ADD COLUMN IF NOT EXISTS poster_path VARCHAR(255)",
+    "ALTER TABLE media_assets ADD COLUMN IF NOT EXISTS preview_path VARCHAR(255)",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS poster_path VARCHAR(255)",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS preview_path VARCHAR(255)",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS poster_path VARCHAR(255)",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS preview_path VARCHAR(255)",
+    # 🖼️ variantes WebP de imágenes (app/media/images.py)
+    "ALTER TABLE media_assets ADD COLUMN IF NOT EXISTS variants JSONB",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS media_variants JSONB",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS media_variants JSONB",
+    "ALTER TABLE profiles ADD COLUMN IF NOT EXISTS avatar_variants JSONB",
+    # 📈 progreso/métricas de FFmpeg por job
+    "ALTER TABLE media_jobs ADD COLUMN IF NOT EXISTS progress JSONB",
+    # 💓 dueño + heartbeat de los jobs `running` (requeue sin pisar a otros procesos)
+    "ALTER TABLE media_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR(120)",
+    "ALTER TABLE media_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ",
+]
+
+
 async def init_models():
     """
-    Crea/verifica todas las tablas declaradas en Base.metadata
+    Crea/verifica todas las tablas declaradas en Base.metadata y aplica
+    _SCHEMA_PATCHES, cada uno en su propia transacción. Si algo falla se
+    aborta el arranque: la app no debe levantar contra el esquema viejo.
     """
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
-        log.info("✅ DB init: tablas creadas/verificadas.")
     except Exception as e:
-        log.error(f"❌ DB init falló: {e!r}")
+        log.error(f"❌ DB init falló (create_all): {e!r}")
+        raise
+    for stmt in _SCHEMA_PATCHES:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(stmt))
+        except Exception as e:
+            log.error(f"❌ DB init falló en el patch {' '.join(stmt.split())[:80]!r}: {e!r}")
+            raise
+    log.info("✅ DB init: tablas creadas/verificadas.")
@@ -0,0 +1,117 @@
+# app/feed/cache.py
+"""
+Cache de "tarjetas" de post (lo que devuelve hydrate_post_out), compartido
+entre viewers.
+
+Casi todo el card (autor, avatar, media, caption, caption_meta) es igual
+para todos; lo único que depende del viewer es `starred`, que se rellena
+aparte con una query barata (overlay). Los contadores (views_count,
+stars_count) también se pisan con los de la fila recién leída.
+
+- LRU acotado (POST_CARD_CACHE_SIZE) + TTL (POST_CARD_CACHE_TTL segundos).
+- Invalidación explícita: edición, borrado, toggle de ⭐, cambio de HLS
+  y subida de avatar (por autor).
+- Es por proceso: con varios workers el TTL acota lo desactualizado.
+"""
+from __future__ import annotations
+
+import time
+import threading
+from collections import OrderedDict
+
+from app.core.config import settings
+
+
+class PostCardCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[int, tuple[float, int, dict]] = OrderedDict()
+        self._by_author: dict[int, set[int]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def _drop(self, post_id: int) -> None:
+        entry = self._data.pop(post_id, None)
+        if entry is None:
+            return
+        author_posts = self._by_author.get(entry[1])
+        if author_posts is not None:
+            author_posts.discard(post_id)
+            if not author_posts:
+                del self._by_author[entry[1]]
+
+    def get(self, post_id: int) -> dict | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(post_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, card = entry
+            if expires_at <= time.monotonic():
+                self._drop(post_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(post_id)
+            self.hits += 1
+            return card
+
+    def put(self, post_id: int, author_id: int, card: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._drop(post_id)
+            self._data[post_id] = (time.monotonic() + self.ttl, author_id, card)
+            self._by_author.setdefault(author_id, set()).add(post_id)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, post_id: int) -> None:
+        with self._lock:
+            if post_id in self._data:
+                self._drop(post_id)
+                self.invalidations += 1
+
+    def invalidate_author(self, user_id: int) -> None:
+        """
+        Borra todos los cards de un autor (p.ej. cambió su avatar).
+        """
+        with self._lock:
+            for post_id in list(self._by_author.get(user_id, ())):
+                self._drop(post_id)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+post_card_cache = PostCardCache(
+    maxsize=settings.POST_CARD_CACHE_SIZE,
+    ttl=settings.POST_CARD_CACHE_TTL,
+)
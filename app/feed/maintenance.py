@@ -0,0 +1,20 @@
+# app/feed/maintenance.py
+"""
+Tareas de mantenimiento del feed (se corren a mano o por cron):
+
+    python -m app.feed.maintenance
+"""
+import asyncio
+
+from app.db.session import AsyncSessionLocal
+from app.feed.repository import reconcile_post_stars
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        fixed = await reconcile_post_stars(db)
+    print(f"⭐ posts.stars_count reconciliado: {fixed} posts corregidos")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,6 +7,7 @@ from sqlalchemy import (
     func,
     ForeignKey,
     UniqueConstraint,
+    Index,
 )
 from sqlalchemy.types import UnicodeText
 from sqlalchemy.dialects.postgresql import JSONB  # 👈 JSONB para meta de caption
@@ -23,6 +24,16 @@ class Post(Base):
     # ruta relativa en /media (p.ej. "posts/abc.mp4")
     media_path: Mapped[str] = mapped_column(String(255), nullable=False)
 
+    # 🧬 asset de media compartido (dedupe por contenido). NULL = post viejo
+    asset_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("media_assets.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
+    # carpeta en /hls/<hls_key>/ (NULL = posts viejos → /hls/<id>/)
+    hls_key: Mapped[str | None] = mapped_column(String(80), nullable=True)
+
     # Texto “crudo” del caption (para compatibilidad con el front actual)
     caption: Mapped[str | None] = mapped_column(UnicodeText, nullable=True)
 
@@ -30,11 +41,44 @@ class Post(Base):
     caption_meta: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
 
     views_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # 📦 estado del archivo principal (processing/ready/failed): los videos se
+    # normalizan fuera del request → el post nace en "processing"
+    media_status: Mapped[str] = mapped_column(
+        String(16), nullable=False, server_default="ready"
+    )
+
+    # 🎬 estado del HLS (pending/processing/ready/failed); lo actualiza el job
+    # de app/media/jobs.py → el feed no tiene que mirar el disco
+    hls_status: Mapped[str | None] = mapped_column(String(16), nullable=True)
+
+    # 🖼️ poster / preview animado (rutas en /media, copiadas del asset)
+    poster_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    preview_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    # 🖼️ imágenes: variantes WebP por ancho (copiadas del asset)
+    media_variants: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    # ⭐ contador de estrellas (denormalizado, se mantiene en toggle_post_star)
+    stars_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default="0"
+    )
+
     created_at: Mapped["DateTime"] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
 
 
+# 👇 paginación keyset del feed: ORDER BY created_at DESC, id DESC
+Index("ix_posts_created_at_id", Post.created_at.desc(), Post.id.desc())
+Index(
+    "ix_posts_user_created_at_id",
+    Post.user_id,
+    Post.created_at.desc(),
+    Post.id.desc(),
+)
+
+
 class PostStar(Base):
     """
     Reacción ⭐ de un usuario sobre un post.
@@ -1,7 +1,21 @@
 # app/feed/repository.py
-from sqlalchemy import select, desc, func, delete
+from datetime import datetime
+
+from sqlalchemy import (
+    select,
+    desc,
+    func,
+    delete,
+    update,
+    tuple_,
+    values,
+    column,
+    Integer,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.feed.models import Post, PostStar
+from app.media.status import MEDIA_READY
 from app.users.models import User
 from app.profile.models import Profile
 
@@ -15,12 +29,26 @@ async def create_post(
     media_path: str,
     caption: str | None,
     caption_meta: dict | None = None,  # 👈 NUEVO
+    media_status: str = MEDIA_READY,
+    hls_status: str | None = None,
+    asset_id: int | None = None,
+    hls_key: str | None = None,
+    poster_path: str | None = None,
+    preview_path: str | None = None,
+    media_variants: dict | None = None,
 ):
     post = Post(
         user_id=user_id,
         media_path=media_path,
+        asset_id=asset_id,
+        hls_key=hls_key,
         caption=caption,
         caption_meta=caption_meta,  # 👈 se guarda meta (texto + estilo + fuente)
+        media_status=media_status,
+        hls_status=hls_status,
+        poster_path=poster_path,
+        preview_path=preview_path,
+        media_variants=media_variants,
     )
     db.add(post)
     await db.flush()
@@ -28,16 +56,31 @@ async def create_post(
     return post
 
 
+def _keyset_page(q, limit: int, offset: int, cursor: tuple[datetime, int] | None):
+    """
+    Orden estable (created_at DESC, id DESC) y paginación:
+    - cursor → keyset: solo filas estrictamente "después" de (created_at, id)
+    - sin cursor → OFFSET clásico (compatibilidad con el front actual)
+    Ambos modos usan los índices compuestos de `posts`.
+    """
+    q = q.order_by(desc(Post.created_at), desc(Post.id)).limit(limit)
+    if cursor is not None:
+        created_at, post_id = cursor
+        return q.where(tuple_(Post.created_at, Post.id) < tuple_(created_at, post_id))
+    return q.offset(offset)
+
+
 async def list_posts(
     db: AsyncSession,
     limit: int = 10,
     offset: int = 0,
+    cursor: tuple[datetime, int] | None = None,
 ):
-    q = (
-        select(Post)
-        .order_by(desc(Post.created_at))
-        .limit(limit)
-        .offset(offset)
+    """
+    Feed global: solo posts con media lista (los videos en proceso no salen).
+    """
+    q = _keyset_page(
+        select(Post).where(Post.media_status == MEDIA_READY), limit, offset, cursor
     )
     res = await db.execute(q)
     return list(res.scalars())
@@ -48,17 +91,17 @@ async def list_posts_by_user(
     user_id: int,
     limit: int = 30,
     offset: int = 0,
+    cursor: tuple[datetime, int] | None = None,
+    only_ready: bool = True,
 ):
     """
     Devuelve publicaciones de un usuario en orden descendente por fecha.
+    only_ready=False → incluye las que aún se procesan (perfil propio).
     """
-    q = (
-        select(Post)
-        .where(Post.user_id == user_id)
-        .order_by(desc(Post.created_at))
-        .limit(limit)
-        .offset(offset)
-    )
+    q = select(Post).where(Post.user_id == user_id)
+    if only_ready:
+        q = q.where(Post.media_status == MEDIA_READY)
+    q = _keyset_page(q, limit, offset, cursor)
     res = await db.execute(q)
     return list(res.scalars())
 
@@ -68,23 +111,68 @@ async def get_post(db: AsyncSession, post_id: int):
     return res.scalar_one_or_none()
 
 
-async def increment_views(db: AsyncSession, post_id: int) -> int:
-    res = await db.execute(select(Post).where(Post.id == post_id))
-    post = res.scalar_one_or_none()
-    if not post:
-        return 0
-    post.views_count += 1
-    await db.flush()
-    return post.views_count
+async def update_post_status(db: AsyncSession, post_id: int, **values) -> None:
+    """
+    Actualiza media_status / hls_status de un post (lo usan los jobs de media).
+    """
+    await db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_post_views(db: AsyncSession, post_id: int) -> int | None:
+    """
+    Lee solo views_count (sin cargar el Post). None si el post no existe.
+    """
+    res = await db.execute(select(Post.views_count).where(Post.id == post_id))
+    return res.scalar_one_or_none()
+
+
+async def add_post_views(db: AsyncSession, increments: dict[int, int]) -> None:
+    """
+    Aplica varios incrementos de vistas en UN solo UPDATE:
+        UPDATE posts SET views_count = views_count + v.n
+        FROM (VALUES (id, n), ...) AS v WHERE posts.id = v.id
+    Posts que ya no existen simplemente no matchean.
+    """
+    if not increments:
+        return
+    v = values(
+        column("id", Integer),
+        column("n", Integer),
+        name="v",
+    ).data(list(increments.items()))
+    await db.execute(
+        update(Post)
+        .where(Post.id == v.c.id)
+        .values(views_count=Post.views_count + v.c.n)
+        .execution_options(synchronize_session=False)
+    )
 
 
 # -------------------------
 # ⭐ STARS SOBRE POSTS
 # -------------------------
-async def count_post_stars(db: AsyncSession, post_id: int) -> int:
-    q = select(func.count()).select_from(PostStar).where(PostStar.post_id == post_id)
-    res = await db.execute(q)
-    return int(res.scalar_one() or 0)
+async def _bump_post_stars(db: AsyncSession, post_id: int, delta: int) -> int:
+    """
+    stars_count = stars_count ± 1 en la misma sentencia (sin leer antes).
+    Devuelve el nuevo total.
+    """
+    res = await db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(stars_count=func.greatest(Post.stars_count + delta, 0))
+        .returning(Post.stars_count)
+    )
+    return int(res.scalar_one_or_none() or 0)
+
+
+async def get_post_stars_count(db: AsyncSession, post_id: int) -> int:
+    res = await db.execute(select(Post.stars_count).where(Post.id == post_id))
+    return int(res.scalar_one_or_none() or 0)
 
 
 async def viewer_starred_post(
@@ -108,29 +196,77 @@ async def toggle_post_star(
     """
     Activa/desactiva la estrella de un usuario sobre un post.
     Devuelve (starred, total_stars)
+
+    El contador posts.stars_count se actualiza en la misma transacción
+    que el INSERT/DELETE de post_stars (sin COUNT(*)).
     """
-    q = select(PostStar).where(
-        PostStar.post_id == post_id,
-        PostStar.user_id == user_id,
+    # quitar (si existía)
+    res = await db.execute(
+        delete(PostStar)
+        .where(
+            PostStar.post_id == post_id,
+            PostStar.user_id == user_id,
+        )
+        .returning(PostStar.id)
     )
-    res = await db.execute(q)
-    existing = res.scalar_one_or_none()
-
-    if existing:
-        # quitar
-        await db.execute(delete(PostStar).where(PostStar.id == existing.id))
-        await db.flush()
-        total = await count_post_stars(db, post_id)
+    if res.first() is not None:
+        total = await _bump_post_stars(db, post_id, -1)
         return False, total
 
-    # crear
-    star = PostStar(post_id=post_id, user_id=user_id)
-    db.add(star)
-    await db.flush()
-    total = await count_post_stars(db, post_id)
+    # crear (ON CONFLICT: otra petición concurrente ya la creó)
+    res = await db.execute(
+        pg_insert(PostStar)
+        .values(post_id=post_id, user_id=user_id)
+        .on_conflict_do_nothing(constraint="uq_post_star")
+        .returning(PostStar.id)
+    )
+    if res.first() is None:
+        return True, await get_post_stars_count(db, post_id)
+
+    total = await _bump_post_stars(db, post_id, +1)
     return True, total
 
 
+async def reconcile_post_stars(db: AsyncSession, batch_size: int = 500) -> int:
+    """
+    Repara desvíos de posts.stars_count contra post_stars, por lotes de ids
+    (commit por lote → locks cortos). Devuelve cuántos posts se corrigieron.
+    """
+    real_count = (
+        select(func.count(PostStar.id))
+        .where(PostStar.post_id == Post.id)
+        .scalar_subquery()
+    )
+
+    fixed = 0
+    last_id = 0
+    while True:
+        res = await db.execute(
+            select(Post.id)
+            .where(Post.id > last_id)
+            .order_by(Post.id)
+            .limit(batch_size)
+        )
+        ids = list(res.scalars())
+        if not ids:
+            break
+
+        res = await db.execute(
+            update(Post)
+            .where(
+                Post.id.between(ids[0], ids[-1]),
+                Post.stars_count != real_count,
+            )
+            .values(stars_count=real_count)
+            .execution_options(synchronize_session=False)
+        )
+        fixed += res.rowcount or 0
+        await db.commit()
+        last_id = ids[-1]
+
+    return fixed
+
+
 async def list_post_stars(
     db: AsyncSession,
     post_id: int,
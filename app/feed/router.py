@@ -1,6 +1,5 @@
 # app/feed/router.py
 from typing import List
-from os.path import splitext
 
 from fastapi import (
     APIRouter,
@@ -18,22 +17,34 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.json import UTF8JSONResponse  # JSON siempre UTF-8
 from app.db.session import get_session
 from app.core.security import decode_access_token
-from app.media.storage import save_post_media, delete_post_media, VIDEO_EXTS
-from app.media.jobs import spawn_hls_build
+from app.media.storage import stage_post_media, delete_post_media, UploadTooLarge
+from app.media.jobs import enqueue_asset_ingest, asset_progress
+from app.media.queue import media_queue
+from app.media.repository import release_asset, sync_from_asset
+from app.media.service import acquire_staged_asset, asset_hls_key, delete_asset_files
+from app.media.status import MEDIA_PROCESSING
 from app.media.hls import delete_hls
+from app.media.router import upload_http_error
+from app.media.uploads import UploadSessionError, finalize_upload
+from app.feed.models import Post
 
 from app.feed.repository import (
     create_post,
     list_posts,
     list_posts_by_user,
     get_post,
-    increment_views,
+    get_post_views,
     toggle_post_star,
     list_post_stars,
 )
-from app.feed.schemas import PostOut, StarUserOut, PostUpdate
+from app.feed.views import view_buffer
+from app.feed.cache import post_card_cache
+from app.feed.schemas import PostOut, PostPage, PostStatusOut, StarUserOut, PostUpdate
 from app.feed.service import (
     hydrate_post_out,
+    hydrate_posts_out,
+    encode_cursor,
+    decode_cursor,
     normalize_caption,
     process_caption_inputs,  # 👈 IMPORTANTE: usa la lógica de estilos/fuentes
 )
@@ -56,6 +67,32 @@ def _extract_token(token: str | None, authorization: str | None) -> str:
     return token
 
 
+def _parse_cursor(cursor: str | None):
+    """
+    cursor=None → modo OFFSET (respuesta lista, como siempre).
+    cursor=""   → primera página en modo cursor.
+    cursor=XYZ  → siguiente página a partir de XYZ.
+    """
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+async def _post_page(db: AsyncSession, posts: list, limit: int, viewer_id: int):
+    """
+    Arma la respuesta del modo cursor. Los listados piden limit + 1 filas:
+    si llega la fila extra, hay página siguiente.
+    """
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    items = await hydrate_posts_out(db, posts, viewer_id=viewer_id)
+    next_cursor = encode_cursor(posts[-1]) if has_more and posts else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
 # ============ Utilidad de DEBUG =============
 @router.get("/_echo/", response_model=dict)
 async def echo_debug(q: str = Query("Hola día 🌴🏖️ — Test 🇨🇷❤️‍🔥")):
@@ -64,6 +101,14 @@ async def echo_debug(q: str = Query("Hola día 🌴🏖️ — Test 🇨🇷❤
     Devuelve el texto normalizado en NFC.
     """
     return {"echo": normalize_caption(q)}
+
+
+@router.get("/_cache/", response_model=dict)
+async def cache_stats():
+    """
+    Contadores del cache de cards (hits/misses/evictions) para dimensionarlo.
+    """
+    return post_card_cache.stats()
 # ===========================================
 
 
@@ -71,7 +116,8 @@ async def echo_debug(q: str = Query("Hola día 🌴🏖️ — Test 🇨🇷❤
 async def publish(
     caption: str | None = Form(None),
     caption_b64: str | None = Form(None),  # 👈 viene del front, base64 UTF-8
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    upload_id: str | None = Form(None),  # subida reanudable ya completa
     db: AsyncSession = Depends(get_session),
     token: str | None = Query(None),
     authorization: str | None = Header(None),
@@ -79,6 +125,8 @@ async def publish(
     """
     Publicar nueva pieza de feed (imagen o video).
     Aquí es donde tomamos el caption (texto o JSON) y generamos caption_meta.
+    El archivo llega como `file` (multipart) o como `upload_id` de una
+    subida reanudable terminada (ver app/media/uploads.py).
     """
     # 🔐 NO TOCAR: validación de token
     tok = _extract_token(token, authorization)
@@ -87,8 +135,23 @@ async def publish(
     except Exception:
         raise HTTPException(status_code=401, detail="invalid token")
 
-    # Guarda el archivo (imagen o video)
-    rel_path = save_post_media(file)
+    # Vuelca el upload a _tmp por bloques (hash + límite de tamaño al vuelo).
+    # El archivo es direccionado por contenido: si ya se subió antes se
+    # reutiliza el asset (MP4 + HLS) y no se vuelve a transcodificar.
+    # Los videos nuevos se normalizan en segundo plano y el post nace en
+    # media_status="processing".
+    try:
+        if upload_id:
+            staged = await finalize_upload(db, upload_id, user_id, "post")
+        elif file is not None:
+            staged = await stage_post_media(file)
+        else:
+            raise HTTPException(status_code=400, detail="file or upload_id required")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadSessionError as e:
+        raise upload_http_error(e)
+    asset, needs_job = await acquire_staged_asset(db, staged)
 
     # 🧠 Procesar caption (plain / JSON / base64) → (caption_str, caption_meta)
     # process_caption_inputs:
@@ -103,28 +166,40 @@ async def publish(
     post = await create_post(
         db,
         user_id=user_id,
-        media_path=rel_path,
+        media_path=asset.media_path,
         caption=caption_str,
         caption_meta=caption_meta,
+        media_status=asset.status,
+        hls_status=asset.hls_status,
+        asset_id=asset.id,
+        hls_key=asset_hls_key(asset) if staged.is_video else None,
+        poster_path=asset.poster_path,
+        preview_path=asset.preview_path,
+        media_variants=asset.variants,
     )
+    # 💡 Video: MP4 + HLS en la cola de media (durable, no bloquea a nadie);
+    # el job se confirma junto con el post
+    if needs_job:
+        await enqueue_asset_ingest(db, asset.id, staged.path, asset.media_path, "post")
     await db.commit()
 
-    # 💡 SOLO generar HLS si es un VIDEO (según extensión de rel_path)
-    try:
-        ext = splitext(rel_path)[1].lower()
-        if ext in VIDEO_EXTS:
-            spawn_hls_build(post.id, rel_path)
-    except Exception:
-        # En desarrollo puedes loguear el error si quieres
-        pass
+    if needs_job:
+        media_queue.notify()
+    elif post.media_status == MEDIA_PROCESSING:
+        # asset reutilizado que otro upload está procesando: si su job
+        # terminó antes de nuestro commit, copiamos el estado final
+        await sync_from_asset(db, Post, post.id)
+        await db.commit()
+        await db.refresh(post)
 
     return await hydrate_post_out(db, post, viewer_id=user_id)
 
 
-@router.get("/", response_model=List[PostOut])
+@router.get("/", response_model=List[PostOut] | PostPage)
 async def feed_list(
     limit: int = Query(10, ge=1, le=50),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_session),
     token: str | None = Query(None),
     authorization: str | None = Header(None),
@@ -135,14 +210,19 @@ async def feed_list(
     except Exception:
         raise HTTPException(status_code=401, detail="invalid token")
 
+    if cursor is not None:
+        posts = await list_posts(db, limit=limit + 1, cursor=_parse_cursor(cursor))
+        return await _post_page(db, posts, limit, viewer_id)
+
     posts = await list_posts(db, limit=limit, offset=offset)
-    return [await hydrate_post_out(db, p, viewer_id=viewer_id) for p in posts]
+    return await hydrate_posts_out(db, posts, viewer_id=viewer_id)
 
 
-@router.get("/me/", response_model=List[PostOut])
+@router.get("/me/", response_model=List[PostOut] | PostPage)
 async def my_posts(
     limit: int = Query(30, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_session),
     token: str | None = Query(None),
     authorization: str | None = Header(None),
@@ -153,15 +233,29 @@ async def my_posts(
     except Exception:
         raise HTTPException(status_code=401, detail="invalid token")
 
-    posts = await list_posts_by_user(db, viewer_id, limit=limit, offset=offset)
-    return [await hydrate_post_out(db, p, viewer_id=viewer_id) for p in posts]
+    if cursor is not None:
+        posts = await list_posts_by_user(
+            db,
+            viewer_id,
+            limit=limit + 1,
+            cursor=_parse_cursor(cursor),
+            only_ready=False,
+        )
+        return await _post_page(db, posts, limit, viewer_id)
+
+    # en el perfil propio también salen los posts que aún se procesan
+    posts = await list_posts_by_user(
+        db, viewer_id, limit=limit, offset=offset, only_ready=False
+    )
+    return await hydrate_posts_out(db, posts, viewer_id=viewer_id)
 
 
-@router.get("/user/{user_id}/", response_model=List[PostOut])
+@router.get("/user/{user_id}/", response_model=List[PostOut] | PostPage)
 async def user_posts(
     user_id: int,
     limit: int = Query(30, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
     db: AsyncSession = Depends(get_session),
     token: str | None = Query(None),
     authorization: str | None = Header(None),
@@ -172,8 +266,14 @@ async def user_posts(
     except Exception:
         raise HTTPException(status_code=401, detail="invalid token")
 
+    if cursor is not None:
+        posts = await list_posts_by_user(
+            db, user_id, limit=limit + 1, cursor=_parse_cursor(cursor)
+        )
+        return await _post_page(db, posts, limit, viewer_id)
+
     posts = await list_posts_by_user(db, user_id, limit=limit, offset=offset)
-    return [await hydrate_post_out(db, p, viewer_id=viewer_id) for p in posts]
+    return await hydrate_posts_out(db, posts, viewer_id=viewer_id)
 
 
 @router.patch("/{post_id}/", response_model=PostOut)
@@ -214,22 +314,53 @@ async def edit_post(
     post.caption_meta = new_meta
     await db.flush()
     await db.commit()
+    post_card_cache.invalidate(post_id)
 
     return await hydrate_post_out(db, post, viewer_id=user_id)
 
 
-@router.post("/{post_id}/view/")
-async def add_view(
+@router.get("/{post_id}/status/", response_model=PostStatusOut)
+async def post_status(
     post_id: int,
     db: AsyncSession = Depends(get_session),
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
 ):
+    """
+    Estado del procesamiento del media (para hacer polling tras publicar).
+    """
+    _ = _extract_token(token, authorization)
+
     post = await get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="post not found")
 
-    new_count = await increment_views(db, post_id)
-    await db.commit()
-    return {"views_count": new_count}
+    progress = await asset_progress(db, post.asset_id)
+    return {
+        "post_id": post.id,
+        "media_status": post.media_status,
+        "hls_status": post.hls_status,
+        "stage": progress.get("stage"),
+        "error": progress.get("error"),
+        "progress": progress.get("progress"),
+    }
+
+
+@router.post("/{post_id}/view/")
+async def add_view(
+    post_id: int,
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    Suma una vista en el buffer en memoria (se vuelca en lote a la DB).
+    views_count es best-effort: lo persistido + lo pendiente en este proceso.
+    """
+    views = await get_post_views(db, post_id)
+    if views is None:
+        raise HTTPException(status_code=404, detail="post not found")
+
+    pending = view_buffer.add(post_id)
+    return {"views_count": views + pending}
 
 
 @router.post("/{post_id}/star/")
@@ -251,6 +382,7 @@ async def toggle_star_on_post(
 
     starred, count = await toggle_post_star(db, post_id, user_id)
     await db.commit()
+    post_card_cache.invalidate(post_id)
     return {"post_id": post_id, "stars_count": count, "starred": starred}
 
 
@@ -299,17 +431,26 @@ async def delete_post_endpoint(
         raise HTTPException(status_code=403, detail="not your post")
 
     media_rel = post.media_path
+    asset_id = post.asset_id
 
-    # Borramos la fila en DB
+    # Borramos la fila en DB (y soltamos su referencia al asset)
     await db.delete(post)
     await db.flush()
+    released = await release_asset(db, asset_id) if asset_id else None
     await db.commit()
+    post_card_cache.invalidate(post_id)
 
-    # 🧹 best-effort: borrar archivo y carpeta HLS (si existen)
+    # 🧹 best-effort: borrar archivo y carpeta HLS (si existen).
+    # Con asset solo si era la última referencia; posts antiguos
+    # (sin asset) tienen su propio archivo y HLS por id.
     try:
-        if media_rel:
-            delete_post_media(media_rel)
-        delete_hls(post_id)
+        if asset_id:
+            if released is not None:
+                delete_asset_files(released)
+        else:
+            if media_rel:
+                delete_post_media(media_rel)
+            delete_hls(post_id)
     except Exception:
         # En dev podrías loguear el error si quieres
         pass
@@ -3,11 +3,15 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import Any
 
+from app.media.schemas import ImageVariant
+
 
 class AuthorMini(BaseModel):
     id: int
     username: str
     avatar: str | None = None  # ruta relativa
+    # 🖼️ versiones WebP del avatar (rutas relativas, de menor a mayor)
+    avatar_variants: list[ImageVariant] | None = None
 
 
 class StarUserOut(BaseModel):
@@ -31,10 +35,44 @@ class PostOut(BaseModel):
     # 👇 NUEVO: meta estructurada del caption (texto + estilo + fuente)
     caption_meta: dict[str, Any] | None = None
 
+    # 📦 processing → el video aún se normaliza (media todavía no existe)
+    media_status: str = "ready"
+
+    # 🖼️ videos: poster JPEG y preview animado WebP (/media/...), para
+    # pintar el card antes de bajar el video. None en imágenes.
+    poster: str | None = None
+    preview: str | None = None
+
+    # 🖼️ imágenes: versiones WebP de `media` (/media/..., de menor a mayor)
+    media_variants: list[ImageVariant] | None = None
+
     class Config:
         from_attributes = True
 
 
+class PostPage(BaseModel):
+    """
+    Página del feed en modo cursor (keyset).
+    next_cursor = None → no hay más publicaciones.
+    """
+    items: list[PostOut]
+    next_cursor: str | None = None
+
+
+class PostStatusOut(BaseModel):
+    """
+    Estado del procesamiento de media de un post.
+    stage: queued | probing | transcoding | thumbnails | failed (None si no hay job en curso).
+    """
+    post_id: int
+    media_status: str
+    hls_status: str | None = None
+    stage: str | None = None
+    error: str | None = None
+    # 📈 FFmpeg: percent, speed, wall, cpu, runs[], outputs{} (ver media_jobs.progress)
+    progress: dict[str, Any] | None = None
+
+
 class PostUpdate(BaseModel):
     """
     Payload para edición de post (por ahora solo caption).
@@ -1,17 +1,19 @@
 # app/feed/service.py
-import os
 import json
 import base64
 import unicodedata
+from datetime import datetime
 from typing import Any, Tuple
 
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.feed.models import Post, PostStar
+from app.media.status import HLS_READY
+from app.feed.cache import post_card_cache
+from app.media.images import variant_urls
 from app.users.models import User
 from app.profile.models import Profile
-from app.media.hls import hls_abs_master
 
 
 def normalize_caption(text: str | None) -> str | None:
@@ -141,6 +143,30 @@ def process_caption_inputs(
     return _parse_caption_payload(raw)
 
 
+def encode_cursor(post: Post) -> str:
+    """
+    Cursor opaco para paginación keyset: base64url de (created_at, id)
+    del último post de la página.
+    """
+    raw = json.dumps(
+        {"t": post.created_at.isoformat(), "id": post.id},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Inversa de encode_cursor. Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        obj = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(obj["t"]), int(obj["id"])
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
 def to_media_url(rel: str | None) -> str | None:
     """Convierte una ruta relativa en /media/... para el front."""
     if not rel:
@@ -148,61 +174,57 @@ def to_media_url(rel: str | None) -> str | None:
     return f"/media/{rel}"
 
 
-def _maybe_hls_url(post_id: int) -> str | None:
+def _maybe_hls_url(post: Post) -> str | None:
     """
-    Si ya existe master.m3u8 para este post → /hls/<id>/master.m3u8.
+    Si el job ya marcó el HLS como listo → /hls/<key>/master.m3u8
+    (key = clave del asset; posts antiguos usan su id).
     Si no, devolvemos None y se usará el MP4 normal.
+    Solo mira la fila (hls_status), nunca el disco.
     """
-    master_abs = hls_abs_master(post_id)
-    if os.path.exists(master_abs):
-        return f"/hls/{post_id}/master.m3u8"
+    if post.hls_status == HLS_READY:
+        return f"/hls/{post.hls_key or post.id}/master.m3u8"
     return None
 
 
-async def _count_stars(db: AsyncSession, post_id: int) -> int:
+async def _load_authors(
+    db: AsyncSession, user_ids: list[int]
+) -> dict[int, tuple[User, Profile | None]]:
+    """
+    Carga autores + perfil (avatar) en UNA sola query (JOIN).
+    Devuelve {user_id: (User, Profile | None)}.
+    """
+    if not user_ids:
+        return {}
     res = await db.execute(
-        select(func.count()).select_from(PostStar).where(PostStar.post_id == post_id)
+        select(User, Profile)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .where(User.id.in_(user_ids))
     )
-    return int(res.scalar_one() or 0)
+    return {user.id: (user, prof) for user, prof in res.all()}
 
 
-async def _viewer_starred(
-    db: AsyncSession, post_id: int, viewer_id: int | None
-) -> bool:
-    if not viewer_id:
-        return False
+async def _viewer_starred_ids(
+    db: AsyncSession, post_ids: list[int], viewer_id: int | None
+) -> set[int]:
+    """
+    Cuáles de esos posts ya estrelló el viewer (UNA query con IN).
+    """
+    if not viewer_id or not post_ids:
+        return set()
     res = await db.execute(
-        select(PostStar).where(
-            PostStar.post_id == post_id,
+        select(PostStar.post_id).where(
             PostStar.user_id == viewer_id,
+            PostStar.post_id.in_(post_ids),
         )
     )
-    return res.scalar_one_or_none() is not None
+    return {row[0] for row in res.all()}
 
 
-async def hydrate_post_out(
-    db: AsyncSession, post: Post, *, viewer_id: int | None = None
-):
+def _post_card(post: Post, user: User, prof: Profile | None) -> dict:
     """
-    Devuelve el dict que espera el front para un Post:
-    - autor + avatar
-    - stars_count + starred
-    - views_count
-    - media: prioridad HLS (m3u8), fallback MP4 normalizado
-    - caption: tal cual se guardó (string JSON o texto)
-    - caption_meta: dict estructurado (texto + estilo + fuente)
+    Arma el dict que espera el front para un Post (sin tocar la DB).
+    Es independiente del viewer: `starred` va en False y se rellena después.
     """
-    # autor
-    ures = await db.execute(select(User).where(User.id == post.user_id))
-    user = ures.scalar_one()
-
-    # avatar
-    pres = await db.execute(select(Profile).where(Profile.user_id == post.user_id))
-    prof = pres.scalar_one_or_none()
-
-    stars_count = await _count_stars(db, post.id)
-    starred = await _viewer_starred(db, post.id, viewer_id)
-
     # caption: usamos lo que hay en DB; si falta pero hay meta, lo reconstruimos
     caption = post.caption
     meta = post.caption_meta
@@ -215,7 +237,7 @@ async def hydrate_post_out(
             text = meta.get("text") if isinstance(meta, dict) else None
             caption = normalize_caption(text) if text else None
 
-    media_url = _maybe_hls_url(post.id) or to_media_url(post.media_path)
+    media_url = _maybe_hls_url(post) or to_media_url(post.media_path)
 
     return {
         "id": post.id,
@@ -227,8 +249,77 @@ async def hydrate_post_out(
             "id": user.id,
             "username": user.username,
             "avatar": prof.avatar if prof else None,
+            "avatar_variants": variant_urls(prof.avatar_variants, "") if prof else None,
         },
-        "stars_count": stars_count,
-        "starred": starred,
+        "stars_count": post.stars_count or 0,
+        "starred": False,
         "caption_meta": meta,  # 👈 aquí viaja el meta al front
+        "media_status": post.media_status,
+        "poster": to_media_url(post.poster_path),
+        "preview": to_media_url(post.preview_path),
+        "media_variants": variant_urls(post.media_variants),
     }
+
+
+async def hydrate_posts_out(
+    db: AsyncSession, posts: list[Post], *, viewer_id: int | None = None
+) -> list[dict]:
+    """
+    Versión en lote de hydrate_post_out para las listas del feed.
+    Número de queries constante sin importar el tamaño de la página:
+    - autores + perfiles: 1 query (JOIN), solo para los cards que no
+      estén en post_card_cache
+    - starred del viewer: 1 query (IN)
+    (views_count / stars_count vienen denormalizados en la fila del post:
+    se toman siempre de ahí, no del card cacheado)
+    Respeta el orden de `posts`.
+    """
+    if not posts:
+        return []
+
+    # 1) cards compartidos: cache → solo los que faltan van a la DB
+    cards: dict[int, dict] = {}
+    missing: list[Post] = []
+    for post in posts:
+        card = post_card_cache.get(post.id)
+        if card is None:
+            missing.append(post)
+        else:
+            cards[post.id] = card
+
+    if missing:
+        authors = await _load_authors(db, list({p.user_id for p in missing}))
+        for post in missing:
+            user, prof = authors[post.user_id]
+            card = _post_card(post, user, prof)
+            post_card_cache.put(post.id, post.user_id, card)
+            cards[post.id] = card
+
+    # 2) overlay: contadores frescos de la fila + `starred` del viewer
+    starred_ids = await _viewer_starred_ids(db, [p.id for p in posts], viewer_id)
+
+    return [
+        {
+            **cards[p.id],
+            "views_count": p.views_count,
+            "stars_count": p.stars_count or 0,
+            "starred": p.id in starred_ids,
+        }
+        for p in posts
+    ]
+
+
+async def hydrate_post_out(
+    db: AsyncSession, post: Post, *, viewer_id: int | None = None
+):
+    """
+    Devuelve el dict que espera el front para un Post:
+    - autor + avatar
+    - stars_count + starred
+    - views_count
+    - media: prioridad HLS (m3u8), fallback MP4 normalizado
+    - caption: tal cual se guardó (string JSON o texto)
+    - caption_meta: dict estructurado (texto + estilo + fuente)
+    """
+    cards = await hydrate_posts_out(db, [post], viewer_id=viewer_id)
+    return cards[0]
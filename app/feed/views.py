@@ -0,0 +1,110 @@
+# app/feed/views.py
+"""
+Buffer de vistas (write-behind).
+
+POST /api/feed/{id}/view/ ya no escribe en la DB: suma +1 en memoria y
+un task de fondo vuelca todo cada VIEWS_FLUSH_SECONDS con UN solo UPDATE
+en lote (views_count = views_count + n). Así no hay read-modify-write ni
+locks por vista, y los incrementos concurrentes no se pierden.
+
+⚠️ Es por proceso: con varios workers de uvicorn cada uno tiene su buffer
+(cada uno hace su propio flush, los UPDATE son aditivos).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.feed.repository import add_post_views
+
+log = logging.getLogger("uvicorn")
+
+
+class ViewBuffer:
+    def __init__(self, interval: float, max_pending: int):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: dict[int, int] = {}
+        self._total = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def add(self, post_id: int, n: int = 1) -> int:
+        """
+        Suma n vistas pendientes al post. Devuelve las pendientes de ese post.
+        Si el buffer se llena, adelanta el flush.
+        """
+        pending = self._pending.get(post_id, 0) + n
+        self._pending[post_id] = pending
+        self._total += n
+        if self._total >= self.max_pending:
+            self._wake.set()
+        return pending
+
+    def pending(self, post_id: int) -> int:
+        return self._pending.get(post_id, 0)
+
+    async def flush(self) -> int:
+        """
+        Vuelca lo pendiente a la DB. Si falla, devuelve los incrementos al
+        buffer para el siguiente intento. Devuelve cuántas vistas se escribieron.
+        """
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        written, self._total = self._total, 0
+        committed = False
+        try:
+            async with AsyncSessionLocal() as db:
+                await add_post_views(db, batch)
+                await db.commit()
+                committed = True
+        except BaseException as e:
+            # también CancelledError (stop() a mitad de un flush). Si el
+            # commit no llegó, el lote vuelve al buffer sin despertar el loop
+            # (reintenta en el próximo tick o en el flush final de stop())
+            if not committed:
+                for post_id, n in batch.items():
+                    self._pending[post_id] = self._pending.get(post_id, 0) + n
+                self._total += written
+            if not isinstance(e, Exception):
+                raise
+            log.error(f"❌ Flush de vistas falló ({len(batch)} posts): {e!r}")
+            return written if committed else 0
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Hook de shutdown: detiene el task (esperando a que termine: si
+        estaba en un flush, su lote vuelve al buffer) y hace el último flush.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+view_buffer = ViewBuffer(
+    interval=settings.VIEWS_FLUSH_SECONDS,
+    max_pending=settings.VIEWS_FLUSH_MAX_PENDING,
+)
@@ -0,0 +1,287 @@
+# app/gif/convert.py
+"""
+Conversión offline de la biblioteca de GIFs (/media/gifs) a formatos
+livianos. Se corre a mano (o por cron) después de agregar GIFs:
+
+    python -m app.gif.convert            # solo los nuevos/cambiados
+    python -m app.gif.convert --force    # todos otra vez
+
+Por cada GIF genera en /media/gifs/renditions/:
+  - <slug>.mp4          H.264 (lo más liviano; <video muted loop>)
+  - <slug>.webm         VP9
+  - <slug>.webp         WebP animado (si el cliente solo tiene <Image>)
+  - <slug>.preview.webp miniatura animada para la grilla del picker
+
+y los registra en renditions/manifest.json, que lee app/gif/service.py.
+El GIF original no se toca: queda como fallback.
+"""
+from __future__ import annotations
+
+import os
+import re
+import json
+import hashlib
+import argparse
+
+from app.gif.service import GIFS_DIR, RENDITIONS_DIR, MANIFEST_PATH, _get_dims
+from app.media.hls import _ffmpeg
+from app.media.probe import probe, summarize
+from app.media.scheduler import run_ffmpeg, thread_args
+
+# tope de ancho de las versiones completas (el picker no muestra más)
+MAX_WIDTH = 480
+PREVIEW_WIDTH = 160
+PREVIEW_FPS = 8
+PREVIEW_SECONDS = 2
+
+MANIFEST_VERSION = 1
+
+
+def _slug(name: str, path: str) -> str:
+    """
+    "Bender GIF (1).gif" → "bender-gif-1-<hash del contenido>": sin
+    espacios ni paréntesis en las URLs, y si el GIF cambia cambia la URL
+    (se sirven con cache inmutable).
+    """
+    stem = os.path.splitext(name)[0]
+    base = re.sub(r"[^a-z0-9]+", "-", stem.lower()).strip("-") or "gif"
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha1").hexdigest()
+    return f"{base}-{digest[:10]}"
+
+
+def _source_dims(path: str) -> tuple[int | None, int | None]:
+    summary = summarize(probe(path))
+    if summary:
+        return summary["width"], summary["height"]
+    return _get_dims(path)
+
+
+def _fit(width: int | None, height: int | None, max_width: int) -> tuple[int, int] | None:
+    """
+    Tamaño de salida: ancho ≤ max_width, proporción del original, pares
+    (yuv420p lo exige para MP4/WebM).
+    """
+    if not width or not height:
+        return None
+    w = min(max_width, width)
+    h = round(height * w / width)
+    return max(2, w - w % 2), max(2, h - h % 2)
+
+
+def _scale(size: tuple[int, int] | None, max_width: int) -> str:
+    if size:
+        return f"scale={size[0]}:{size[1]}:flags=lanczos"
+    return f"scale='min({max_width},iw)':-2:flags=lanczos"
+
+
+def _encode(src: str, dst: str, args: list[str], what: str) -> None:
+    cmd = [_ffmpeg(), "-y", "-v", "error", "-i", src, *thread_args(), *args, "-an", dst]
+    proc = run_ffmpeg(cmd)
+    if proc.returncode != 0 or not os.path.exists(dst):
+        raise RuntimeError(proc.stderr or proc.stdout or f"ffmpeg error ({what})")
+
+
+def convert_gif(name: str) -> dict:
+    """
+    Genera las 4 versiones de un GIF y devuelve su entrada del manifest.
+    """
+    src = os.path.join(GIFS_DIR, name)
+    slug = _slug(name, src)
+    src_w, src_h = _source_dims(src)
+    full = _fit(src_w, src_h, MAX_WIDTH)
+    small = _fit(src_w, src_h, PREVIEW_WIDTH)
+    scale = _scale(full, MAX_WIDTH)
+
+    outputs = {
+        "mp4": (
+            f"{slug}.mp4",
+            full,
+            [
+                "-vf",
+                scale,
+                "-c:v",
+                "libx264",
+                "-preset",
+                "slow",
+                "-crf",
+                "26",
+                "-pix_fmt",
+                "yuv420p",
+                "-movflags",
+                "+faststart",
+            ],
+        ),
+        "webm": (
+            f"{slug}.webm",
+            full,
+            [
+                "-vf",
+                scale,
+                "-c:v",
+                "libvpx-vp9",
+                "-b:v",
+                "0",
+                "-crf",
+                "38",
+                "-deadline",
+                "good",
+                "-cpu-used",
+                "4",
+                "-row-mt",
+                "1",
+                "-pix_fmt",
+                "yuv420p",
+            ],
+        ),
+        "webp": (
+            f"{slug}.webp",
+            full,
+            [
+                "-vf",
+                scale,
+                "-c:v",
+                "libwebp_anim",
+                "-loop",
+                "0",
+                "-quality",
+                "70",
+                "-compression_level",
+                "4",
+            ],
+        ),
+        "preview": (
+            f"{slug}.preview.webp",
+            small,
+            [
+                "-t",
+                str(PREVIEW_SECONDS),
+                "-vf",
+                f"fps={PREVIEW_FPS},{_scale(small, PREVIEW_WIDTH)}",
+                "-c:v",
+                "libwebp_anim",
+                "-loop",
+                "0",
+                "-quality",
+                "50",
+                "-compression_level",
+                "4",
+            ],
+        ),
+    }
+
+    renditions = {}
+    for kind, (filename, size, args) in outputs.items():
+        dst = os.path.join(RENDITIONS_DIR, filename)
+        _encode(src, dst, args, f"{name} → {kind}")
+        renditions[kind] = {
+            "file": filename,
+            "size": os.path.getsize(dst),
+            "width": size[0] if size else None,
+            "height": size[1] if size else None,
+        }
+
+    st = os.stat(src)
+    return {
+        "source_size": st.st_size,
+        "source_mtime": int(st.st_mtime),
+        "width": src_w,
+        "height": src_h,
+        "renditions": renditions,
+    }
+
+
+def _load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            return data
+    except (FileNotFoundError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "items": {}}
+
+
+def _save_manifest(data: dict) -> None:
+    # escritura atómica: el servicio puede estar leyéndolo
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _up_to_date(entry: dict | None, path: str) -> bool:
+    if not entry:
+        return False
+    st = os.stat(path)
+    if entry.get("source_size") != st.st_size or entry.get("source_mtime") != int(st.st_mtime):
+        return False
+    return all(
+        os.path.exists(os.path.join(RENDITIONS_DIR, r["file"]))
+        for r in entry.get("renditions", {}).values()
+    )
+
+
+def _remove_renditions(entry: dict) -> None:
+    for r in entry.get("renditions", {}).values():
+        try:
+            os.remove(os.path.join(RENDITIONS_DIR, r["file"]))
+        except FileNotFoundError:
+            pass
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convierte /media/gifs a MP4/WebM/WebP.")
+    ap.add_argument("--force", action="store_true", help="reconvertir todos")
+    args = ap.parse_args()
+
+    os.makedirs(RENDITIONS_DIR, exist_ok=True)
+    manifest = _load_manifest()
+    items: dict = manifest["items"]
+
+    names = sorted(
+        n
+        for n in os.listdir(GIFS_DIR)
+        if n.lower().endswith(".gif") and os.path.isfile(os.path.join(GIFS_DIR, n))
+    )
+
+    # GIFs que ya no están: fuera del manifest y sus archivos también
+    for gone in set(items) - set(names):
+        _remove_renditions(items.pop(gone))
+
+    converted = failed = 0
+    before = after = 0
+    for name in names:
+        path = os.path.join(GIFS_DIR, name)
+        if not args.force and _up_to_date(items.get(name), path):
+            continue
+        try:
+            entry = convert_gif(name)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {str(e).strip()[-300:]}")
+            continue
+        old = items.get(name)
+        if old:
+            # el GIF cambió: sus versiones anteriores tienen otro nombre
+            stale = {r["file"] for r in old["renditions"].values()}
+            stale -= {r["file"] for r in entry["renditions"].values()}
+            _remove_renditions({"renditions": {f: {"file": f} for f in stale}})
+        items[name] = entry
+        converted += 1
+        before += entry["source_size"]
+        after += entry["renditions"]["webp"]["size"]
+        sizes = " ".join(f"{k}={v['size'] // 1024}KB" for k, v in entry["renditions"].items())
+        print(f"🎞️ {name} ({entry['source_size'] // 1024}KB) → {sizes}")
+        # se guarda en cada paso: si se corta, lo ya convertido no se repite
+        _save_manifest(manifest)
+
+    _save_manifest(manifest)
+    print(
+        f"✅ {converted} convertidos, {failed} fallidos, {len(items)} en el manifest"
+        + (f" | GIF {before // 1024}KB → WebP {after // 1024}KB" if converted else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
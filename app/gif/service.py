@@ -1,6 +1,7 @@
 # app/gif/service.py
 from __future__ import annotations
 import os
+import json
 from typing import Any, List, Tuple
 from urllib.parse import quote
 
@@ -10,9 +11,16 @@ from app.core.config import settings
 GIFS_DIR = os.path.join(settings.MEDIA_DIR, "gifs")
 os.makedirs(GIFS_DIR, exist_ok=True)
 
+# Versiones livianas generadas por `python -m app.gif.convert`
+RENDITIONS_DIR = os.path.join(GIFS_DIR, "renditions")
+MANIFEST_PATH = os.path.join(RENDITIONS_DIR, "manifest.json")
+
 # Extensiones que vamos a servir
 ALLOWED_EXTS = {".gif", ".webp", ".mp4"}
 
+# manifest en memoria; se relee si cambia su mtime (tras una conversión)
+_manifest: tuple[float, dict] | None = None
+
 
 def _iter_files() -> List[Tuple[str, str]]:
     """
@@ -50,21 +58,80 @@ def _get_dims(path: str) -> tuple[int | None, int | None]:
         return None, None
 
 
+def _renditions() -> dict[str, Any]:
+    """
+    {nombre del GIF: entrada} del manifest de app/gif/convert.py
+    ({} si todavía no se corrió la conversión).
+    """
+    global _manifest
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime
+    except FileNotFoundError:
+        return {}
+    if _manifest is None or _manifest[0] != mtime:
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                items = json.load(f).get("items") or {}
+        except ValueError:
+            items = {}
+        _manifest = (mtime, items)
+    return _manifest[1]
+
+
 def _file_to_item(name: str, path: str) -> dict[str, Any]:
     """
     Convierte un archivo local a un item que el front pueda usar:
-    { id, title, url, width?, height? }
+    { id, title, url, width?, height?, gif, mp4?, webm?, webp?, preview? }
+
+    Si el GIF ya se convirtió, `url` apunta al WebP animado (salvo que
+    pese más que el GIF) y cada versión viene como {url, size, width,
+    height}; `gif` es el original (fallback).
     """
     stem, _ = os.path.splitext(name)
-    width, height = _get_dims(path)
     # importante: escapamos el nombre por si tiene espacios
     rel_url = f"/media/gifs/{quote(name)}"
+    entry = _renditions().get(name)
+    if entry is None:
+        width, height = _get_dims(path)
+        return {
+            "id": stem,
+            "title": stem.replace("_", " "),
+            "url": rel_url,
+            "width": width,
+            "height": height,
+            "gif": {
+                "url": rel_url,
+                "size": os.path.getsize(path),
+                "width": width,
+                "height": height,
+            },
+        }
+
+    versions = {
+        kind: {
+            "url": f"/media/gifs/renditions/{quote(r['file'])}",
+            "size": r["size"],
+            "width": r["width"],
+            "height": r["height"],
+        }
+        for kind, r in entry["renditions"].items()
+    }
+    gif = {
+        "url": rel_url,
+        "size": entry.get("source_size"),
+        "width": entry.get("width"),
+        "height": entry.get("height"),
+    }
+    webp = versions.get("webp")
+    main = webp if webp and webp["size"] < (gif["size"] or 0) else gif
     return {
         "id": stem,
         "title": stem.replace("_", " "),
-        "url": rel_url,
-        "width": width,
-        "height": height,
+        "url": main["url"],
+        "width": main["width"],
+        "height": main["height"],
+        "gif": gif,
+        **versions,
     }
 
 
@@ -1,21 +1,29 @@
 # app/main.py
 import os
+import asyncio
 import logging
 import mimetypes
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from app.core.json import UTF8JSONResponse
 from app.core.config import settings
 from app.core.limiter import init_limiter
+from app.core.body_limit import MaxBodySizeMiddleware
 from app.db.init_db import init_models
+from app.feed.views import view_buffer
+from app.media.hls import cleanup_hls_staging
+from app.media.jobs import backfill_hls_status
+from app.media.queue import media_queue
+from app.media.sweeper import media_sweeper
+from app.media.uploads import upload_reaper
 
 # routers
 from app.users.router import router as users_router
 from app.profile.router import router as profile_router
 from app.feed.router import router as feed_router
 from app.media.streaming import router as media_router
+from app.media.router import router as media_api_router
 from app.comments.router import router as comments_router
 from app.gif.router import router as gif_router
 from app.clips.router import router as clips_router  # 👈 NUEVO
@@ -25,6 +33,7 @@ log = logging.getLogger("uvicorn")
 # ⚙️ HLS mime-types
 mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
 mimetypes.add_type("video/mp2t", ".ts")
+mimetypes.add_type("video/iso.segment", ".m4s")
 
 app = FastAPI(
     title="Trends API",
@@ -40,12 +49,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 📤 corta uploads gigantes mientras llegan (no después de spoolearlos)
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    max_bytes=settings.MAX_UPLOAD_MB * 1024 * 1024,
+)
+
 # directorios
 os.makedirs(settings.MEDIA_DIR, exist_ok=True)
 os.makedirs(settings.HLS_DIR, exist_ok=True)
 
-# montar HLS
-app.mount("/hls", StaticFiles(directory=settings.HLS_DIR, html=False), name="hls")
+# HLS: lo sirve app/media/streaming.py (/hls/..., con Range)
 
 
 @app.middleware("http")
@@ -60,6 +74,7 @@ async def cache_static_hls_media(request: Request, call_next):
         or p.startswith("/media/posts/")
         or p.startswith("/media/comments/")
         or p.startswith("/media/clips/")  # 👈 clips también cacheables
+        or p.startswith("/media/gifs/renditions/")  # nombre con hash del GIF
     ):
         response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
     # content-type ya viene con charset por UTF8JSONResponse,
@@ -75,9 +90,38 @@ async def on_startup():
     log.info("🚀 Iniciando servicio…")
     await init_limiter()
     await init_models()
+    try:
+        n = await backfill_hls_status()
+        if n:
+            log.info(f"🎬 hls_status registrado para {n} posts existentes.")
+    except Exception as e:
+        log.error(f"❌ Backfill de hls_status falló: {e!r}")
+    # 🚧 HLS a medio generar de un proceso caído (nunca se publicaron)
+    n = await asyncio.to_thread(cleanup_hls_staging)
+    if n:
+        log.info(f"🚧 {n} carpetas de staging de HLS eliminadas.")
+    view_buffer.start()
+    try:
+        await media_queue.start()
+    except Exception as e:
+        log.error(f"❌ No se pudo iniciar la cola de media: {e!r}")
+    # 🧹 barrido de huérfanos (solo si MEDIA_SWEEP_INTERVAL_HOURS > 0)
+    media_sweeper.start()
+    # 📶 subidas reanudables abandonadas
+    upload_reaper.start()
     log.info("✅ Startup listo.")
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    # 👀 vuelca las vistas pendientes antes de salir
+    await view_buffer.stop()
+    await media_queue.stop()
+    await media_sweeper.stop()
+    await upload_reaper.stop()
+    log.info("👋 Shutdown listo.")
+
+
 @app.get("/api/health/")
 async def health():
     # incluye emojis para testear transporte UTF-8
@@ -90,5 +134,6 @@ app.include_router(profile_router)   # /api/profile/...
 app.include_router(feed_router)      # /api/feed/...
 app.include_router(comments_router)  # /api/comments/...
 app.include_router(gif_router)       # /api/gif/...
-app.include_router(media_router)     # /media/...
+app.include_router(media_router)     # /media/... y /hls/...
+app.include_router(media_api_router) # /api/media/...
 app.include_router(clips_router)     # /api/clips/... 👈 NUEVO
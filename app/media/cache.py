@@ -0,0 +1,336 @@
+# app/media/cache.py
+"""
+Cache de metadatos de los archivos que sirve app/media/streaming.py
+(/media/... y /hls/...).
+
+Sin cache, cada GET/HEAD hacía realpath (un lstat por componente),
+isfile, stat, MD5 para el ETag, guess_type y el formateo de
+Last-Modified. Los nombres son inmutables (uuid / hash de contenido), así
+que todo eso se calcula una vez por archivo y se guarda:
+
+    (base, ruta pedida) → (ruta absoluta, identidad, headers)
+
+- LRU acotado (MEDIA_STAT_CACHE_SIZE). 0 = desactivado.
+- Validación barata: en un hit se hace UN os.stat y se compara
+  (inode, tamaño, mtime_ns). Si el archivo cambió (HLS republicado,
+  variante regenerada) se recalcula; si ya no está → 404 y fuera.
+- Invalidación explícita desde los borrados (storage, images, hls,
+  service) para no guardar entradas muertas. Es por proceso: en otros
+  workers la validación por stat cubre lo mismo.
+
+Encima, opcional, un tier en memoria para objetos chicos y calientes
+(segmentos .ts/.m4s de 2s, playlists, avatares) que se piden miles de
+veces: HotObjectCache, con presupuesto en bytes (MEDIA_MEMORY_CACHE_MB) y
+tope por objeto (MEDIA_MEMORY_CACHE_MAX_OBJECT_KB). La admisión es tipo
+TinyLFU: un count-min sketch estima la frecuencia reciente de cada ruta
+(con envejecimiento) y un objeto solo entra si se pidió más de una vez y,
+si hay que desalojar, si es más frecuente que lo que desaloja. Así una
+ráfaga de archivos vistos una sola vez no vacía el cache.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+from app.core.config import settings
+
+
+class FileMetaCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # (base, path) → (abs_path, (ino, size, mtime_ns), headers)
+        self._data: OrderedDict[tuple[str, str], tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, base: str, path: str) -> tuple | None:
+        """
+        Entrada guardada SIN validar (el caller hace el stat y llama a
+        hit()/stale_entry()). None = miss.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get((base, path))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((base, path))
+            return entry
+
+    def hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def stale_entry(self, base: str, path: str) -> None:
+        """
+        La entrada ya no corresponde al disco (cambió o se borró).
+        """
+        with self._lock:
+            if self._data.pop((base, path), None) is not None:
+                self.stale += 1
+            self.misses += 1
+
+    def put(self, base: str, path: str, entry: tuple) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[(base, path)] = entry
+            self._data.move_to_end((base, path))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, base: str, path: str) -> None:
+        with self._lock:
+            if self._data.pop((base, path), None) is not None:
+                self.invalidations += 1
+
+    def invalidate_prefix(self, base: str, prefix: str) -> None:
+        """
+        Borra todo lo que cuelga de una carpeta (p.ej. un HLS: "<key>/").
+        Recorre el cache entero: solo se usa al borrar/republicar un HLS.
+        """
+        with self._lock:
+            for key in [k for k in self._data if k[0] == base and k[1].startswith(prefix)]:
+                del self._data[key]
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# bases del cache (mismo nombre que el prefijo de la URL)
+MEDIA = "media"
+HLS = "hls"
+
+file_meta_cache = FileMetaCache(maxsize=settings.MEDIA_STAT_CACHE_SIZE)
+
+
+class CountMinSketch:
+    """
+    Frecuencia aproximada por clave: 4 filas de contadores de 4 bits
+    (saturan en 15). Cada `sample_size` incrementos todos los contadores se
+    dividen por 2, así pesa lo reciente (lo que fue popular ayer se olvida).
+    """
+
+    DEPTH = 4
+    MAX = 15
+    _HALVE = bytes(c >> 1 for c in range(256))  # tabla para bytearray.translate
+
+    def __init__(self, width: int):
+        self.width = 1 << max(10, (width - 1).bit_length())  # potencia de 2
+        self._mask = self.width - 1
+        self._rows = [bytearray(self.width) for _ in range(self.DEPTH)]
+        self.sample_size = 10 * self.width
+        self._additions = 0
+
+    def _indexes(self, key) -> list[int]:
+        # double hashing: h1 + i*h2 (hash() de Python, el sketch es por proceso)
+        h1 = hash(key)
+        h2 = hash((key, 0x9E3779B9)) | 1
+        return [(h1 + i * h2) & self._mask for i in range(self.DEPTH)]
+
+    def increment(self, key) -> None:
+        for row, i in zip(self._rows, self._indexes(key)):
+            if row[i] < self.MAX:
+                row[i] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._indexes(key)))
+
+    def _age(self) -> None:
+        for row in self._rows:
+            row[:] = row.translate(self._HALVE)
+        self._additions //= 2
+
+
+class HotObjectCache:
+    """
+    Bytes de archivos chicos y calientes en memoria (LRU por bytes +
+    admisión TinyLFU). Cada entrada va con la identidad del archivo
+    (inode, tamaño, mtime_ns): si no coincide con el stat del request, se
+    descarta y se vuelve a leer del disco.
+    """
+
+    # pedidos mínimos antes de leer un objeto a memoria (filtra one-hit wonders)
+    MIN_FREQUENCY = 2
+
+    def __init__(self, budget_bytes: int, max_object_bytes: int):
+        self.budget = budget_bytes
+        self.max_object = max_object_bytes
+        self._data: OrderedDict[tuple[str, str], tuple[tuple, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # ~1 contador por cada objeto de 16KB que quepa en el presupuesto
+        self._sketch = CountMinSketch(budget_bytes // (16 * 1024) or 1)
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.admissions = 0
+        self.rejections = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0 and self.max_object > 0
+
+    def eligible(self, size: int) -> bool:
+        return self.enabled and 0 < size <= min(self.max_object, self.budget)
+
+    def get(self, key: tuple[str, str], ident: tuple) -> bytes | None:
+        """
+        Bytes del objeto si está y sigue siendo el mismo archivo. Cuenta el
+        acceso en el sketch (también los misses: es lo que decide quién entra).
+        """
+        with self._lock:
+            self._sketch.increment(key)
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == ident:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def _drop(self, key) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _victims(self, key, size: int) -> list | None:
+        """
+        Admisión TinyLFU: [] si hay lugar; si no, las víctimas LRU a sacar
+        para hacerle espacio, solo si el candidato es más frecuente que cada
+        una. None = no entra. Con el lock tomado.
+        """
+        freq = self._sketch.estimate(key)
+        if freq < self.MIN_FREQUENCY:
+            return None
+        needed = self._bytes + size - self.budget
+        victims = []
+        for victim, (_, data) in self._data.items():
+            if needed <= 0:
+                break
+            if self._sketch.estimate(victim) >= freq:
+                return None
+            victims.append(victim)
+            needed -= len(data)
+        return victims if needed <= 0 else None
+
+    def load(self, key: tuple[str, str], ident: tuple, abs_path: str, size: int) -> bytes | None:
+        """
+        Lee el archivo a memoria si la admisión lo acepta. None = servir
+        desde disco como siempre. Hace IO: llamarla fuera del event loop.
+        """
+        with self._lock:
+            if self._victims(key, size) is None:
+                self.rejections += 1
+                return None
+        try:
+            with open(abs_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != size:
+            return None  # cambió entre el stat y la lectura
+        with self._lock:
+            # el cache pudo cambiar durante la lectura: se decide de nuevo y
+            # se desalojan exactamente las víctimas comparadas
+            self._drop(key)
+            victims = self._victims(key, size)
+            if victims is None:
+                self.rejections += 1
+                return None
+            for victim in victims:
+                self._drop(victim)
+                self.evictions += 1
+            self._data[key] = (ident, data)
+            self._bytes += size
+            self.admissions += 1
+        return data
+
+    def served(self, nbytes: int) -> None:
+        with self._lock:
+            self.bytes_saved += nbytes
+
+    def invalidate(self, base: str, path: str) -> None:
+        with self._lock:
+            if (base, path) in self._data:
+                self._drop((base, path))
+                self.invalidations += 1
+
+    def invalidate_prefix(self, base: str, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._data if k[0] == base and k[1].startswith(prefix)]:
+                self._drop(key)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "objects": len(self._data),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget,
+                "max_object_bytes": self.max_object,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "admissions": self.admissions,
+                "rejections": self.rejections,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+hot_object_cache = HotObjectCache(
+    budget_bytes=settings.MEDIA_MEMORY_CACHE_MB * 1024 * 1024,
+    max_object_bytes=settings.MEDIA_MEMORY_CACHE_MAX_OBJECT_KB * 1024,
+)
+
+
+def invalidate_media(rel: str | None) -> None:
+    """
+    Hook de los borrados en /media (rel = "posts/abc.mp4", ...).
+    """
+    if rel:
+        file_meta_cache.invalidate(MEDIA, rel)
+        hot_object_cache.invalidate(MEDIA, rel)
+
+
+def invalidate_hls(key: int | str) -> None:
+    """
+    Hook al borrar o republicar /hls/<key>/.
+    """
+    file_meta_cache.invalidate_prefix(HLS, f"{key}/")
+    hot_object_cache.invalidate_prefix(HLS, f"{key}/")
@@ -2,11 +2,16 @@
 from __future__ import annotations
 
 import os
+import uuid
 import shutil
 import subprocess
-from typing import List
+from contextlib import contextmanager
+from typing import NamedTuple
 
 from app.core.config import settings
+from app.media.cache import invalidate_hls
+from app.media.scheduler import run_ffmpeg, thread_args, input_thread_args
+from app.media.probe import probe, summarize
 
 
 def _ffmpeg() -> str:
@@ -23,187 +28,561 @@ def _ensure_dir(p: str):
     os.makedirs(p, exist_ok=True)
 
 
-def hls_abs_dir(post_id: int) -> str:
+def hls_abs_dir(key: int | str) -> str:
     """
-    Carpeta absoluta donde se guarda el HLS de un post.
+    Carpeta absoluta donde se guarda un HLS.
+    key = id del post (posts viejos) o clave del asset de media.
     Ej: ./media/hls/123/
     """
-    return os.path.join(settings.HLS_DIR, str(post_id))
+    return os.path.join(settings.HLS_DIR, str(key))
 
 
-def hls_abs_master(post_id: int) -> str:
+def hls_abs_master(key: int | str) -> str:
     """
-    Ruta absoluta al master.m3u8 de un post.
+    Ruta absoluta al master.m3u8 de un HLS.
     """
-    return os.path.join(hls_abs_dir(post_id), "master.m3u8")
+    return os.path.join(hls_abs_dir(key), "master.m3u8")
 
 
-def hls_master_rel(post_id: int) -> str:
+def hls_master_rel(key: int | str) -> str:
     """
     Ruta relativa HTTP al master.m3u8.
     Ej: hls/123/master.m3u8 (se servirá desde /hls/...)
     """
-    return f"hls/{post_id}/master.m3u8"
+    return f"hls/{key}/master.m3u8"
 
 
-def generate_hls_single(src_abs: str, post_id: int) -> str:
+# 🚧 Publicación atómica: cada HLS se escribe en una carpeta de staging
+# (/hls/.staging-<key>-<pid>-<rand>/) y solo cuando está completo se
+# renombra a /hls/<key>/. Un HLS a medio escribir (FFmpeg corriendo, job
+# caído, reintento) nunca queda visible en la ruta pública.
+STAGING_PREFIX = ".staging-"
+TRASH_PREFIX = ".trash-"
+
+
+def _playlist_uris(path: str) -> tuple[list[str], bool]:
+    """
+    (URIs que referencia una playlist, ¿tiene #EXT-X-ENDLIST?).
+    Incluye el init de fMP4 (EXT-X-MAP:URI="...").
+    """
+    uris: list[str] = []
+    ended = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#EXT-X-ENDLIST"):
+                ended = True
+            elif line.startswith("#EXT-X-MAP:") and 'URI="' in line:
+                uris.append(line.split('URI="', 1)[1].split('"', 1)[0])
+            elif not line.startswith("#"):
+                uris.append(line)
+    return uris, ended
+
+
+def _check_complete(outdir: str) -> None:
+    """
+    Lanza si el HLS de outdir no está completo: falta el master, alguna
+    playlist de variante o algún segmento, o una playlist no terminó (VOD
+    sin #EXT-X-ENDLIST = FFmpeg cortado).
+    """
+    master = os.path.join(outdir, "master.m3u8")
+    if not os.path.exists(master):
+        raise RuntimeError("HLS incompleto: falta master.m3u8")
+    uris, _ = _playlist_uris(master)
+    # master de variantes → revisar cada una; si no, el master es la playlist
+    playlists = [os.path.join(outdir, u) for u in uris if u.endswith(".m3u8")] or [master]
+    for pl in playlists:
+        if not os.path.exists(pl):
+            raise RuntimeError(f"HLS incompleto: falta {os.path.relpath(pl, outdir)}")
+        seg_uris, ended = _playlist_uris(pl)
+        if not ended or not seg_uris:
+            raise RuntimeError(f"HLS incompleto: {os.path.relpath(pl, outdir)} sin terminar")
+        base = os.path.dirname(pl)
+        for u in set(seg_uris):
+            if not os.path.exists(os.path.join(base, u)):
+                raise RuntimeError(f"HLS incompleto: falta {u}")
+
+
+def publish_hls(staging: str, key: int | str) -> str:
+    """
+    Valida el HLS armado en `staging` y lo publica en /hls/<key>/ con
+    rename. Si ya había uno (rebuild), se aparta con otro rename y se borra
+    después: la ventana sin carpeta es de dos renames, nunca un HLS a medias.
+    Devuelve la ruta absoluta del master.m3u8 publicado.
+    """
+    _check_complete(staging)
+    final = hls_abs_dir(key)
+    trash = None
+    if os.path.exists(final):
+        trash = os.path.join(settings.HLS_DIR, f"{TRASH_PREFIX}{key}-{uuid.uuid4().hex[:8]}")
+        os.rename(final, trash)
+    os.rename(staging, final)
+    invalidate_hls(key)
+    if trash:
+        shutil.rmtree(trash, ignore_errors=True)
+    return hls_abs_master(key)
+
+
+@contextmanager
+def staged_hls(key: int | str):
+    """
+    Carpeta de staging para generar el HLS de `key`:
+
+        with staged_hls(key) as outdir:
+            ... FFmpeg escribe en outdir ...
+
+    Al salir sin error se publica (publish_hls); con error (o si el HLS no
+    está completo) se borra y /hls/<key>/ queda como estaba.
+    """
+    staging = os.path.join(
+        settings.HLS_DIR, f"{STAGING_PREFIX}{key}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    )
+    _ensure_dir(staging)
+    try:
+        yield staging
+        publish_hls(staging, key)
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return False  # de una corrida anterior con el mismo pid (contenedor)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def cleanup_hls_staging() -> int:
+    """
+    Hook de startup: borra staging/trash que dejó un proceso que ya no
+    existe (caído a mitad de un FFmpeg). Los de otros workers vivos se
+    respetan. Devuelve cuántas carpetas se borraron.
+    """
+    removed = 0
+    try:
+        entries = list(os.scandir(settings.HLS_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        if entry.name.startswith(STAGING_PREFIX):
+            try:
+                pid = int(entry.name.rsplit("-", 2)[-2])
+            except (IndexError, ValueError):
+                pid = 0
+            if pid and _pid_alive(pid):
+                continue
+        elif not entry.name.startswith(TRASH_PREFIX):
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def _segment_args(seg_dir: str, stem: str = "seg") -> list[str]:
+    """
+    Dónde y cómo se escriben los segmentos de una playlist:
+    - por defecto, un .ts por segmento (<stem>_000000.ts, ...)
+    - HLS_SINGLE_FILE: un solo fMP4 (<stem>.m4s) con el init y todos los
+      segmentos; la playlist los referencia con EXT-X-MAP/EXT-X-BYTERANGE
+      y el reproductor pide cada uno por Range (ver app/media/streaming.py).
+      Un archivo por calidad en vez de cientos.
+    """
+    if settings.HLS_SINGLE_FILE:
+        return [
+            "-hls_segment_type",
+            "fmp4",
+            "-hls_flags",
+            "single_file",
+            "-hls_segment_filename",
+            os.path.join(seg_dir, f"{stem}.m4s"),
+        ]
+    return ["-hls_segment_filename", os.path.join(seg_dir, f"{stem}_%06d.ts")]
+
+
+def generate_hls_single(src_abs: str, key: int | str) -> str:
     """
     Genera HLS con 1 sola calidad.
     Devuelve la ruta absoluta del master.m3u8.
     """
-    outdir = hls_abs_dir(post_id)
-    _ensure_dir(outdir)
-
     seg = settings.HLS_SEG_SECONDS
 
-    cmd = [
-        _ffmpeg(),
-        "-y",
-        "-v",
-        "error",
-        "-i",
-        src_abs,
+    with staged_hls(key) as outdir:
+        cmd = [
+            _ffmpeg(),
+            "-y",
+            "-v",
+            "error",
+            *input_thread_args(),
+            "-i",
+            src_abs,
+            *thread_args(),
+            "-c:v",
+            "libx264",
+            "-profile:v",
+            "main",
+            "-level",
+            "3.1",
+            "-pix_fmt",
+            "yuv420p",
+            "-c:a",
+            "aac",
+            "-b:a",
+            "128k",
+            "-ac",
+            "2",
+            "-ar",
+            "48000",
+            "-preset",
+            "veryfast" if settings.HLS_FAST_TRANSCODE else "medium",
+            "-hls_time",
+            str(seg),
+            "-hls_playlist_type",
+            "vod",
+            *_segment_args(outdir),
+            os.path.join(outdir, "master.m3u8"),
+        ]
+
+        proc = run_ffmpeg(cmd, "HLS single")
+        if proc.returncode != 0 or not os.path.exists(os.path.join(outdir, "master.m3u8")):
+            raise RuntimeError(proc.stderr or proc.stdout or "ffmpeg error (HLS single)")
+
+    return hls_abs_master(key)
+
+
+class Rendition(NamedTuple):
+    name: str
+    height: int
+    video_kbps: int
+    audio_kbps: int
+
+
+# ladder base (topes); plan_ladder() lo adapta a cada original
+LADDER = [
+    Rendition("240p", 240, 400, 96),
+    Rendition("360p", 360, 800, 96),
+    Rendition("480p", 480, 1200, 128),
+]
+
+
+def plan_ladder(summary: dict | None) -> list[Rendition]:
+    """
+    Ladder para un original concreto (summary = app.media.probe.summarize):
+    - no se escala hacia arriba: se omiten calidades más altas que el
+      original; si es más chico que la menor, una sola a su altura
+    - ningún bitrate supera el del original (video y audio)
+    Sin datos del original → LADDER completo.
+    """
+    if not summary or not summary.get("height"):
+        return list(LADDER)
+
+    src_h = int(summary["height"])
+    src_v = (summary.get("video_bitrate") or 0) // 1000
+    src_a = (summary.get("audio_bitrate") or 0) // 1000
+
+    picked = [r for r in LADDER if r.height <= src_h]
+    if not picked:
+        h = max(2, src_h - src_h % 2)
+        base = LADDER[0]
+        picked = [Rendition(f"{h}p", h, base.video_kbps, base.audio_kbps)]
+
+    out = []
+    for r in picked:
+        v = min(r.video_kbps, src_v) if src_v else r.video_kbps
+        a = min(r.audio_kbps, src_a) if src_a else r.audio_kbps
+        out.append(r._replace(video_kbps=max(v, 64), audio_kbps=max(a, 32)))
+    return out
+
+
+def x264_tune(summary: dict | None) -> str | None:
+    """
+    -tune de x264 por contenido: HLS_X264_TUNE si está fijado; si no,
+    "stillimage" para slideshows/fotos animadas (muy pocos fps).
+    """
+    if settings.HLS_X264_TUNE:
+        return settings.HLS_X264_TUNE
+    fps = (summary or {}).get("fps")
+    if fps and fps <= 5:
+        return "stillimage"
+    return None
+
+
+def _has_audio(src_abs: str) -> bool:
+    """
+    ¿El archivo tiene pista de audio? (lee la cabecera con `ffmpeg -i`,
+    sin decodificar nada). Hace falta para armar el var_stream_map.
+    """
+    proc = subprocess.run(
+        [_ffmpeg(), "-hide_banner", "-i", src_abs],
+        capture_output=True,
+        text=True,
+    )
+    return "Audio:" in (proc.stderr or "")
+
+
+def ladder_filter(renditions: list[Rendition], extra: int = 0) -> str:
+    """
+    Filtro para -filter_complex: [0:v] → split → scale por variante
+    ([v0], [v1], ...). `extra` agrega salidas sin escalar ([x0], ...) para
+    que otra salida del mismo comando (p.ej. el MP4) use la misma
+    decodificación.
+    """
+    n = len(renditions)
+    graph = f"[0:v]split={n + extra}"
+    graph += "".join(f"[s{i}]" for i in range(n))
+    graph += "".join(f"[x{i}]" for i in range(extra)) + ";"
+    graph += ";".join(f"[s{i}]scale=-2:{r.height}[v{i}]" for i, r in enumerate(renditions))
+    return graph
+
+
+def ladder_output_args(
+    outdir: str,
+    audio: bool,
+    renditions: list[Rendition],
+    encoders: int | None = None,
+    tune: str | None = None,
+    seg_seconds: int | None = None,
+    master: bool = True,
+) -> list[str]:
+    """
+    Argumentos de la salida HLS del ladder (maps, encoders y muxer) para un
+    comando que ya tiene el ladder_filter(). Crea las carpetas de variantes.
+    Las playlists de cada variante (<name>/index.m3u8) y el master se
+    escriben juntos; el master las referencia con rutas relativas.
+    master=False: sin master.m3u8 (lo escribe el caller, ver
+    generate_hls_ladder_sequential).
+    `encoders` = encoders de video del comando completo (reparto de hilos).
+
+    Control de tasa: CRF (HLS_CRF) con tope = bitrate de la variante
+    (-maxrate/-bufsize). El contenido estático gasta menos que el tope;
+    -b:v queda como nominal para el BANDWIDTH del master.
+    Se fuerza un keyframe cada `seg_seconds` (default HLS_SEG_SECONDS):
+    sin eso x264 pone uno cada ~10s y los segmentos salen de ~10s.
+    """
+    seg = seg_seconds or settings.HLS_SEG_SECONDS
+    for r in renditions:
+        _ensure_dir(os.path.join(outdir, r.name))
+
+    args: list[str] = []
+    stream_map = []
+    for i, r in enumerate(renditions):
+        args += [
+            "-map",
+            f"[v{i}]",
+            f"-b:v:{i}",
+            f"{r.video_kbps}k",
+            f"-maxrate:v:{i}",
+            f"{r.video_kbps}k",
+            f"-bufsize:v:{i}",
+            f"{2 * r.video_kbps}k",
+        ]
+        if audio:
+            # el audio también se decodifica una vez; se codifica por variante
+            # porque cada una lleva su propio bitrate (muxed en el segmento)
+            args += ["-map", "0:a:0", f"-b:a:{i}", f"{r.audio_kbps}k"]
+            stream_map.append(f"v:{i},a:{i},name:{r.name}")
+        else:
+            stream_map.append(f"v:{i},name:{r.name}")
+
+    args += [
+        *thread_args(encoders or len(renditions)),
         "-c:v",
         "libx264",
+        "-crf",
+        str(settings.HLS_CRF),
         "-profile:v",
         "main",
         "-level",
         "3.1",
         "-pix_fmt",
         "yuv420p",
-        "-c:a",
-        "aac",
-        "-b:a",
-        "128k",
-        "-ac",
-        "2",
-        "-ar",
-        "48000",
         "-preset",
         "veryfast" if settings.HLS_FAST_TRANSCODE else "medium",
+    ]
+    if tune:
+        args += ["-tune", tune]
+    args += ["-force_key_frames", f"expr:gte(t,n_forced*{seg})"]
+    if audio:
+        args += ["-c:a", "aac", "-ac", "2", "-ar", "48000"]
+    args += [
+        "-f",
+        "hls",
         "-hls_time",
         str(seg),
         "-hls_playlist_type",
         "vod",
-        "-hls_segment_filename",
-        os.path.join(outdir, "seg_%06d.ts"),
-        os.path.join(outdir, "master.m3u8"),
+        "-var_stream_map",
+        " ".join(stream_map),
+        *(["-master_pl_name", "master.m3u8"] if master else []),
+        *_segment_args(os.path.join(outdir, "%v")),
+        os.path.join(outdir, "%v", "index.m3u8"),
     ]
-
-    proc = subprocess.run(cmd, capture_output=True, text=True)
-    master = os.path.join(outdir, "master.m3u8")
-    if proc.returncode != 0 or not os.path.exists(master):
-        raise RuntimeError(proc.stderr or proc.stdout or "ffmpeg error (HLS single)")
-
-    return master
+    return args
 
 
-def generate_hls_ladder(src_abs: str, post_id: int) -> str:
+def generate_hls_ladder(src_abs: str, key: int | str, summary: dict | None = None) -> str:
     """
-    Genera 3 calidades (240p, 360p, 480p) y un master.m3u8 con variantes (ABR).
+    Genera el ladder ABR (hasta 240p/360p/480p, ver plan_ladder) y un
+    master.m3u8 con variantes en UNA sola ejecución de FFmpeg: el original
+    se decodifica una vez y el filtro `split` reparte los frames a los
+    escalados/encoders. summary = datos del original (si no, se sondea).
     Devuelve ruta absoluta al master.m3u8.
     """
-    outdir = hls_abs_dir(post_id)
-    _ensure_dir(outdir)
+    if summary is None:
+        summary = summarize(probe(src_abs))
+    renditions = plan_ladder(summary)
+    audio = summary["audio"] if summary else _has_audio(src_abs)
 
-    seg = settings.HLS_SEG_SECONDS
-    preset = "veryfast" if settings.HLS_FAST_TRANSCODE else "medium"
+    with staged_hls(key) as outdir:
+        cmd = [
+            _ffmpeg(),
+            "-y",
+            "-v",
+            "error",
+            *input_thread_args(),
+            "-i",
+            src_abs,
+            "-filter_complex",
+            ladder_filter(renditions),
+        ] + ladder_output_args(outdir, audio, renditions, tune=x264_tune(summary))
 
-    # name, scale, video_bitrate, audio_bitrate
-    variants = [
-        ("240p", "-vf", "scale=-2:240", "400k", "96k"),
-        ("360p", "-vf", "scale=-2:360", "800k", "96k"),
-        ("480p", "-vf", "scale=-2:480", "1200k", "128k"),
-    ]
+        proc = run_ffmpeg(cmd, "HLS ladder")
+        if proc.returncode != 0 or not os.path.exists(os.path.join(outdir, "master.m3u8")):
+            raise RuntimeError(proc.stderr or proc.stdout or "ffmpeg error (HLS ladder)")
 
-    variant_playlists: List[tuple[str, str]] = []
+    return hls_abs_master(key)
 
-    for name, vf_flag, vf_val, v_b, a_b in variants:
-        vdir = os.path.join(outdir, name)
-        _ensure_dir(vdir)
 
-        playlist = os.path.join(vdir, f"{name}.m3u8")
+def remux_hls(
+    src_abs: str,
+    key: int | str,
+    seg_seconds: int | None = None,
+    max_seconds: int | None = None,
+) -> str:
+    """
+    HLS de 1 calidad SIN recodificar (-c copy): para originales que ya
+    cumplen el perfil objetivo o para el MP4 recién normalizado.
+    Los segmentos se cortan en keyframes (hls_time es un objetivo).
+    max_seconds recorta la duración (clips).
+    Devuelve la ruta absoluta del master.m3u8.
+    """
+    with staged_hls(key) as outdir:
         cmd = [
             _ffmpeg(),
             "-y",
             "-v",
             "error",
+            *(["-t", str(max_seconds)] if max_seconds else []),
             "-i",
             src_abs,
-            vf_flag,
-            vf_val,
-            "-c:v",
-            "libx264",
-            "-b:v",
-            v_b,
-            "-profile:v",
-            "main",
-            "-level",
-            "3.1",
-            "-pix_fmt",
-            "yuv420p",
-            "-c:a",
-            "aac",
-            "-b:a",
-            a_b,
-            "-ac",
-            "2",
-            "-ar",
-            "48000",
-            "-preset",
-            preset,
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-f",
+            "hls",
             "-hls_time",
-            str(seg),
+            str(seg_seconds or settings.HLS_SEG_SECONDS),
             "-hls_playlist_type",
             "vod",
-            "-hls_segment_filename",
-            os.path.join(vdir, f"{name}_%06d.ts"),
-            playlist,
+            *_segment_args(outdir),
+            os.path.join(outdir, "master.m3u8"),
         ]
-        proc = subprocess.run(cmd, capture_output=True, text=True)
-        if proc.returncode != 0 or not os.path.exists(playlist):
-            raise RuntimeError(proc.stderr or proc.stdout or f"ffmpeg error ({name})")
 
-        variant_playlists.append((name, playlist))
+        proc = run_ffmpeg(cmd, "HLS remux")
+        if proc.returncode != 0 or not os.path.exists(os.path.join(outdir, "master.m3u8")):
+            raise RuntimeError(proc.stderr or proc.stdout or "ffmpeg error (HLS remux)")
 
-    master = os.path.join(outdir, "master.m3u8")
-    with open(master, "w", encoding="utf-8") as f:
-        f.write("#EXTM3U\n")
-        for name, pl in variant_playlists:
-            res_map = {
-                "240p": "426x240",
-                "360p": "640x360",
-                "480p": "854x480",
-            }
-            bw_map = {
-                "240p": "400000",
-                "360p": "800000",
-                "480p": "1200000",
-            }
-            res = res_map[name]
-            bw = bw_map[name]
-            rel = os.path.relpath(pl, outdir).replace("\\", "/")
-            f.write(
-                f'#EXT-X-STREAM-INF:BANDWIDTH={bw},RESOLUTION={res},NAME="{name}"\n{rel}\n'
+    return hls_abs_master(key)
+
+
+def _master_entry(r: Rendition, summary: dict | None) -> str:
+    bandwidth = (r.video_kbps + r.audio_kbps) * 1000
+    attrs = f"BANDWIDTH={bandwidth}"
+    if summary and summary.get("width") and summary.get("height"):
+        # mismo ancho que scale=-2:<alto> (par, proporcional)
+        width = round(summary["width"] * r.height / summary["height"] / 2) * 2
+        attrs += f",RESOLUTION={width}x{r.height}"
+    return f'#EXT-X-STREAM-INF:{attrs},NAME="{r.name}"\n{r.name}/index.m3u8\n'
+
+
+def generate_hls_ladder_sequential(
+    src_abs: str,
+    key: int | str,
+    summary: dict | None = None,
+    seg_seconds: int | None = None,
+) -> str:
+    """
+    Ladder ABR con un proceso de FFmpeg POR calidad (decodifica el
+    original una vez por variante). Se conserva como referencia/fallback
+    (HLS_SINGLE_DECODE=False) y para el benchmark (bench_hls.py): mismo
+    plan_ladder y mismos encoders (ladder_output_args: CRF + maxrate) que
+    generate_hls_ladder, así solo cambia la cantidad de decodificaciones.
+    seg_seconds: default HLS_SEG_SECONDS (clips: CLIP_HLS_SEG_SECONDS).
+    Devuelve ruta absoluta al master.m3u8.
+    """
+    if summary is None:
+        summary = summarize(probe(src_abs))
+    renditions = plan_ladder(summary)
+    audio = summary["audio"] if summary else _has_audio(src_abs)
+    tune = x264_tune(summary)
+
+    with staged_hls(key) as outdir:
+        for r in renditions:
+            playlist = os.path.join(outdir, r.name, "index.m3u8")
+            cmd = [
+                _ffmpeg(),
+                "-y",
+                "-v",
+                "error",
+                *input_thread_args(),
+                "-i",
+                src_abs,
+                "-filter_complex",
+                ladder_filter([r]),
+            ] + ladder_output_args(
+                outdir, audio, [r], tune=tune, seg_seconds=seg_seconds, master=False
             )
+            proc = run_ffmpeg(cmd, f"HLS {r.name}")
+            if proc.returncode != 0 or not os.path.exists(playlist):
+                raise RuntimeError(proc.stderr or proc.stdout or f"ffmpeg error ({r.name})")
+
+        with open(os.path.join(outdir, "master.m3u8"), "w", encoding="utf-8") as f:
+            f.write("#EXTM3U\n")
+            for r in renditions:
+                f.write(_master_entry(r, summary))
 
-    return master
+    return hls_abs_master(key)
 
 
-def generate_hls(src_abs: str, post_id: int) -> str:
+def generate_hls(src_abs: str, key: int | str) -> str:
     """
     Dispatcher: ladder (ABR) o 1 sola calidad según config.
     """
     if settings.HLS_USE_LADDER:
-        return generate_hls_ladder(src_abs, post_id)
-    return generate_hls_single(src_abs, post_id)
+        if settings.HLS_SINGLE_DECODE:
+            return generate_hls_ladder(src_abs, key)
+        return generate_hls_ladder_sequential(src_abs, key)
+    return generate_hls_single(src_abs, key)
 
 
-def delete_hls(post_id: int) -> None:
+def delete_hls(key: int | str) -> None:
     """
-    Elimina por completo la carpeta HLS de un post (si existe).
+    Elimina por completo una carpeta HLS (si existe).
     No lanza error si falta.
     """
-    d = hls_abs_dir(post_id)
+    invalidate_hls(key)
+    d = hls_abs_dir(key)
     if os.path.isdir(d):
         shutil.rmtree(d, ignore_errors=True)
@@ -0,0 +1,115 @@
+# app/media/images.py
+"""
+Versiones reducidas (WebP) de las imágenes subidas: posts, clips y
+avatares. Las fotos de cámara llegan de varios MB y el mismo archivo se
+pintaba como avatar de 40px en cada card.
+
+- un WebP por ancho de IMAGE_VARIANT_WIDTHS (sin escalar hacia arriba)
+- se respeta la orientación EXIF y después se descarta (GPS, cámara...)
+- junto al original: posts/<key>.w320.webp, avatars/<key>.w96.webp, ...
+
+El resultado (manifest) se guarda en JSONB:
+    {"width": 4032, "height": 3024,
+     "variants": [{"path": "posts/<key>.w96.webp", "width": 96, "height": 72}, ...]}
+
+Requiere Pillow (requirements.txt). Si falta se avisa al arrancar y no
+hay variantes; con GIFs animados tampoco. En ambos casos se sigue
+sirviendo el original.
+"""
+from __future__ import annotations
+
+import os
+import logging
+
+from app.core.config import settings
+from app.media.cache import invalidate_media
+
+log = logging.getLogger("uvicorn")
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow no instalado → solo originales
+    Image = ImageOps = None
+    log.warning("⚠️ Pillow no está instalado: no se generan variantes WebP de imágenes.")
+
+
+def _variant_rel(rel: str, width: int) -> str:
+    stem = os.path.splitext(os.path.basename(rel))[0]
+    return f"{os.path.dirname(rel)}/{stem}.w{width}.webp"
+
+
+def _widths_for(src_width: int) -> list[int]:
+    """
+    Anchos configurados que no superan el original; si el original es más
+    chico que todos, una sola variante a su tamaño (igual pasa a WebP).
+    """
+    picked = [w for w in settings.image_variant_widths if w < src_width]
+    if len(picked) < len(settings.image_variant_widths):
+        picked.append(src_width)
+    return picked
+
+
+def make_image_variants(rel: str) -> dict | None:
+    """
+    Genera las variantes WebP de /media/<rel> y devuelve el manifest
+    (None si no aplica o no se pudo: el caller sigue con el original).
+    """
+    if Image is None:
+        return None
+    src_abs = os.path.join(settings.MEDIA_DIR, rel)
+    written: list[str] = []
+    try:
+        with Image.open(src_abs) as im:
+            if getattr(im, "is_animated", False):
+                # GIF/WebP animado: reducirlo a 1 frame lo rompería
+                return None
+            im = ImageOps.exif_transpose(im)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+            src_w, src_h = im.size
+
+            variants = []
+            for width in _widths_for(src_w):
+                height = max(1, round(src_h * width / src_w))
+                out = im if width == src_w else im.resize((width, height), Image.LANCZOS)
+                vrel = _variant_rel(rel, width)
+                # sin exif=...: Pillow no copia los metadatos al WebP
+                out.save(
+                    os.path.join(settings.MEDIA_DIR, vrel),
+                    "WEBP",
+                    quality=settings.IMAGE_VARIANT_QUALITY,
+                    method=4,
+                )
+                written.append(vrel)
+                variants.append({"path": vrel, "width": width, "height": height})
+    except Exception as e:
+        log.error(f"❌ No se pudieron generar variantes de {rel}: {e!r}")
+        delete_image_variants({"variants": [{"path": p} for p in written]})
+        return None
+
+    return {"width": src_w, "height": src_h, "variants": variants}
+
+
+def delete_image_variants(manifest: dict | None) -> None:
+    """
+    Borra los WebP de un manifest. No lanza si ya no están.
+    """
+    for v in (manifest or {}).get("variants") or []:
+        try:
+            invalidate_media(v["path"])
+            os.remove(os.path.join(settings.MEDIA_DIR, v["path"]))
+        except (FileNotFoundError, KeyError):
+            pass
+
+
+def variant_urls(manifest: dict | None, prefix: str = "/media/") -> list[dict] | None:
+    """
+    Variantes para la API, de menor a mayor: [{"url", "width", "height"}].
+    prefix = cómo arma la URL el campo vecino ("/media/", "media/" o "").
+    """
+    if not manifest or not manifest.get("variants"):
+        return None
+    return [
+        {"url": f"{prefix}{v['path']}", "width": v["width"], "height": v["height"]}
+        for v in sorted(manifest["variants"], key=lambda v: v["width"])
+    ]
@@ -2,32 +2,368 @@
 from __future__ import annotations
 
 import os
-import threading
+import asyncio
+import logging
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.media.hls import generate_hls, hls_abs_master
+from app.db.session import AsyncSessionLocal
+from app.feed.models import Post
+from app.feed.repository import update_post_status
+from app.feed.cache import post_card_cache
+from app.media.repository import (
+    set_asset_status,
+    set_asset_probe,
+    set_job_progress,
+    enqueue_job,
+    get_latest_job,
+)
+from app.media.probe import probe, summarize
+from app.media.hls import hls_abs_dir, hls_abs_master
+from app.media.pipeline import ingest_post_video, ingest_clip_video
+from app.media.thumbs import make_thumbnails
+from app.media.scheduler import TranscodeTracker, tracking, transcode_metrics
+from app.media.storage import CLIP_MAX_SECONDS, discard_staged, media_key
+from app.media.status import (
+    MEDIA_READY,
+    MEDIA_FAILED,
+    HLS_PENDING,
+    HLS_PROCESSING,
+    HLS_READY,
+    HLS_FAILED,
+    JOB_DONE,
+)
+
+log = logging.getLogger("uvicorn")
+
+# progreso en memoria por ("asset", id): {"stage": ..., "error": ...}
+# stages: queued → probing → transcoding → thumbnails → done | failed
+# (el estado durable está en media_jobs; esto solo da la etapa fina)
+_progress: dict[tuple[str, int], dict] = {}
+
+# progreso de FFmpeg de los jobs que corren en este proceso (por id de job);
+# lo persistido está en media_jobs.progress
+_trackers: dict[int, TranscodeTracker] = {}
+
+# prioridad en la cola (mayor = antes): los clips son cortos (≤ 120s)
+# y aparecen arriba en la app, así que pasan primero
+PRIORITY_CLIP = 20
+PRIORITY_POST = 10
 
 
 def _abs_media(rel: str) -> str:
     return os.path.join(settings.MEDIA_DIR, rel)
 
 
-def spawn_hls_build(post_id: int, src_rel: str) -> None:
+def job_progress(kind: str, obj_id: int) -> dict | None:
+    """
+    Etapa actual del procesamiento de un asset (None si no hay job
+    en curso en este proceso).
+    """
+    return _progress.get((kind, obj_id))
+
+
+def live_job_progress(job_id: int) -> dict | None:
+    """
+    Progreso de FFmpeg al momento (None si el job no corre en este proceso).
+    """
+    tracker = _trackers.get(job_id)
+    return tracker.snapshot() if tracker else None
+
+
+# lo que ve el cliente cuando un job falló; el error crudo (stderr de
+# FFmpeg, con rutas del servidor) queda en media_jobs.last_error y en el log
+PUBLIC_JOB_ERROR = "media processing failed"
+
+
+async def asset_progress(db: AsyncSession, asset_id: int | None) -> dict:
+    """
+    {"stage", "error", "progress"} para los endpoints de estado: la etapa
+    en memoria si el job corre en este proceso; si no, lo que diga el
+    último job en DB. progress = % / velocidad / wall / CPU / bytes.
+    """
+    if not asset_id:
+        return {}
+    progress = job_progress("asset", asset_id)
+    if progress:
+        job_id = progress.get("job_id")
+        return {
+            **progress,
+            "error": PUBLIC_JOB_ERROR if progress.get("error") else None,
+            "progress": live_job_progress(job_id) if job_id else None,
+        }
+    job = await get_latest_job(db, asset_id)
+    if job is None or job.state == JOB_DONE:
+        return {}
+    return {
+        "stage": job.state,
+        "error": PUBLIC_JOB_ERROR if job.last_error else None,
+        "progress": job.progress,
+    }
+
+
+def _set_stage(
+    key: tuple[str, int],
+    stage: str,
+    error: str | None = None,
+    job_id: int | None = None,
+) -> None:
+    if stage == "done":
+        _progress.pop(key, None)
+        return
+    _progress[key] = {"stage": stage, "error": error, "job_id": job_id}
+
+
+def _call_on_loop(loop: asyncio.AbstractEventLoop, coro, what: str) -> None:
     """
-    Lanza un hilo que genera el HLS para el post dado.
-    No bloquea la petición HTTP de publicación.
+    Ejecuta una corrutina de DB en el event loop de la app desde un hilo
+    del pool y espera a que termine.
     """
-    src_abs = _abs_media(src_rel)
+    fut = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        fut.result(timeout=30)
+    except Exception as e:
+        log.error(f"❌ No se pudo guardar {what}: {e!r}")
+
 
-    def _run():
-        try:
-            # si ya existe master.m3u8, no hace nada
-            if os.path.exists(hls_abs_master(post_id)):
-                return
-            generate_hls(src_abs, post_id)
-        except Exception as e:
-            # en dev verás esto en consola
-            print(f"[HLS] Error generando HLS para post {post_id}: {e!r}")
+async def _save_asset_status(asset_id: int, **values) -> None:
+    async with AsyncSessionLocal() as db:
+        post_ids = await set_asset_status(db, asset_id, **values)
+        await db.commit()
+    # los cards cacheados tienen el estado/URL viejos (MP4 vs HLS)
+    for post_id in post_ids:
+        post_card_cache.invalidate(post_id)
+
+
+def _post_on_loop(loop: asyncio.AbstractEventLoop, coro, what: str) -> None:
+    """
+    Como _call_on_loop pero sin esperar: lo usa el hilo que lee el
+    -progress de FFmpeg, que no puede frenarse.
+    """
+    def _done(f) -> None:
+        # f.exception() lanza CancelledError si el futuro se canceló (shutdown)
+        if not f.cancelled() and f.exception() is not None:
+            log.error(f"❌ No se pudo guardar {what}: {f.exception()!r}")
 
-    th = threading.Thread(target=_run, daemon=True)
-    th.start()
+    fut = asyncio.run_coroutine_threadsafe(coro, loop)
+    fut.add_done_callback(_done)
+
+
+async def _save_job_progress(job_id: int, progress: dict) -> None:
+    async with AsyncSessionLocal() as db:
+        await set_job_progress(db, job_id, progress)
+        await db.commit()
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _output_bytes(rel: str, key: str, extra: dict[str, str | None]) -> dict[str, int]:
+    """
+    Bytes finales por salida: MP4, cada calidad del HLS (<key>/<name>/),
+    playlists/segmentos de 1 calidad ("hls") y poster/preview.
+    """
+    out = {"mp4": os.path.getsize(_abs_media(rel))}
+    try:
+        entries = list(os.scandir(hls_abs_dir(key)))
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        if entry.is_dir():
+            out[entry.name] = _dir_bytes(entry.path)
+        else:
+            out["hls"] = out.get("hls", 0) + entry.stat().st_size
+    for name, extra_rel in extra.items():
+        if extra_rel and os.path.exists(_abs_media(extra_rel)):
+            out[name] = os.path.getsize(_abs_media(extra_rel))
+    return out
+
+
+async def _save_asset_probe(asset_id: int, summary: dict | None) -> None:
+    async with AsyncSessionLocal() as db:
+        await set_asset_probe(db, asset_id, summary)
+        await db.commit()
+
+
+async def enqueue_asset_ingest(
+    db: AsyncSession, asset_id: int, tmp_src: str, rel: str, kind: str
+) -> None:
+    """
+    Encola (en media_jobs) el procesamiento de un asset de video recién
+    subido. Va en la transacción del post/clip: tras el commit, el caller
+    avisa a la cola con media_queue.notify().
+    kind: "post" | "clip"
+    """
+    await enqueue_job(
+        db,
+        kind=kind,
+        asset_id=asset_id,
+        payload={"src": tmp_src, "rel": rel},
+        priority=PRIORITY_POST if kind == "post" else PRIORITY_CLIP,
+        max_attempts=settings.MEDIA_JOB_MAX_ATTEMPTS,
+    )
+    _set_stage(("asset", asset_id), "queued")
+
+
+# ---------- handlers (corren en los hilos de app/media/queue.py) ----------
+# Lanzan excepción si fallan: la cola decide si reintentar. El temporal
+# solo se borra al terminar bien (o en on_job_failed) para poder reintentar.
+
+
+def _ingest(
+    loop: asyncio.AbstractEventLoop, job, ingest, max_seconds: int | None = None
+) -> None:
+    """
+    MP4 fallback + HLS (clave del asset) desde UNA decodificación del
+    original (app/media/pipeline.py), y poster/preview sacados del MP4.
+    El estado se replica a todos los posts/clips que usan el asset.
+    Cada FFmpeg reporta su progreso al tracker del job, que se guarda en
+    media_jobs.progress (cada ~2s y al terminar, bien o mal).
+    """
+    src, rel = job.payload["src"], job.payload["rel"]
+    if not os.path.exists(src):
+        raise FileNotFoundError(f"upload temporal no encontrado: {src}")
+
+    key = ("asset", job.asset_id)
+    tracker = TranscodeTracker(
+        on_update=lambda snap: _post_on_loop(
+            loop, _save_job_progress(job.id, snap), f"progreso del job {job.id}"
+        )
+    )
+    _trackers[job.id] = tracker
+
+    def stage(name: str) -> None:
+        tracker.stage = name
+        _set_stage(key, name, job_id=job.id)
+
+    try:
+        with tracking(tracker):
+            _call_on_loop(
+                loop,
+                _save_asset_status(job.asset_id, hls_status=HLS_PROCESSING),
+                f"estado del asset {job.asset_id}",
+            )
+            stage("probing")
+            info = probe(src)
+            summary = summarize(info)
+            _call_on_loop(
+                loop,
+                _save_asset_probe(job.asset_id, summary),
+                f"probe del asset {job.asset_id}",
+            )
+            duration = (summary or {}).get("duration")
+            if duration and max_seconds:
+                duration = min(duration, max_seconds)
+            tracker.duration = duration
+            if duration:
+                transcode_metrics.media_uploaded(duration)
+
+            stage("transcoding")
+            mode = ingest(src, _abs_media(rel), media_key(rel), info)
+            stage("thumbnails")
+            poster, preview = make_thumbnails(rel, summary)
+
+            tracker.outputs = _output_bytes(
+                rel, media_key(rel), {"poster": poster, "preview": preview}
+            )
+            if duration:
+                transcode_metrics.media_encoded(
+                    duration,
+                    tracker.wall_seconds("transcoding"),
+                    sum(tracker.outputs.values()),
+                )
+    finally:
+        _trackers.pop(job.id, None)
+        _call_on_loop(
+            loop,
+            _save_job_progress(job.id, tracker.snapshot()),
+            f"progreso del job {job.id}",
+        )
+
+    snap = tracker.snapshot()
+    log.info(
+        f"🎬 Asset {job.asset_id} listo ({mode}) en {snap['wall']}s "
+        f"(cpu {snap['cpu']}s, {sum(tracker.outputs.values()) // 1024} KB)"
+    )
+    _call_on_loop(
+        loop,
+        _save_asset_status(
+            job.asset_id,
+            status=MEDIA_READY,
+            hls_status=HLS_READY,
+            poster_path=poster,
+            preview_path=preview,
+        ),
+        f"estado del asset {job.asset_id}",
+    )
+    discard_staged(src)
+    _set_stage(key, "done")
+
+
+def _ingest_post(loop: asyncio.AbstractEventLoop, job) -> None:
+    _ingest(loop, job, ingest_post_video)
+
+
+def _ingest_clip(loop: asyncio.AbstractEventLoop, job) -> None:
+    # recorte a 120s + segmentos HLS cortos
+    _ingest(loop, job, ingest_clip_video, CLIP_MAX_SECONDS)
+
+
+HANDLERS = {
+    "post": _ingest_post,
+    "clip": _ingest_clip,
+}
+
+
+async def on_job_failed(job, error: str) -> None:
+    """
+    Sin más reintentos: el asset (y sus posts/clips) queda en failed y se
+    borra el upload temporal.
+    """
+    if job.asset_id:
+        _set_stage(("asset", job.asset_id), "failed", error)
+        await _save_asset_status(job.asset_id, status=MEDIA_FAILED, hls_status=HLS_FAILED)
+    src = (job.payload or {}).get("src")
+    if src:
+        await asyncio.to_thread(discard_staged, src)
+
+
+async def backfill_hls_status() -> int:
+    """
+    Posts de video que aún no tienen hls_status (creados antes de existir
+    la columna): se revisa el disco UNA sola vez y se deja registrado.
+    Los videos siempre se normalizan a .mp4 → así los distinguimos.
+
+    Sin master.m3u8 quedan en HLS_FAILED (el cliente usa el MP4): no tienen
+    asset ni original en _tmp para encolar un job. También se corrigen los
+    que una versión anterior dejó en HLS_PENDING (sin asset_id = legacy;
+    los posts nuevos siempre tienen asset y job).
+    """
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(
+            select(Post.id).where(
+                Post.media_path.like("%.mp4"),
+                or_(
+                    Post.hls_status.is_(None),
+                    (Post.hls_status == HLS_PENDING) & Post.asset_id.is_(None),
+                ),
+            )
+        )
+        ids = list(res.scalars())
+        for post_id in ids:
+            exists = await asyncio.to_thread(os.path.exists, hls_abs_master(post_id))
+            await update_post_status(
+                db, post_id, hls_status=HLS_READY if exists else HLS_FAILED
+            )
+        await db.commit()
+    return len(ids)
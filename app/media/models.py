@@ -0,0 +1,174 @@
+# app/media/models.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import (
+    String,
+    Integer,
+    Boolean,
+    BigInteger,
+    DateTime,
+    Text,
+    func,
+    ForeignKey,
+    UniqueConstraint,
+    Index,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.base import Base
+
+
+class MediaAsset(Base):
+    """
+    Archivo de media direccionado por contenido.
+
+    Identidad = (sha256 del upload original, perfil de transcodificación).
+    Si alguien sube el mismo video/imagen otra vez se reutiliza el MP4
+    normalizado y el HLS ya generados; posts/clips apuntan aquí y
+    `refcount` cuenta cuántos lo usan. Los archivos solo se borran cuando
+    se va la última referencia.
+    """
+    __tablename__ = "media_assets"
+    __table_args__ = (
+        UniqueConstraint("sha256", "profile", name="uq_media_asset_sha_profile"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    # p.ej. "post-v1", "clip-v1", "image" (ver app/media/storage.py)
+    profile: Mapped[str] = mapped_column(String(32), nullable=False)
+
+    # ruta relativa en /media (p.ej. "posts/<sha>-post-v1.mp4")
+    media_path: Mapped[str] = mapped_column(String(255), nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    # mismos valores que posts.media_status / posts.hls_status
+    status: Mapped[str] = mapped_column(String(16), nullable=False)
+    hls_status: Mapped[str | None] = mapped_column(String(16), nullable=True)
+
+    # 🖼️ poster (JPEG) y preview animado (WebP) de un video, junto al MP4
+    # (None = imagen, aún en proceso o no se pudo extraer)
+    poster_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    preview_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    # 🖼️ imágenes: variantes WebP por ancho (manifest de app/media/images.py)
+    variants: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    refcount: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default="1"
+    )
+
+    # ffprobe del original: width/height/fps/duration/bitrates/códecs
+    # (app.media.probe.summarize); lo usa el ladder adaptativo
+    probe: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    created_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class MediaJob(Base):
+    """
+    Job persistido de procesamiento de media (cola durable).
+
+    Lo encola el endpoint de subida en la MISMA transacción que crea el
+    post/clip, lo ejecuta el pool de app/media/queue.py y sobrevive a
+    reinicios: los `running` cuyo dueño murió (heartbeat vencido o pid
+    muerto en el mismo host) vuelven a `queued`.
+    """
+    __tablename__ = "media_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+    # "post" | "clip" (handler en app/media/jobs.py)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    asset_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("media_assets.id", ondelete="CASCADE"),
+        nullable=True,
+        index=True,
+    )
+    # datos del handler, p.ej. {"src": "<_tmp/...>", "rel": "posts/..."}
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+
+    # queued → running → done | failed (app/media/status.py)
+    state: Mapped[str] = mapped_column(String(16), nullable=False)
+    # mayor = antes
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="3")
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # 📈 progreso del último intento (TranscodeTracker.snapshot de
+    # app/media/scheduler.py): %, velocidad, wall/CPU y bytes por corrida
+    progress: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    # proceso que lo corre ("host:pid:token") y su último latido
+    # (app/media/queue.py); un heartbeat viejo = dueño muerto
+    owner: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    heartbeat_at: Mapped["DateTime | None"] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    # no se toma antes de esta hora (backoff de reintentos)
+    run_after: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    created_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    started_at: Mapped["DateTime | None"] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    finished_at: Mapped["DateTime | None"] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    updated_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+# 🔎 el worker busca: state='queued' ORDER BY priority DESC, id (run_after <= now)
+Index(
+    "ix_media_jobs_claim",
+    MediaJob.state,
+    MediaJob.priority.desc(),
+    MediaJob.id,
+)
+
+
+class UploadSession(Base):
+    """
+    Subida reanudable en curso (app/media/uploads.py).
+
+    El cliente crea la sesión con el tamaño total, manda el archivo en
+    bloques (PUT con offset) a _tmp/upload-<id>.part y, cuando está
+    completo, publica el post/clip con upload_id en vez de file. `received`
+    es lo confirmado: si la conexión se corta, el cliente lo consulta y
+    sigue desde ahí. Sin actividad en UPLOAD_SESSION_TTL_HOURS expira.
+    """
+    __tablename__ = "upload_sessions"
+
+    # uuid4 hex (es también el nombre del .part)
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    # "post" | "clip" (app.media.storage.UPLOAD_TARGETS)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    filename: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    content_type: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    is_video: Mapped[bool] = mapped_column(Boolean, nullable=False)
+
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    received: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+
+    expires_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    created_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,218 @@
+# app/media/pipeline.py
+from __future__ import annotations
+
+import os
+
+from app.core.config import settings
+from app.media.hls import (
+    LADDER,
+    _ffmpeg,
+    _has_audio,
+    generate_hls_ladder_sequential,
+    ladder_filter,
+    ladder_output_args,
+    plan_ladder,
+    remux_hls,
+    staged_hls,
+    x264_tune,
+)
+from app.media.probe import probe, can_stream_copy, summarize
+from app.media.storage import (
+    CLIP_MAX_SECONDS,
+    mp4_output_args,
+    _normalize_video,
+    _normalize_clip_video,
+)
+from app.media.scheduler import run_ffmpeg, input_thread_args
+
+# cómo se produjo el media de un post/clip (para logs / métricas)
+INGEST_COPY = "copy"        # remux sin recodificar (MP4 + HLS)
+INGEST_LADDER = "ladder"    # 1 decodificación → MP4 + 3 calidades HLS (o MP4 remuxeado)
+INGEST_SINGLE = "single"    # MP4 normalizado → HLS remuxeado de ese MP4
+
+
+def _run(cmd: list[str], dst: str, what: str) -> None:
+    proc = run_ffmpeg(cmd, what)
+    if proc.returncode != 0 or not os.path.exists(dst):
+        raise RuntimeError(proc.stderr or proc.stdout or f"ffmpeg error ({what})")
+
+
+def _trim_args(max_seconds: int | None) -> list[str]:
+    # opción de ENTRADA: recorta la lectura, vale para todas las salidas
+    return ["-t", str(max_seconds)] if max_seconds else []
+
+
+def _remux_mp4(src_abs: str, dst_abs: str, max_seconds: int | None = None) -> None:
+    _run(
+        [
+            _ffmpeg(),
+            "-y",
+            "-v",
+            "error",
+            *_trim_args(max_seconds),
+            "-i",
+            src_abs,
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            dst_abs,
+        ],
+        dst_abs,
+        "remux MP4",
+    )
+
+
+def _fits_ladder(summary: dict | None) -> bool:
+    """
+    ¿Copiar el original como HLS de 1 calidad da lo mismo que el ladder?
+    Solo si no supera la calidad más alta (altura y bitrate de video):
+    si no, el HLS copiado sería 1 variante a bitrate completo, sin ABR.
+    Sin datos del original → no.
+    """
+    if not summary or not summary.get("height") or not summary.get("video_bitrate"):
+        return False
+    top = LADDER[-1]
+    return (
+        summary["height"] <= top.height
+        and summary["video_bitrate"] <= top.video_kbps * 1000
+    )
+
+
+def _encode_mp4_and_ladder(
+    src_abs: str,
+    dst_abs: str,
+    key: int | str,
+    summary: dict | None,
+    seg_seconds: int | None = None,
+    max_seconds: int | None = None,
+    copy_mp4: bool = False,
+) -> None:
+    """
+    Un solo FFmpeg con dos salidas: el MP4 progresivo (resolución original)
+    y el ladder HLS adaptado al original (plan_ladder). El original se
+    decodifica UNA vez y `split` reparte los frames; nada se codifica a
+    partir de otra salida ya comprimida.
+
+    copy_mp4: el original ya sirve como MP4 (can_stream_copy) → se remuxea
+    aparte y el FFmpeg solo codifica el ladder.
+    """
+    if copy_mp4:
+        _remux_mp4(src_abs, dst_abs, max_seconds)
+    renditions = plan_ladder(summary)
+    audio = summary["audio"] if summary else _has_audio(src_abs)
+    extra = 0 if copy_mp4 else 1
+    with staged_hls(key) as outdir:
+        cmd = [
+            _ffmpeg(),
+            "-y",
+            "-v",
+            "error",
+            *input_thread_args(),
+            *_trim_args(max_seconds),
+            "-i",
+            src_abs,
+            "-filter_complex",
+            ladder_filter(renditions, extra=extra),
+        ]
+        encoders = len(renditions) + extra
+        if not copy_mp4:
+            # salida 1: MP4 fallback
+            cmd += ["-map", "[x0]"]
+            if audio:
+                cmd += ["-map", "0:a:0"]
+            cmd += [*mp4_output_args(encoders), dst_abs]
+        # salida 2: HLS (var_stream_map + master), publicado al salir del with
+        cmd += ladder_output_args(
+            outdir, audio, renditions, encoders, x264_tune(summary), seg_seconds
+        )
+
+        _run(cmd, os.path.join(outdir, "master.m3u8"), "MP4 + HLS ladder")
+        if not os.path.exists(dst_abs):
+            raise RuntimeError("ffmpeg no generó el MP4")
+
+
+def _ingest_video(
+    src_abs: str,
+    dst_abs: str,
+    key: int | str,
+    info: dict | None,
+    *,
+    seg_seconds: int | None = None,
+    max_seconds: int | None = None,
+) -> str:
+    """
+    Produce el MP4 fallback (dst_abs) y el HLS (/hls/<key>/) de un video
+    recién subido, decodificando el original a lo sumo una vez:
+
+    - el original ya cumple códec/perfil del MP4 (baseline) y, con ladder,
+      no supera la calidad más alta → remux (-c copy) de ambos
+    - ladder activo → un FFmpeg con las dos salidas (ver arriba); si el
+      original ya sirve como MP4, ese se remuxea y solo se codifica el ladder
+    - 1 calidad → se normaliza (o remuxea) el MP4 y el HLS se remuxea de él
+      (es el mismo encode, no hace falta otro)
+
+    info = salida de app.media.probe.probe (si no, se sondea aquí).
+    No borra src_abs. Devuelve el modo usado (INGEST_*).
+    """
+    if info is None:
+        info = probe(src_abs)
+    summary = summarize(info)
+    copy_mp4 = can_stream_copy(info)
+    if copy_mp4 and (not settings.HLS_USE_LADDER or _fits_ladder(summary)):
+        _remux_mp4(src_abs, dst_abs, max_seconds)
+        remux_hls(src_abs, key, seg_seconds, max_seconds)
+        return INGEST_COPY
+
+    normalize = _normalize_clip_video if max_seconds else _normalize_video
+
+    if settings.HLS_USE_LADDER and not settings.HLS_SINGLE_DECODE:
+        # modo antiguo (3 FFmpeg sobre el MP4 normalizado), solo como fallback
+        if copy_mp4:
+            _remux_mp4(src_abs, dst_abs, max_seconds)
+        else:
+            normalize(src_abs, dst_abs)
+        generate_hls_ladder_sequential(dst_abs, key, summary, seg_seconds)
+        return INGEST_LADDER
+
+    if settings.HLS_USE_LADDER:
+        _encode_mp4_and_ladder(
+            src_abs, dst_abs, key, summary, seg_seconds, max_seconds, copy_mp4
+        )
+        return INGEST_LADDER
+
+    # el HLS sale del MP4 sin recodificar: keyframes ya cada segmento
+    seg = seg_seconds or settings.HLS_SEG_SECONDS
+    normalize(src_abs, dst_abs, seg)
+    remux_hls(dst_abs, key, seg)
+    return INGEST_SINGLE
+
+
+def ingest_post_video(
+    src_abs: str, dst_abs: str, key: int | str, info: dict | None = None
+) -> str:
+    """
+    Post: MP4 + HLS con segmentos de HLS_SEG_SECONDS.
+    """
+    return _ingest_video(src_abs, dst_abs, key, info)
+
+
+def ingest_clip_video(
+    src_abs: str, dst_abs: str, key: int | str, info: dict | None = None
+) -> str:
+    """
+    Clip: recortado a CLIP_MAX_SECONDS, con segmentos cortos
+    (CLIP_HLS_SEG_SECONDS) para que cada swipe arranque rápido.
+    """
+    return _ingest_video(
+        src_abs,
+        dst_abs,
+        key,
+        info,
+        seg_seconds=settings.CLIP_HLS_SEG_SECONDS,
+        max_seconds=CLIP_MAX_SECONDS,
+    )
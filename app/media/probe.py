@@ -0,0 +1,196 @@
+# app/media/probe.py
+"""
+Datos del original con ffprobe. ffprobe es requisito de runtime (viene
+con FFmpeg): sin él no hay stream copy, el ladder no se adapta al
+original (se escala hacia arriba) y el poster sale del frame 0. Si falta
+se avisa al arrancar y se sigue transcodificando todo.
+"""
+from __future__ import annotations
+
+import json
+import shutil
+import logging
+import subprocess
+
+log = logging.getLogger("uvicorn")
+
+
+# Lo que reproducen todos los clientes sin transcodificar: el mismo objetivo
+# que el MP4 fallback (_normalize_video / mp4_output_args: H.264 baseline @ 3.1).
+COPY_VIDEO_CODECS = {"h264"}
+COPY_VIDEO_PROFILES = {"baseline", "constrained baseline"}
+COPY_MAX_LEVEL = 31
+COPY_PIX_FMTS = {"yuv420p", "yuvj420p"}
+COPY_AUDIO_CODECS = {"aac"}
+
+
+def _ffprobe() -> str | None:
+    return shutil.which("ffprobe")
+
+
+if _ffprobe() is None:
+    log.warning(
+        "⚠️ ffprobe no está en PATH: sin stream copy ni ladder adaptado al "
+        "original (se transcodifica todo con el ladder completo)."
+    )
+
+
+def probe(path: str) -> dict | None:
+    """
+    Metadatos del archivo con ffprobe (formato + streams, JSON).
+    Devuelve None si ffprobe no está instalado o no pudo leerlo:
+    el caller debe asumir lo peor (transcodificar).
+    """
+    exe = _ffprobe()
+    if not exe:
+        return None
+    proc = subprocess.run(
+        [
+            exe,
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    try:
+        return json.loads(proc.stdout or "{}")
+    except ValueError:
+        return None
+
+
+def video_stream(info: dict) -> dict | None:
+    for s in info.get("streams") or []:
+        if s.get("codec_type") == "video" and not (s.get("disposition") or {}).get(
+            "attached_pic"
+        ):
+            return s
+    return None
+
+
+def audio_stream(info: dict) -> dict | None:
+    for s in info.get("streams") or []:
+        if s.get("codec_type") == "audio":
+            return s
+    return None
+
+
+def _rotation(stream: dict) -> int:
+    rot = (stream.get("tags") or {}).get("rotate")
+    for side in stream.get("side_data_list") or []:
+        if "rotation" in side:
+            rot = side["rotation"]
+    try:
+        return int(float(rot or 0)) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+def can_stream_copy(info: dict | None) -> bool:
+    """
+    ¿El original ya cumple el códec/perfil del MP4 fallback? Entonces el MP4
+    se arma remuxeando (-c copy), sin decodificar ni recodificar. Si el HLS
+    también se puede copiar lo decide app/media/pipeline.py (tamaño y
+    bitrate contra el ladder).
+    """
+    if not info:
+        return False
+    v = video_stream(info)
+    if v is None:
+        return False
+    if (v.get("codec_name") or "").lower() not in COPY_VIDEO_CODECS:
+        return False
+    if (v.get("profile") or "").lower() not in COPY_VIDEO_PROFILES:
+        return False
+    if (v.get("pix_fmt") or "").lower() not in COPY_PIX_FMTS:
+        return False
+    try:
+        if int(v.get("level") or 0) > COPY_MAX_LEVEL:
+            return False
+    except (TypeError, ValueError):
+        return False
+    # videos de celular grabados en vertical: la rotación va en metadatos
+    # y no todos los reproductores de HLS la respetan
+    if _rotation(v):
+        return False
+
+    a = audio_stream(info)
+    if a is not None and (a.get("codec_name") or "").lower() not in COPY_AUDIO_CODECS:
+        return False
+    return True
+
+
+def _ratio(value: str | None) -> float | None:
+    """
+    "30000/1001" → 29.97
+    """
+    if not value:
+        return None
+    try:
+        num, _, den = str(value).partition("/")
+        return round(float(num) / float(den or 1), 3) if float(den or 1) else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _int(value) -> int | None:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _seconds(value) -> float | None:
+    try:
+        return round(float(value), 3) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize(info: dict | None) -> dict | None:
+    """
+    Lo que guardamos del original en media_assets.probe: resolución
+    (ya rotada, como se ve), fps, duración, bitrates y códecs.
+    """
+    if not info:
+        return None
+    v = video_stream(info)
+    if v is None:
+        return None
+    a = audio_stream(info)
+    fmt = info.get("format") or {}
+
+    width, height = _int(v.get("width")), _int(v.get("height"))
+    rotation = _rotation(v)
+    if rotation in (90, 270):
+        width, height = height, width
+
+    bitrate = _int(fmt.get("bit_rate"))
+    audio_bitrate = _int(a.get("bit_rate")) if a else None
+    video_bitrate = _int(v.get("bit_rate"))
+    if video_bitrate is None and bitrate:
+        video_bitrate = max(0, bitrate - (audio_bitrate or 0)) or None
+
+    return {
+        "width": width,
+        "height": height,
+        "rotation": rotation,
+        "fps": _ratio(v.get("avg_frame_rate")) or _ratio(v.get("r_frame_rate")),
+        "duration": _seconds(fmt.get("duration") or v.get("duration")),
+        "bitrate": bitrate,
+        "video_bitrate": video_bitrate,
+        "audio_bitrate": audio_bitrate,
+        "vcodec": v.get("codec_name"),
+        "profile": v.get("profile"),
+        "level": _int(v.get("level")),
+        "pix_fmt": v.get("pix_fmt"),
+        "acodec": a.get("codec_name") if a else None,
+        "audio": a is not None,
+    }
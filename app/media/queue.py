@@ -0,0 +1,291 @@
+# app/media/queue.py
+"""
+Cola durable de procesamiento de media (tabla media_jobs).
+
+- Los endpoints de subida encolan el job en la misma transacción que el
+  post/clip y después llaman a media_queue.notify().
+- Un número FIJO de workers (presupuesto de app/media/scheduler.py) toma
+  jobs por prioridad con SELECT ... FOR UPDATE SKIP LOCKED y corre el
+  handler (FFmpeg) en su propio pool de hilos, nunca en el event loop. Una ráfaga de uploads
+  queda esperando en la tabla en vez de lanzar N FFmpeg a la vez.
+- Si el handler falla se reintenta con backoff exponencial
+  (MEDIA_JOB_RETRY_SECONDS · 2^(intento-1), tope 1h) hasta
+  MEDIA_JOB_MAX_ATTEMPTS; después el job queda `failed` con su last_error.
+- Cada job `running` tiene dueño ("host:pid:token" del proceso que lo
+  tomó) y un heartbeat cada MEDIA_JOB_HEARTBEAT_SECONDS. Al arrancar y en
+  cada latido, solo vuelven a `queued` los jobs de dueños muertos: sin
+  latido en MEDIA_JOB_STALE_SECONDS, o pid que ya no existe en este host.
+  Así varios workers de uvicorn, un rolling restart o el reload de
+  run_dev.py no le roban el job a un proceso vivo.
+- En el shutdown se matan los FFmpeg en curso y sus jobs vuelven a la
+  cola (sin gastar el intento).
+"""
+from __future__ import annotations
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.media.jobs import HANDLERS, on_job_failed
+from app.media.scheduler import BUDGET, kill_ffmpeg, transcode_metrics
+from app.media.repository import (
+    claim_next_job,
+    finish_job,
+    retry_job,
+    fail_job,
+    heartbeat_jobs,
+    running_job_owners,
+    requeue_orphaned_jobs,
+    release_jobs,
+    count_jobs_by_state,
+)
+
+log = logging.getLogger("uvicorn")
+
+# estos errores no se arreglan reintentando (p.ej. se borró el upload)
+_NO_RETRY = (FileNotFoundError, KeyError)
+
+_MAX_BACKOFF_SECONDS = 3600.0
+
+# cuánto se espera en el shutdown a que los handlers terminen tras matar FFmpeg
+_SHUTDOWN_WAIT_SECONDS = 10.0
+
+_HOST = socket.gethostname()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _dead_local_owners(owners: list[str], me: str) -> list[str]:
+    """
+    Dueños de este mismo host cuyo proceso ya no existe. El token separa a
+    un proceso nuevo que reusó el pid (contenedores: pid 1) del muerto.
+    """
+    dead = []
+    for owner in owners:
+        host, _, rest = owner.partition(":")
+        pid, _, _token = rest.partition(":")
+        if host != _HOST or owner == me or not pid.isdigit():
+            continue
+        if int(pid) == os.getpid() or not _pid_alive(int(pid)):
+            dead.append(owner)
+    return dead
+
+
+class MediaJobQueue:
+    def __init__(
+        self,
+        workers: int,
+        poll_interval: float,
+        retry_base: float,
+        heartbeat: float,
+        stale: float,
+    ):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.heartbeat = heartbeat
+        self.stale = timedelta(seconds=stale)
+        self.owner = ""
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._heartbeat_task: asyncio.Task | None = None
+        self._pool: ThreadPoolExecutor | None = None
+
+    def notify(self) -> None:
+        """
+        Hay jobs nuevos: despierta a los workers sin esperar al poll.
+        """
+        self._wake.set()
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.retry_base * (2 ** max(0, attempts - 1)), _MAX_BACKOFF_SECONDS)
+
+    async def _claim(self):
+        async with AsyncSessionLocal() as db:
+            job = await claim_next_job(db, self.owner)
+            await db.commit()
+        return job
+
+    async def _execute(self, job) -> None:
+        loop = asyncio.get_running_loop()
+        if job.started_at is not None and job.run_after is not None:
+            transcode_metrics.job_waited((job.started_at - job.run_after).total_seconds())
+        handler = HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise KeyError(f"tipo de job desconocido: {job.kind}")
+            if job.attempts > job.max_attempts:
+                # se reencoló al arrancar pero ya no le quedan intentos
+                raise RuntimeError(job.last_error or "sin intentos restantes")
+            await loop.run_in_executor(self._pool, handler, loop, job)
+        except Exception as e:
+            if self._stopping:
+                # FFmpeg cortado por el shutdown: no es un fallo del job
+                async with AsyncSessionLocal() as db:
+                    await release_jobs(db, self.owner, job.id)
+                    await db.commit()
+                return
+            error = f"{e!r}"[:2000]
+            final = isinstance(e, _NO_RETRY) or job.attempts >= job.max_attempts
+            async with AsyncSessionLocal() as db:
+                if final:
+                    await fail_job(db, job.id, self.owner, error)
+                else:
+                    await retry_job(
+                        db, job.id, self.owner, error, self._backoff(job.attempts)
+                    )
+                await db.commit()
+            if final:
+                log.error(f"❌ Job de media {job.id} ({job.kind}) falló: {error}")
+                await on_job_failed(job, error)
+            else:
+                log.warning(
+                    f"⚠️ Job de media {job.id} ({job.kind}) intento "
+                    f"{job.attempts}/{job.max_attempts} falló, se reintenta: {error}"
+                )
+            return
+
+        async with AsyncSessionLocal() as db:
+            await finish_job(db, job.id, self.owner)
+            await db.commit()
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                log.error(f"❌ Cola de media: no se pudo tomar un job: {e!r}")
+                job = None
+
+            if job is None:
+                if self._stopping:
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+
+            if self._stopping:
+                # se tomó justo cuando empezaba el shutdown
+                async with AsyncSessionLocal() as db:
+                    await release_jobs(db, self.owner, job.id)
+                    await db.commit()
+                break
+
+            try:
+                await self._execute(job)
+            except Exception as e:
+                # p.ej. la DB no respondió al guardar el resultado: el job
+                # queda `running` y otro proceso lo retoma cuando este muera
+                log.error(f"❌ Cola de media: job {job.id} sin cerrar: {e!r}")
+
+    async def counts(self) -> dict[str, int]:
+        """
+        Jobs por estado (para /api/media/metrics/).
+        """
+        async with AsyncSessionLocal() as db:
+            return await count_jobs_by_state(db)
+
+    async def _requeue_orphaned(self) -> int:
+        async with AsyncSessionLocal() as db:
+            dead = _dead_local_owners(await running_job_owners(db), self.owner)
+            n = await requeue_orphaned_jobs(db, self.stale, dead)
+            await db.commit()
+        if n:
+            log.info(f"🎬 {n} jobs de media de procesos caídos vuelven a la cola.")
+            self._wake.set()
+        return n
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await heartbeat_jobs(db, self.owner)
+                    await db.commit()
+                await self._requeue_orphaned()
+            except Exception as e:
+                log.error(f"❌ Cola de media: heartbeat falló: {e!r}")
+
+    async def start(self) -> None:
+        """
+        Hook de startup: retoma jobs de procesos caídos y lanza los workers
+        y el heartbeat.
+        """
+        if self._tasks:
+            return
+        self.owner = f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        await self._requeue_orphaned()
+
+        self._stopping = False
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="media-ingest"
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._wake.set()
+
+    async def stop(self) -> None:
+        """
+        Hook de shutdown: deja de tomar jobs y mata los FFmpeg en curso. Los
+        workers terminan su job actual (un job cortado vuelve a la cola sin
+        gastar el intento; uno que ya había terminado se cierra normal).
+        Lo que no termine en _SHUTDOWN_WAIT_SECONDS se devuelve a la cola.
+        """
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wake.set()
+        n = kill_ffmpeg()
+        if n:
+            log.info(f"🎬 {n} FFmpeg cortados por el shutdown.")
+
+        _done, pending = await asyncio.wait(self._tasks, timeout=_SHUTDOWN_WAIT_SECONDS)
+        for task in [*pending, self._heartbeat_task]:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._heartbeat_task = None
+        if pending:
+            log.warning(f"⚠️ Cola de media: {len(pending)} workers sin terminar al apagar.")
+            kill_ffmpeg()  # por si alguno arrancó justo después del primer kill
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+        try:
+            async with AsyncSessionLocal() as db:
+                n = await release_jobs(db, self.owner)
+                await db.commit()
+            if n:
+                log.info(f"🎬 {n} jobs de media vuelven a la cola por el shutdown.")
+        except Exception as e:
+            log.error(f"❌ Cola de media: no se pudieron liberar los jobs: {e!r}")
+
+
+media_queue = MediaJobQueue(
+    workers=BUDGET.workers,
+    poll_interval=settings.MEDIA_JOB_POLL_SECONDS,
+    retry_base=settings.MEDIA_JOB_RETRY_SECONDS,
+    heartbeat=settings.MEDIA_JOB_HEARTBEAT_SECONDS,
+    stale=settings.MEDIA_JOB_STALE_SECONDS,
+)
@@ -0,0 +1,474 @@
+# app/media/repository.py
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, delete, literal_column, func, desc, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.media.models import MediaAsset, MediaJob, UploadSession
+from app.media.status import JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from app.feed.models import Post
+from app.clips.models import Clip
+
+
+async def acquire_asset(
+    db: AsyncSession,
+    *,
+    sha256: str,
+    profile: str,
+    media_path: str,
+    size: int,
+    status: str,
+    hls_status: str | None = None,
+) -> tuple[MediaAsset, bool]:
+    """
+    Toma una referencia al asset (sha256, profile) en UNA sentencia:
+    - no existe → se crea con refcount=1
+    - existe    → refcount + 1
+    Devuelve (asset, created).
+    """
+    stmt = (
+        pg_insert(MediaAsset)
+        .values(
+            sha256=sha256,
+            profile=profile,
+            media_path=media_path,
+            size=size,
+            status=status,
+            hls_status=hls_status,
+            refcount=1,
+        )
+        .on_conflict_do_update(
+            constraint="uq_media_asset_sha_profile",
+            set_={"refcount": MediaAsset.refcount + 1},
+        )
+        # xmax = 0 → la fila la acaba de insertar esta transacción
+        .returning(MediaAsset, literal_column("(xmax = 0)").label("created"))
+        .execution_options(populate_existing=True)
+    )
+    res = await db.execute(stmt)
+    asset, created = res.one()
+    return asset, bool(created)
+
+
+async def release_asset(db: AsyncSession, asset_id: int) -> MediaAsset | None:
+    """
+    Suelta una referencia. Si era la última, borra la fila y devuelve el
+    asset (el caller borra los archivos tras el commit). Si no, None.
+    """
+    res = await db.execute(
+        update(MediaAsset)
+        .where(MediaAsset.id == asset_id)
+        .values(refcount=MediaAsset.refcount - 1)
+        .returning(MediaAsset.refcount)
+        .execution_options(synchronize_session=False)
+    )
+    refcount = res.scalar_one_or_none()
+    if refcount is None or refcount > 0:
+        return None
+
+    res = await db.execute(
+        delete(MediaAsset)
+        .where(MediaAsset.id == asset_id, MediaAsset.refcount <= 0)
+        .returning(MediaAsset)
+    )
+    return res.scalar_one_or_none()
+
+
+async def get_asset(db: AsyncSession, asset_id: int) -> MediaAsset | None:
+    res = await db.execute(select(MediaAsset).where(MediaAsset.id == asset_id))
+    return res.scalar_one_or_none()
+
+
+async def set_asset_probe(db: AsyncSession, asset_id: int, probe: dict | None) -> None:
+    await db.execute(
+        update(MediaAsset)
+        .where(MediaAsset.id == asset_id)
+        .values(probe=probe)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def set_asset_status(
+    db: AsyncSession,
+    asset_id: int,
+    *,
+    status: str | None = None,
+    hls_status: str | None = None,
+    poster_path: str | None = None,
+    preview_path: str | None = None,
+) -> list[int]:
+    """
+    Cambia el estado del asset y lo replica en todos los posts/clips que lo
+    usan (media_status/hls_status y poster/preview).
+    Devuelve los ids de posts afectados (para invalidar cache).
+    """
+    asset_values: dict = {}
+    post_values: dict = {}
+    if status is not None:
+        asset_values["status"] = status
+        post_values["media_status"] = status
+    if hls_status is not None:
+        asset_values["hls_status"] = hls_status
+        post_values["hls_status"] = hls_status
+    if poster_path is not None:
+        asset_values["poster_path"] = post_values["poster_path"] = poster_path
+    if preview_path is not None:
+        asset_values["preview_path"] = post_values["preview_path"] = preview_path
+    if not asset_values:
+        return []
+
+    await db.execute(
+        update(MediaAsset)
+        .where(MediaAsset.id == asset_id)
+        .values(**asset_values)
+        .execution_options(synchronize_session=False)
+    )
+    res = await db.execute(
+        update(Post)
+        .where(Post.asset_id == asset_id)
+        .values(**post_values)
+        .returning(Post.id)
+        .execution_options(synchronize_session=False)
+    )
+    post_ids = list(res.scalars())
+    # clips: mismas columnas que posts
+    await db.execute(
+        update(Clip)
+        .where(Clip.asset_id == asset_id)
+        .values(**post_values)
+        .execution_options(synchronize_session=False)
+    )
+    return post_ids
+
+
+async def sync_from_asset(db: AsyncSession, model, row_id: int) -> None:
+    """
+    Copia el estado actual del asset a UN post/clip (model = Post | Clip).
+    Se usa tras el commit de un post/clip que reutilizó un asset todavía
+    en proceso: si el job terminó antes de ese commit, su
+    set_asset_status no alcanzó a ver la fila nueva.
+    """
+    await db.execute(
+        update(model)
+        .where(model.id == row_id, model.asset_id == MediaAsset.id)
+        .values(
+            media_status=MediaAsset.status,
+            hls_status=MediaAsset.hls_status,
+            poster_path=MediaAsset.poster_path,
+            preview_path=MediaAsset.preview_path,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ======================= JOBS =======================
+
+
+async def enqueue_job(
+    db: AsyncSession,
+    *,
+    kind: str,
+    asset_id: int | None,
+    payload: dict,
+    priority: int = 0,
+    max_attempts: int = 3,
+) -> MediaJob:
+    """
+    Agrega un job a la cola. No hace commit: el caller lo confirma junto con
+    el post/clip, así no queda un job sin dueño ni un post sin job.
+    """
+    job = MediaJob(
+        kind=kind,
+        asset_id=asset_id,
+        payload=payload,
+        state=JOB_QUEUED,
+        priority=priority,
+        max_attempts=max_attempts,
+    )
+    db.add(job)
+    await db.flush()
+    return job
+
+
+async def claim_next_job(db: AsyncSession, owner: str) -> MediaJob | None:
+    """
+    Toma el siguiente job listo (mayor prioridad, más viejo) y lo marca
+    `running` a nombre de `owner` en UNA sentencia. SKIP LOCKED: varios
+    workers/procesos no se pisan. No hace commit.
+    """
+    next_id = (
+        select(MediaJob.id)
+        .where(MediaJob.state == JOB_QUEUED, MediaJob.run_after <= func.now())
+        .order_by(desc(MediaJob.priority), MediaJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    res = await db.execute(
+        update(MediaJob)
+        .where(MediaJob.id == next_id)
+        .values(
+            state=JOB_RUNNING,
+            attempts=MediaJob.attempts + 1,
+            owner=owner,
+            heartbeat_at=func.now(),
+            started_at=func.now(),
+            finished_at=None,
+        )
+        .returning(MediaJob)
+        .execution_options(synchronize_session=False)
+    )
+    return res.scalar_one_or_none()
+
+
+def _owned(job_id: int, owner: str):
+    # si el job se reencoló (dueño dado por muerto) y lo tomó otro proceso,
+    # el resultado del dueño viejo no pisa al nuevo
+    return (MediaJob.id == job_id, MediaJob.state == JOB_RUNNING, MediaJob.owner == owner)
+
+
+async def finish_job(db: AsyncSession, job_id: int, owner: str) -> None:
+    await db.execute(
+        update(MediaJob)
+        .where(*_owned(job_id, owner))
+        .values(state=JOB_DONE, last_error=None, finished_at=func.now(), owner=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def set_job_progress(db: AsyncSession, job_id: int, progress: dict) -> None:
+    """
+    Guarda el snapshot de progreso salvo que ya haya uno más nuevo (los
+    parciales se mandan sin esperar y pueden llegar después del final).
+    """
+    await db.execute(
+        update(MediaJob)
+        .where(
+            MediaJob.id == job_id,
+            func.coalesce(MediaJob.progress["ts"].as_float(), 0.0) < progress["ts"],
+        )
+        .values(progress=progress)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_job(db: AsyncSession, job_id: int) -> MediaJob | None:
+    res = await db.execute(select(MediaJob).where(MediaJob.id == job_id))
+    return res.scalar_one_or_none()
+
+
+async def retry_job(
+    db: AsyncSession, job_id: int, owner: str, error: str, delay: float
+) -> None:
+    """
+    Devuelve el job a la cola para reintentar dentro de `delay` segundos.
+    """
+    run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+    await db.execute(
+        update(MediaJob)
+        .where(*_owned(job_id, owner))
+        .values(state=JOB_QUEUED, last_error=error, run_after=run_after, owner=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def fail_job(db: AsyncSession, job_id: int, owner: str, error: str) -> None:
+    await db.execute(
+        update(MediaJob)
+        .where(*_owned(job_id, owner))
+        .values(state=JOB_FAILED, last_error=error, finished_at=func.now(), owner=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def heartbeat_jobs(db: AsyncSession, owner: str) -> None:
+    """
+    Latido de los jobs que corre `owner`. No hace commit.
+    """
+    await db.execute(
+        update(MediaJob)
+        .where(MediaJob.state == JOB_RUNNING, MediaJob.owner == owner)
+        .values(heartbeat_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def running_job_owners(db: AsyncSession) -> list[str]:
+    res = await db.execute(
+        select(MediaJob.owner)
+        .where(MediaJob.state == JOB_RUNNING, MediaJob.owner.is_not(None))
+        .distinct()
+    )
+    return list(res.scalars())
+
+
+async def requeue_orphaned_jobs(
+    db: AsyncSession, stale: timedelta, dead_owners: list[str]
+) -> int:
+    """
+    Jobs `running` cuyo dueño murió (sin heartbeat en `stale`, o en
+    `dead_owners`: pid muerto en este host) vuelven a `queued`. Los de
+    procesos vivos no se tocan. El intento interrumpido cuenta para
+    max_attempts. No hace commit.
+    """
+    cutoff = datetime.now(timezone.utc) - stale
+    orphaned = or_(
+        MediaJob.heartbeat_at.is_(None),
+        MediaJob.heartbeat_at < cutoff,
+    )
+    if dead_owners:
+        orphaned = or_(orphaned, MediaJob.owner.in_(dead_owners))
+    res = await db.execute(
+        update(MediaJob)
+        .where(MediaJob.state == JOB_RUNNING, orphaned)
+        .values(state=JOB_QUEUED, run_after=func.now(), owner=None)
+        .returning(MediaJob.id)
+        .execution_options(synchronize_session=False)
+    )
+    return len(res.all())
+
+
+async def release_jobs(db: AsyncSession, owner: str, job_id: int | None = None) -> int:
+    """
+    Shutdown ordenado: los jobs que corría `owner` (o solo `job_id`), con
+    el FFmpeg ya cortado, vuelven a `queued` sin gastar el intento.
+    No hace commit.
+    """
+    where = [MediaJob.state == JOB_RUNNING, MediaJob.owner == owner]
+    if job_id is not None:
+        where.append(MediaJob.id == job_id)
+    res = await db.execute(
+        update(MediaJob)
+        .where(*where)
+        .values(
+            state=JOB_QUEUED,
+            run_after=func.now(),
+            owner=None,
+            attempts=func.greatest(MediaJob.attempts - 1, 0),
+        )
+        .returning(MediaJob.id)
+        .execution_options(synchronize_session=False)
+    )
+    return len(res.all())
+
+
+async def user_uses_asset(db: AsyncSession, asset_id: int, user_id: int) -> bool:
+    """
+    ¿Algún post o clip de `user_id` usa el asset? (un asset deduplicado
+    puede ser de varios usuarios)
+    """
+    res = await db.execute(
+        select(
+            select(Post.id).where(Post.asset_id == asset_id, Post.user_id == user_id).exists()
+            | select(Clip.id).where(Clip.asset_id == asset_id, Clip.user_id == user_id).exists()
+        )
+    )
+    return bool(res.scalar())
+
+
+async def get_latest_job(db: AsyncSession, asset_id: int) -> MediaJob | None:
+    res = await db.execute(
+        select(MediaJob)
+        .where(MediaJob.asset_id == asset_id)
+        .order_by(desc(MediaJob.id))
+        .limit(1)
+    )
+    return res.scalar_one_or_none()
+
+
+async def count_jobs_by_state(db: AsyncSession) -> dict[str, int]:
+    res = await db.execute(
+        select(MediaJob.state, func.count()).group_by(MediaJob.state)
+    )
+    return {state: n for state, n in res.all()}
+
+
+# 📶 Subidas reanudables (app/media/uploads.py)
+
+
+async def create_upload_session(
+    db: AsyncSession,
+    *,
+    session_id: str,
+    user_id: int,
+    kind: str,
+    filename: str | None,
+    content_type: str | None,
+    is_video: bool,
+    size: int,
+    ttl: timedelta,
+) -> UploadSession:
+    upload = UploadSession(
+        id=session_id,
+        user_id=user_id,
+        kind=kind,
+        filename=filename,
+        content_type=content_type,
+        is_video=is_video,
+        size=size,
+        received=0,
+        expires_at=datetime.now(timezone.utc) + ttl,
+    )
+    db.add(upload)
+    await db.flush()
+    return upload
+
+
+async def get_upload_session(db: AsyncSession, session_id: str) -> UploadSession | None:
+    """
+    Sesión vigente (las expiradas se tratan como inexistentes aunque el
+    reaper todavía no las haya borrado).
+    """
+    res = await db.execute(
+        select(UploadSession).where(
+            UploadSession.id == session_id,
+            UploadSession.expires_at > func.now(),
+        )
+    )
+    return res.scalar_one_or_none()
+
+
+async def advance_upload(
+    db: AsyncSession, session_id: str, start: int, end: int, ttl: timedelta
+) -> int | None:
+    """
+    Confirma que [start, end) ya está escrito en el .part. Vale si lo
+    confirmado llega al menos hasta start (reenvíos del mismo bloque tras
+    un corte son idempotentes: el contenido en cada offset es el mismo).
+    Renueva la expiración. Devuelve el offset confirmado (None = no existe).
+    """
+    res = await db.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == session_id,
+            UploadSession.received >= start,
+            UploadSession.received < end,
+        )
+        .values(received=end, expires_at=datetime.now(timezone.utc) + ttl)
+        .returning(UploadSession.received)
+        .execution_options(synchronize_session=False)
+    )
+    received = res.scalar_one_or_none()
+    if received is not None:
+        return received
+    res = await db.execute(
+        select(UploadSession.received).where(UploadSession.id == session_id)
+    )
+    return res.scalar_one_or_none()
+
+
+async def delete_upload_session(db: AsyncSession, session_id: str) -> None:
+    await db.execute(delete(UploadSession).where(UploadSession.id == session_id))
+
+
+async def delete_expired_upload_sessions(db: AsyncSession) -> list[str]:
+    """
+    Borra las sesiones vencidas y devuelve sus ids (para borrar los .part).
+    """
+    res = await db.execute(
+        delete(UploadSession)
+        .where(UploadSession.expires_at <= func.now())
+        .returning(UploadSession.id)
+    )
+    return list(res.scalars())
@@ -0,0 +1,197 @@
+# app/media/router.py
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.json import UTF8JSONResponse
+from app.core.security import decode_access_token
+from app.db.session import get_session
+from app.media.cache import file_meta_cache, hot_object_cache
+from app.media.jobs import live_job_progress
+from app.media.queue import media_queue
+from app.media.repository import get_job, user_uses_asset
+from app.media.scheduler import transcode_metrics
+from app.media.schemas import UploadSessionIn, UploadSessionOut
+from app.media.storage import UploadTooLarge
+from app.media.uploads import (
+    UploadSessionError,
+    cancel_upload,
+    create_upload,
+    get_user_upload,
+    upload_out,
+    write_chunk,
+)
+
+router = APIRouter(
+    prefix="/api/media",
+    tags=["media"],
+    default_response_class=UTF8JSONResponse,
+)
+
+
+def _user_id(token: str | None, authorization: str | None) -> int:
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization.split(" ", 1)[1]
+    if not token:
+        raise HTTPException(status_code=401, detail="missing token")
+    try:
+        return int(decode_access_token(token))
+    except Exception:
+        raise HTTPException(status_code=401, detail="invalid token")
+
+
+@router.get("/metrics/", response_model=dict)
+async def media_metrics(
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
+):
+    """
+    Presupuesto de CPU de transcodificación, uso de cores por FFmpeg,
+    espera en cola (avg/p95/max), velocidad de encode, segundos de video
+    subidos vs codificados en la última hora (falling_behind), jobs por
+    estado, hit ratio del cache de stat/ETag de /media y /hls y del tier
+    en memoria (bytes servidos sin tocar el disco). Requiere token.
+    """
+    _user_id(token, authorization)
+    stats = transcode_metrics.stats()
+    # cache de stat/ETag de /media y /hls (app/media/cache.py)
+    stats["file_meta_cache"] = file_meta_cache.stats()
+    # tier en memoria de objetos chicos y calientes (hits, bytes ahorrados)
+    stats["hot_object_cache"] = hot_object_cache.stats()
+    try:
+        stats["jobs_by_state"] = await media_queue.counts()
+    except Exception:
+        stats["jobs_by_state"] = None
+    return stats
+
+
+@router.get("/jobs/{job_id}/", response_model=dict)
+async def media_job_status(
+    job_id: int,
+    db: AsyncSession = Depends(get_session),
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
+):
+    """
+    Estado de un job de media con su progreso de FFmpeg: en vivo si corre
+    en este proceso, si no el último guardado en media_jobs.progress.
+    Solo para el dueño de un post/clip que use el asset del job. El error
+    crudo (stderr de FFmpeg, con rutas del servidor) no sale: va al log.
+    """
+    user_id = _user_id(token, authorization)
+    job = await get_job(db, job_id)
+    # el de otro usuario se responde igual que uno inexistente
+    if job is None or job.asset_id is None or not await user_uses_asset(
+        db, job.asset_id, user_id
+    ):
+        raise HTTPException(status_code=404, detail="job not found")
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "asset_id": job.asset_id,
+        "state": job.state,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "progress": live_job_progress(job.id) or job.progress,
+    }
+
+
+# ======================= SUBIDAS REANUDABLES =======================
+# Protocolo completo en app/media/uploads.py. Se termina publicando con
+# upload_id en POST /api/feed/ o POST /api/clips/.
+
+
+def upload_http_error(e: UploadSessionError) -> HTTPException:
+    """
+    UploadSessionError → HTTPException; con el offset confirmado en
+    Upload-Offset para que el cliente retome sin otro GET.
+    """
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+
+@router.post("/uploads/", response_model=UploadSessionOut, status_code=201)
+async def open_upload(
+    body: UploadSessionIn,
+    db: AsyncSession = Depends(get_session),
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
+):
+    user_id = _user_id(token, authorization)
+    try:
+        upload = await create_upload(
+            db,
+            user_id=user_id,
+            kind=body.kind,
+            filename=body.filename,
+            content_type=body.content_type,
+            size=body.size,
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadSessionError as e:
+        raise upload_http_error(e)
+    await db.commit()
+    return upload_out(upload)
+
+
+@router.get("/uploads/{upload_id}/", response_model=UploadSessionOut)
+async def upload_status(
+    upload_id: str,
+    db: AsyncSession = Depends(get_session),
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
+):
+    """
+    Offset confirmado: después de un corte, el cliente sigue desde aquí.
+    """
+    user_id = _user_id(token, authorization)
+    try:
+        upload = await get_user_upload(db, upload_id, user_id)
+    except UploadSessionError as e:
+        raise upload_http_error(e)
+    return upload_out(upload)
+
+
+@router.put("/uploads/{upload_id}/", response_model=UploadSessionOut)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: AsyncSession = Depends(get_session),
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
+):
+    """
+    Body = bytes crudos del bloque (application/octet-stream), escritos a
+    partir de `offset`. Devuelve lo confirmado hasta ahora.
+    """
+    user_id = _user_id(token, authorization)
+    try:
+        upload = await get_user_upload(db, upload_id, user_id)
+        await write_chunk(db, upload, offset, request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadSessionError as e:
+        raise upload_http_error(e)
+    await db.refresh(upload)
+    return upload_out(upload)
+
+
+@router.delete("/uploads/{upload_id}/", response_model=dict)
+async def upload_cancel(
+    upload_id: str,
+    db: AsyncSession = Depends(get_session),
+    token: str | None = Query(None),
+    authorization: str | None = Header(None),
+):
+    user_id = _user_id(token, authorization)
+    try:
+        upload = await get_user_upload(db, upload_id, user_id)
+    except UploadSessionError as e:
+        raise upload_http_error(e)
+    await cancel_upload(db, upload)
+    return {"ok": True}
@@ -0,0 +1,499 @@
+# app/media/scheduler.py
+"""
+Presupuesto de CPU para transcodificar.
+
+Sin límites, cada FFmpeg/x264 abre ~1.5 hilos por core y varios jobs a la
+vez se comen TODOS los cores, dejando sin CPU al worker de uvicorn que
+atiende la API. Aquí se decide, a partir de los cores disponibles:
+
+- cuántos jobs corren a la vez (workers de app/media/queue.py)
+- cuántos hilos recibe cada FFmpeg (-threads)
+- reservando MEDIA_RESERVED_CORES para la API
+
+y todos los FFmpeg pasan por run_ffmpeg(): prioridad baja de CPU (nice)
+y de disco (ionice), y se mide su CPU real (os.wait4) para las métricas.
+Si el hilo tiene un TranscodeTracker activo (tracking()), además se lee
+el `-progress` de FFmpeg: % hecho, velocidad, bytes escritos por corrida.
+"""
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, NamedTuple
+
+from app.core.config import settings
+
+
+class TranscodeBudget(NamedTuple):
+    cores: int      # cores que puede usar este proceso (afinidad/cgroup)
+    reserved: int   # reservados para la API
+    workers: int    # jobs de media en paralelo
+    threads: int    # hilos por job de FFmpeg
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def plan_budget() -> TranscodeBudget:
+    """
+    usable  = cores - reservados (mínimo 1)
+    workers = MEDIA_INGEST_WORKERS o, en auto (0), 1 job por cada 2 cores
+              usables (x264 escala bien hasta varios hilos por encode)
+    threads = MEDIA_FFMPEG_THREADS o, en auto (0), usable / workers
+    """
+    cores = _available_cores()
+    reserved = max(0, min(settings.MEDIA_RESERVED_CORES, cores - 1))
+    usable = max(1, cores - reserved)
+
+    workers = settings.MEDIA_INGEST_WORKERS or max(1, usable // 2)
+    threads = settings.MEDIA_FFMPEG_THREADS or max(1, usable // workers)
+    return TranscodeBudget(cores=cores, reserved=reserved, workers=workers, threads=threads)
+
+
+BUDGET = plan_budget()
+
+
+def thread_args(encoders: int = 1) -> list[str]:
+    """
+    `-threads N` para una salida de FFmpeg. Si el comando tiene varios
+    encoders de video (ladder), el presupuesto del job se reparte.
+    """
+    return ["-threads", str(max(1, BUDGET.threads // max(1, encoders)))]
+
+
+def input_thread_args() -> list[str]:
+    """
+    Hilos del decoder y de los filtros (van ANTES de -i).
+    """
+    n = str(BUDGET.threads)
+    return ["-threads", n, "-filter_threads", n]
+
+
+# ======================= métricas =======================
+
+
+class TranscodeMetrics:
+    """
+    Contadores en memoria (por proceso) para dimensionar el presupuesto:
+    espera en cola, duración/CPU de cada FFmpeg y uso de cores.
+    """
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.running = 0
+        self.runs = 0
+        self.failures = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.jobs = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits: deque[float] = deque(maxlen=window)
+        # (monotonic, segundos de video): subidos (al sondear) / ya codificados
+        self._uploaded: deque[tuple[float, float]] = deque()
+        self._encoded: deque[tuple[float, float]] = deque()
+        self._speeds: deque[float] = deque(maxlen=window)
+        self.media_seconds_encoded = 0.0
+        self.encode_wall_seconds = 0.0
+        self.output_bytes = 0
+        self._proc_stat: tuple[float, float] | None = _read_proc_stat()
+
+    def ffmpeg_started(self) -> None:
+        with self._lock:
+            self.running += 1
+
+    def ffmpeg_finished(self, wall: float, cpu: float, ok: bool) -> None:
+        with self._lock:
+            self.running -= 1
+            self.runs += 1
+            self.wall_seconds += wall
+            self.cpu_seconds += cpu
+            if not ok:
+                self.failures += 1
+
+    def job_waited(self, seconds: float) -> None:
+        seconds = max(0.0, seconds)
+        with self._lock:
+            self.jobs += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+
+    def media_uploaded(self, media_seconds: float) -> None:
+        with self._lock:
+            self._uploaded.append((time.monotonic(), media_seconds))
+
+    def media_encoded(self, media_seconds: float, wall: float, output_bytes: int) -> None:
+        """
+        Un job terminó: `media_seconds` de video en `wall` segundos reales.
+        """
+        with self._lock:
+            self._encoded.append((time.monotonic(), media_seconds))
+            self.media_seconds_encoded += media_seconds
+            self.encode_wall_seconds += wall
+            self.output_bytes += output_bytes
+            if wall > 0:
+                self._speeds.append(media_seconds / wall)
+
+    def _last_hour(self, samples: deque) -> float:
+        # con el lock tomado
+        cutoff = time.monotonic() - 3600
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+        return round(sum(s for _, s in samples), 1)
+
+    def _host_utilization(self) -> float | None:
+        """
+        % de CPU ocupado en la máquina desde la consulta anterior
+        (/proc/stat, solo Linux).
+        """
+        now = _read_proc_stat()
+        prev, self._proc_stat = self._proc_stat, now
+        if now is None or prev is None or now[1] <= prev[1]:
+            return None
+        return round(100.0 * (now[0] - prev[0]) / (now[1] - prev[1]), 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            waits = sorted(self._waits)
+            p95 = waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+            speeds = sorted(self._speeds)
+            uploaded = self._last_hour(self._uploaded)
+            encoded = self._last_hour(self._encoded)
+            return {
+                "budget": BUDGET._asdict(),
+                "ffmpeg_running": self.running,
+                "ffmpeg_runs": self.runs,
+                "ffmpeg_failures": self.failures,
+                "ffmpeg_cpu_seconds": round(self.cpu_seconds, 2),
+                "ffmpeg_wall_seconds": round(self.wall_seconds, 2),
+                # cores que FFmpeg usó en promedio mientras corría / desde el arranque
+                "ffmpeg_cores_while_running": round(self.cpu_seconds / self.wall_seconds, 2)
+                if self.wall_seconds
+                else 0.0,
+                "ffmpeg_core_utilization": round(
+                    self.cpu_seconds / (uptime * BUDGET.cores), 4
+                )
+                if uptime
+                else 0.0,
+                "host_cpu_percent": self._host_utilization(),
+                "load_avg": list(os.getloadavg()) if hasattr(os, "getloadavg") else None,
+                "queue_jobs": self.jobs,
+                "queue_wait_avg": round(self.wait_total / self.jobs, 3) if self.jobs else 0.0,
+                "queue_wait_p95": round(p95, 3),
+                "queue_wait_max": round(self.wait_max, 3),
+                # velocidad de encode: segundos de video por segundo real
+                # (por job; con N workers la capacidad es ~N veces eso)
+                "encode_speed_avg": round(
+                    self.media_seconds_encoded / self.encode_wall_seconds, 2
+                )
+                if self.encode_wall_seconds
+                else None,
+                "encode_speed_p50": round(speeds[len(speeds) // 2], 2) if speeds else None,
+                "encode_speed_min": round(speeds[0], 2) if speeds else None,
+                "media_seconds_encoded": round(self.media_seconds_encoded, 1),
+                "output_bytes": self.output_bytes,
+                # si se sube más video del que se codifica, la cola crece
+                "media_seconds_uploaded_last_hour": uploaded,
+                "media_seconds_encoded_last_hour": encoded,
+                "falling_behind": uploaded > encoded,
+            }
+
+
+def _read_proc_stat() -> tuple[float, float] | None:
+    """
+    (busy, total) en jiffies de la línea `cpu` de /proc/stat.
+    """
+    try:
+        with open("/proc/stat", "r", encoding="ascii") as f:
+            fields = [float(x) for x in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0.0)  # idle + iowait
+    total = sum(fields)
+    return total - idle, total
+
+
+transcode_metrics = TranscodeMetrics()
+
+
+# ======================= progreso por job =======================
+
+
+def _seconds_from_us(value: str | None) -> float | None:
+    try:
+        return max(0.0, int(value) / 1_000_000)
+    except (TypeError, ValueError):
+        return None
+
+
+def _speed(value: str | None) -> float | None:
+    # "1.53x" | "N/A"
+    try:
+        return float((value or "").rstrip("x"))
+    except ValueError:
+        return None
+
+
+class TranscodeTracker:
+    """
+    Progreso de un job de media: una entrada por corrida de FFmpeg
+    (label, etapa, % sobre `duration`, velocidad, segundos de video
+    procesados, wall/CPU y bytes escritos) más los bytes finales por
+    salida (outputs). snapshot() es lo que se guarda en media_jobs.progress.
+
+    on_update(snapshot) se llama, como mucho cada `interval` segundos,
+    desde el hilo que lee el -progress de FFmpeg: no debe bloquear.
+    """
+
+    def __init__(
+        self,
+        duration: float | None = None,
+        on_update: Callable[[dict], None] | None = None,
+        interval: float = 2.0,
+    ):
+        self._lock = threading.Lock()
+        self.duration = duration
+        self.stage: str | None = None
+        self.runs: list[dict] = []
+        self.outputs: dict[str, int] = {}
+        self._on_update = on_update
+        self._interval = interval
+        self._last_update = 0.0
+
+    def run_started(self, label: str) -> dict:
+        run = {
+            "label": label,
+            "stage": self.stage,
+            "percent": None,
+            "speed": None,
+            "out_seconds": None,
+            "bytes": None,
+            "wall": None,
+            "cpu": None,
+            "ok": None,
+        }
+        with self._lock:
+            self.runs.append(run)
+        return run
+
+    def run_progress(self, run: dict, fields: dict[str, str]) -> None:
+        out_seconds = _seconds_from_us(fields.get("out_time_us") or fields.get("out_time_ms"))
+        with self._lock:
+            if out_seconds is not None:
+                run["out_seconds"] = round(out_seconds, 2)
+                # solo la transcodificación recorre el video completo
+                if self.duration and run["stage"] == "transcoding":
+                    run["percent"] = round(min(100.0, 100.0 * out_seconds / self.duration), 1)
+            run["speed"] = _speed(fields.get("speed")) or run["speed"]
+            try:
+                run["bytes"] = int(fields["total_size"])
+            except (KeyError, ValueError):
+                pass
+            if fields.get("progress") == "end" and run["stage"] == "transcoding":
+                run["percent"] = 100.0
+        self._maybe_update()
+
+    def run_finished(self, run: dict, wall: float, cpu: float, ok: bool) -> None:
+        with self._lock:
+            run["wall"] = round(wall, 2)
+            run["cpu"] = round(cpu, 2)
+            run["ok"] = ok
+        self._maybe_update(force=True)
+
+    def _maybe_update(self, force: bool = False) -> None:
+        if self._on_update is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_update < self._interval:
+            return
+        self._last_update = now
+        try:
+            self._on_update(self.snapshot())
+        except Exception:
+            pass
+
+    def wall_seconds(self, stage: str | None = None) -> float:
+        with self._lock:
+            return sum(r["wall"] or 0.0 for r in self.runs if stage in (None, r["stage"]))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            runs = [dict(r) for r in self.runs]
+            outputs = dict(self.outputs)
+        current = next((r for r in reversed(runs) if r["stage"] == "transcoding"), None)
+        return {
+            # hora del snapshot: el guardado ignora snapshots más viejos
+            "ts": round(time.time(), 3),
+            "stage": self.stage,
+            "duration": self.duration,
+            "percent": current["percent"] if current else None,
+            "speed": current["speed"] if current else None,
+            "wall": round(sum(r["wall"] or 0.0 for r in runs), 2),
+            "cpu": round(sum(r["cpu"] or 0.0 for r in runs), 2),
+            "runs": runs,
+            "outputs": outputs,
+        }
+
+
+_local = threading.local()
+
+
+@contextmanager
+def tracking(tracker: TranscodeTracker):
+    """
+    Los run_ffmpeg() de este hilo reportan su progreso a `tracker`
+    (sin tener que pasarlo por pipeline → hls/storage).
+    """
+    prev = getattr(_local, "tracker", None)
+    _local.tracker = tracker
+    try:
+        yield tracker
+    finally:
+        _local.tracker = prev
+
+
+def _read_progress(stream, tracker: TranscodeTracker, run: dict) -> None:
+    """
+    Lee el `-progress pipe:1` de FFmpeg: bloques de key=value que terminan
+    en progress=continue|end.
+    """
+    fields: dict[str, str] = {}
+    for raw in iter(stream.readline, b""):
+        key, _, value = raw.decode("utf-8", "replace").strip().partition("=")
+        if not key:
+            continue
+        fields[key] = value
+        if key == "progress":
+            tracker.run_progress(run, fields)
+            fields = {}
+
+
+# ======================= ejecución =======================
+
+
+def _nice_prefix() -> list[str]:
+    # con `nice` delante y no preexec_fn: run_ffmpeg corre en hilos del
+    # ThreadPoolExecutor y preexec_fn no es seguro con varios hilos
+    if not settings.MEDIA_FFMPEG_NICE:
+        return []
+    exe = shutil.which("nice")
+    return [exe, "-n", str(settings.MEDIA_FFMPEG_NICE)] if exe else []
+
+
+def _ionice_prefix() -> list[str]:
+    if not settings.MEDIA_FFMPEG_IONICE:
+        return []
+    exe = shutil.which("ionice")
+    # best-effort, prioridad más baja: no se queda sin disco como "idle"
+    return [exe, "-c", "2", "-n", "7"] if exe else []
+
+
+_NICE = _nice_prefix()
+_IONICE = _ionice_prefix()
+
+# FFmpeg vivos de este proceso (para cortarlos en el shutdown)
+_children: set[subprocess.Popen] = set()
+_children_lock = threading.Lock()
+
+
+def kill_ffmpeg() -> int:
+    """
+    Hook de shutdown: mata los FFmpeg en curso (nice/ionice hacen exec, el
+    pid es el del FFmpeg). El run_ffmpeg de cada uno vuelve con error.
+    Devuelve cuántos se mataron.
+    """
+    with _children_lock:
+        procs = list(_children)
+    for p in procs:
+        try:
+            p.kill()
+        except OSError:
+            pass
+    return len(procs)
+
+
+def run_ffmpeg(cmd: list[str], label: str | None = None) -> subprocess.CompletedProcess:
+    """
+    subprocess.run(cmd, capture_output=True, text=True) con prioridad baja
+    (nice + ionice) y midiendo el CPU del proceso con os.wait4.
+    Con un tracker activo (tracking()) se agrega `-progress pipe:1` y la
+    corrida queda registrada como `label` (default: el archivo de salida).
+    """
+    posix = os.name == "posix"
+    tracker: TranscodeTracker | None = getattr(_local, "tracker", None) if posix else None
+    if tracker is not None:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+        run = tracker.run_started(label or os.path.basename(cmd[-1]))
+    full = _NICE + _IONICE + cmd if posix else cmd
+    transcode_metrics.ffmpeg_started()
+    t0 = time.monotonic()
+    cpu = 0.0
+    ok = False
+    try:
+        if not posix:
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            ok = proc.returncode == 0
+            return proc
+
+        # salida a archivos temporales: así podemos esperar con wait4
+        # (rusage del hijo) sin riesgo de bloquear por pipes llenos.
+        # El -progress va por un pipe que vacía un hilo aparte.
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            p = subprocess.Popen(
+                full,
+                stdout=subprocess.PIPE if tracker is not None else out,
+                stderr=err,
+            )
+            with _children_lock:
+                _children.add(p)
+            reader = None
+            if tracker is not None:
+                reader = threading.Thread(
+                    target=_read_progress,
+                    args=(p.stdout, tracker, run),
+                    name="ffmpeg-progress",
+                    daemon=True,
+                )
+                reader.start()
+            try:
+                _, status, usage = os.wait4(p.pid, 0)
+            except BaseException:
+                p.kill()
+                p.wait()
+                raise
+            finally:
+                with _children_lock:
+                    _children.discard(p)
+                if reader is not None:
+                    reader.join(timeout=5)
+                    p.stdout.close()
+            p.returncode = os.waitstatus_to_exitcode(status)
+            cpu = usage.ru_utime + usage.ru_stime
+            out.seek(0)
+            err.seek(0)
+            proc = subprocess.CompletedProcess(
+                full,
+                p.returncode,
+                out.read().decode("utf-8", "replace"),
+                err.read().decode("utf-8", "replace"),
+            )
+        ok = proc.returncode == 0
+        return proc
+    finally:
+        wall = time.monotonic() - t0
+        transcode_metrics.ffmpeg_finished(wall, cpu, ok)
+        if tracker is not None:
+            tracker.run_finished(run, wall, cpu, ok)
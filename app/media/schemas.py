@@ -0,0 +1,37 @@
+# app/media/schemas.py
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ImageVariant(BaseModel):
+    """
+    Una versión WebP de una imagen (ver app/media/images.py).
+    El cliente elige la más chica cuyo ancho le alcance.
+    """
+    url: str
+    width: int
+    height: int
+
+
+class UploadSessionIn(BaseModel):
+    """
+    Apertura de una subida reanudable (ver app/media/uploads.py).
+    kind = "post" | "clip"; size = bytes totales del archivo.
+    """
+    kind: str
+    size: int
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+
+
+class UploadSessionOut(BaseModel):
+    id: str
+    kind: str
+    size: int
+    # bytes confirmados: el próximo PUT va con ?offset=<offset>
+    offset: int
+    # tope de cada PUT
+    chunk_size: int
+    expires_at: datetime
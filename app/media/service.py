@@ -0,0 +1,91 @@
+# app/media/service.py
+from __future__ import annotations
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.media.models import MediaAsset
+from app.media.repository import acquire_asset, set_asset_status
+from app.media.hls import delete_hls
+from app.media.images import make_image_variants, delete_image_variants
+from app.media.storage import (
+    StagedUpload,
+    discard_staged,
+    finish_post_media,
+    delete_post_media,
+    media_key,
+)
+from app.media.status import (
+    MEDIA_PROCESSING,
+    MEDIA_READY,
+    MEDIA_FAILED,
+    HLS_PENDING,
+)
+
+
+async def acquire_staged_asset(
+    db: AsyncSession,
+    staged: StagedUpload,
+) -> tuple[MediaAsset, bool]:
+    """
+    Registra un upload ya volcado a _tmp como asset direccionado por
+    contenido (o toma otra referencia al existente).
+
+    - Asset nuevo de imagen → se mueve a su sitio aquí (rename) y se
+      generan sus variantes WebP.
+    - Asset nuevo de video (o uno que había fallado) → hay que procesarlo:
+      el caller encola el job DESPUÉS del commit.
+    - Asset existente → se reutiliza su salida y el upload se descarta.
+
+    Devuelve (asset, needs_job). No hace commit.
+    """
+    asset, created = await acquire_asset(
+        db,
+        sha256=staged.sha256,
+        profile=staged.profile,
+        media_path=staged.rel,
+        size=staged.size,
+        status=MEDIA_PROCESSING if staged.is_video else MEDIA_READY,
+        hls_status=HLS_PENDING if staged.is_video else None,
+    )
+
+    if created:
+        if not staged.is_video:
+            # rename directo (mismo filesystem): sirve para posts y clips
+            await run_in_threadpool(finish_post_media, staged.path, asset.media_path, False)
+            # se guarda con el commit del post/clip
+            asset.variants = await run_in_threadpool(make_image_variants, asset.media_path)
+            return asset, False
+        return asset, True
+
+    if staged.is_video and asset.status == MEDIA_FAILED:
+        # el intento anterior falló: reintentamos con este upload
+        await set_asset_status(
+            db,
+            asset.id,
+            status=MEDIA_PROCESSING,
+            hls_status=HLS_PENDING,
+        )
+        asset.status = MEDIA_PROCESSING
+        asset.hls_status = HLS_PENDING
+        return asset, True
+
+    await run_in_threadpool(discard_staged, staged.path)
+    return asset, False
+
+
+def asset_hls_key(asset: MediaAsset) -> str:
+    return media_key(asset.media_path)
+
+
+def delete_asset_files(asset: MediaAsset) -> None:
+    """
+    Borra MP4/imagen, poster/preview, variantes WebP y carpeta HLS de un asset cuya última
+    referencia ya se soltó (release_asset). Best-effort: no lanza si ya no
+    están.
+    """
+    delete_post_media(asset.media_path)
+    delete_post_media(asset.poster_path)
+    delete_post_media(asset.preview_path)
+    delete_image_variants(asset.variants)
+    delete_hls(asset_hls_key(asset))
@@ -0,0 +1,21 @@
+# app/media/status.py
+"""
+Estados del procesamiento de media (compartidos por posts y clips).
+"""
+
+# 📦 archivo principal (MP4 normalizado / imagen)
+MEDIA_PROCESSING = "processing"
+MEDIA_READY = "ready"
+MEDIA_FAILED = "failed"
+
+# 🎬 HLS (None = no aplica, p.ej. imágenes)
+HLS_PENDING = "pending"
+HLS_PROCESSING = "processing"
+HLS_READY = "ready"
+HLS_FAILED = "failed"
+
+# 🧵 jobs de procesamiento (tabla media_jobs)
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
@@ -1,12 +1,15 @@
 import os
 import uuid
 import shutil
-import subprocess
-from typing import Tuple
+import hashlib
+from typing import AsyncIterator, NamedTuple, Tuple
 
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.media.cache import invalidate_media
+from app.media.scheduler import run_ffmpeg, thread_args, input_thread_args
 
 # 📁 Rutas base
 MEDIA_DIR = settings.MEDIA_DIR
@@ -29,6 +32,40 @@ IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 # Máximo de duración para clips (vibes)
 CLIP_MAX_SECONDS = 120  # 2 minutos
 
+# 🧬 Perfiles de transcodificación: son parte de la identidad del asset
+# (sha256 + perfil). Si cambia la normalización, sube la versión y los
+# uploads nuevos no reutilizan salidas viejas.
+POST_VIDEO_PROFILE = "post-v1"
+CLIP_VIDEO_PROFILE = "clip-v1"
+IMAGE_PROFILE = "image"
+
+# Lectura/escritura de uploads por bloques
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+class UploadTooLarge(ValueError):
+    """El upload supera el máximo permitido (→ 413)."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"upload too large (max {limit} bytes)")
+        self.limit = limit
+
+
+class StagedUpload(NamedTuple):
+    """
+    Upload ya volcado a _tmp, listo para procesar.
+    - path: ruta absoluta del archivo en _tmp
+    - rel: ruta relativa final dentro de /media (direccionada por contenido)
+    - size / sha256: calculados al vuelo mientras se escribía
+    - profile: perfil de transcodificación (ver *_PROFILE)
+    """
+    path: str
+    rel: str
+    is_video: bool
+    size: int
+    sha256: str
+    profile: str
+
 
 def _ffmpeg_path() -> str:
     path = shutil.which("ffmpeg")
@@ -37,47 +74,98 @@ def _ffmpeg_path() -> str:
     return path
 
 
-def _is_video(upload: UploadFile, ext: str) -> bool:
-    ct = (upload.content_type or "").lower()
+def _is_video(content_type: str | None, ext: str) -> bool:
+    ct = (content_type or "").lower()
     return ct.startswith("video/") or ext.lower() in VIDEO_EXTS
 
 
-def _write_tmp(upload: UploadFile) -> str:
+def max_upload_bytes(is_video: bool) -> int:
+    mb = settings.MAX_VIDEO_UPLOAD_MB if is_video else settings.MAX_IMAGE_UPLOAD_MB
+    return mb * 1024 * 1024
+
+
+async def iter_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+    """
+    Lee el UploadFile por bloques (sin cargarlo entero en memoria).
+    """
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def stream_to_tmp(
+    chunks: AsyncIterator[bytes], max_bytes: int
+) -> Tuple[str, int, str]:
     """
-    Vuelca el UploadFile a un archivo temporal y devuelve su ruta.
+    Escribe los bloques directo a un archivo de staging en _tmp, calculando
+    tamaño y sha256 en la misma pasada. Si se pasa de max_bytes corta ahí
+    mismo (UploadTooLarge) y borra lo escrito.
+    Devuelve (ruta_tmp, size, sha256).
     """
     tmp_path = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}.bin")
-    with open(tmp_path, "wb") as out:
-        shutil.copyfileobj(upload.file, out)
+    digest = hashlib.sha256()
+    size = 0
+
+    out = await run_in_threadpool(open, tmp_path, "wb")
     try:
-        upload.file.seek(0)
-    except Exception:
-        pass
-    return tmp_path
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        out.close()
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    out.close()
+    return tmp_path, size, digest.hexdigest()
 
 
-def _new_rel(subdir: str, ext: str) -> Tuple[str, str]:
+def content_rel(subdir: str, sha256: str, profile: str, ext: str) -> str:
     """
-    Devuelve (relativa, absoluta) para un archivo nuevo con extensión ext.
+    Ruta relativa direccionada por contenido: mismo upload + mismo perfil
+    → mismo archivo. Ej: posts/<sha256[:40]>-post-v1.mp4
     """
-    name = f"{uuid.uuid4().hex}{ext}"
-    rel = f"{subdir}/{name}"
-    abs_path = os.path.join(MEDIA_DIR, rel)
-    return rel, abs_path
+    return f"{subdir}/{sha256[:40]}-{profile}{ext}"
 
 
-def _normalize_video(src_path: str, dst_path: str) -> None:
+def media_key(rel: str) -> str:
     """
-    Normaliza el video a MP4 H.264 baseline + yuv420p + faststart
+    Clave del asset a partir de su ruta (nombre sin extensión).
+    Se usa también como carpeta del HLS: /hls/<key>/.
+    """
+    return os.path.splitext(os.path.basename(rel))[0]
+
+
+def poster_rel(rel: str) -> str:
+    """
+    Poster de un video, junto a su MP4: posts/<key>.poster.jpg
+    """
+    return f"{os.path.dirname(rel)}/{media_key(rel)}.poster.jpg"
+
+
+def preview_rel(rel: str) -> str:
+    """
+    Preview animado de un video, junto a su MP4: posts/<key>.preview.webp
+    """
+    return f"{os.path.dirname(rel)}/{media_key(rel)}.preview.webp"
+
+
+def mp4_output_args(encoders: int = 1) -> list[str]:
+    """
+    Encoders del MP4 progresivo: H.264 baseline + yuv420p + faststart
     (perfil compatible con Android/iOS y evita “Invalid NAL length”).
+    También lo usa el pipeline combinado MP4 + HLS (app/media/pipeline.py);
+    `encoders` = encoders de video del comando (reparto de hilos).
     """
-    cmd = [
-        _ffmpeg_path(),
-        "-y",
-        "-v",
-        "error",
-        "-i",
-        src_path,
+    return [
+        *thread_args(encoders),
         "-c:v",
         "libx264",
         "-profile:v",
@@ -94,16 +182,46 @@ def _normalize_video(src_path: str, dst_path: str) -> None:
         "2",
         "-movflags",
         "+faststart",
+    ]
+
+
+def keyframe_args(seg_seconds: int | None) -> list[str]:
+    """
+    Un keyframe cada seg_seconds: hace falta si del MP4 se va a remuxear un
+    HLS (-c copy solo corta en keyframes y x264 pone uno cada ~10s).
+    """
+    if not seg_seconds:
+        return []
+    return ["-force_key_frames", f"expr:gte(t,n_forced*{seg_seconds})"]
+
+
+def _normalize_video(src_path: str, dst_path: str, seg_seconds: int | None = None) -> None:
+    """
+    Normaliza el video a MP4 H.264 baseline + yuv420p + faststart
+    (ver mp4_output_args). seg_seconds: ver keyframe_args.
+    """
+    cmd = [
+        _ffmpeg_path(),
+        "-y",
+        "-v",
+        "error",
+        *input_thread_args(),
+        "-i",
+        src_path,
+        *mp4_output_args(),
+        *keyframe_args(seg_seconds),
         dst_path,
     ]
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    proc = run_ffmpeg(cmd, "MP4")
     if proc.returncode != 0 or not os.path.exists(dst_path):
         raise RuntimeError(
             f"FFmpeg falló: {proc.stderr.strip() or proc.stdout.strip()}"
         )
 
 
-def _normalize_clip_video(src_path: str, dst_path: str) -> None:
+def _normalize_clip_video(
+    src_path: str, dst_path: str, seg_seconds: int | None = None
+) -> None:
     """
     Normaliza el video a MP4 H.264 baseline + yuv420p + faststart
     y lo recorta a un máximo de CLIP_MAX_SECONDS (2 minutos).
@@ -114,10 +232,12 @@ def _normalize_clip_video(src_path: str, dst_path: str) -> None:
         "-y",
         "-v",
         "error",
+        *input_thread_args(),
         "-i",
         src_path,
         "-t",
         str(CLIP_MAX_SECONDS),
+        *thread_args(),
         "-c:v",
         "libx264",
         "-profile:v",
@@ -134,9 +254,10 @@ def _normalize_clip_video(src_path: str, dst_path: str) -> None:
         "2",
         "-movflags",
         "+faststart",
+        *keyframe_args(seg_seconds),
         dst_path,
     ]
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    proc = run_ffmpeg(cmd, "MP4 clip")
     if proc.returncode != 0 or not os.path.exists(dst_path):
         raise RuntimeError(
             f"FFmpeg falló (clip): {proc.stderr.strip() or proc.stdout.strip()}"
@@ -158,29 +279,17 @@ def save_local(file: UploadFile, subdir: str = "avatars") -> str:
     return rel
 
 
-def save_post_media(file: UploadFile) -> str:
+def _finish_media(tmp_src: str, rel: str, normalize) -> None:
     """
-    Guarda una publicación en /media/posts:
-    - Si es video → normaliza con FFmpeg a .mp4 (baseline/yuv420p/faststart).
-    - Si es imagen → guarda tal cual.
-    Devuelve la ruta relativa (p. ej. 'posts/xxxx.mp4').
+    Procesa el archivo en _tmp hacia su ruta final y borra el temporal.
+    normalize=None → se mueve tal cual con rename (imágenes, sin copiar).
     """
-    filename = file.filename or "upload.bin"
-    ext = os.path.splitext(filename)[1].lower()
-    is_video = _is_video(file, ext)
-
-    tmp_src = _write_tmp(file)
+    dst = os.path.join(MEDIA_DIR, rel)
+    if normalize is None:
+        os.replace(tmp_src, dst)
+        return
     try:
-        if is_video:
-            rel, dst = _new_rel("posts", ".mp4")
-            _normalize_video(tmp_src, dst)
-            return rel
-        else:
-            if ext not in IMAGE_EXTS:
-                ext = ".jpg"
-            rel, dst = _new_rel("posts", ext)
-            shutil.copyfile(tmp_src, dst)
-            return rel
+        normalize(tmp_src, dst)
     finally:
         try:
             os.remove(tmp_src)
@@ -188,6 +297,84 @@ def save_post_media(file: UploadFile) -> str:
             pass
 
 
+def discard_staged(tmp_src: str) -> None:
+    """
+    Borra un upload en _tmp que no se va a usar (p.ej. duplicado).
+    """
+    try:
+        os.remove(tmp_src)
+    except FileNotFoundError:
+        pass
+
+
+# kind → (subcarpeta, nombre por defecto, perfil de video)
+UPLOAD_TARGETS = {
+    "post": ("posts", "upload.bin", POST_VIDEO_PROFILE),
+    "clip": ("clips", "clip.bin", CLIP_VIDEO_PROFILE),
+}
+
+
+def classify_upload(
+    filename: str | None, content_type: str | None, kind: str
+) -> tuple[str, bool, str]:
+    """
+    Extensión final, ¿es video? y perfil de un upload de post/clip.
+    Los videos siempre terminan en .mp4; las imágenes raras, en .jpg.
+    """
+    _subdir, default_name, video_profile = UPLOAD_TARGETS[kind]
+    ext = os.path.splitext(filename or default_name)[1].lower()
+    if _is_video(content_type, ext):
+        return ".mp4", True, video_profile
+    return (ext if ext in IMAGE_EXTS else ".jpg"), False, IMAGE_PROFILE
+
+
+async def _stage_media(file: UploadFile, kind: str) -> StagedUpload:
+    """
+    Vuelca el upload a _tmp (streaming + hash + límite de tamaño) y decide
+    la ruta final por contenido (sin procesar nada aún).
+    """
+    ext, is_video, profile = classify_upload(file.filename, file.content_type, kind)
+    tmp_src, size, sha256 = await stream_to_tmp(
+        iter_upload(file), max_upload_bytes(is_video)
+    )
+    rel = content_rel(UPLOAD_TARGETS[kind][0], sha256, profile, ext)
+    return StagedUpload(tmp_src, rel, is_video, size, sha256, profile)
+
+
+def stage_assembled(
+    src: str, filename: str | None, content_type: str | None, kind: str
+) -> StagedUpload:
+    """
+    Como _stage_media, pero para un archivo que ya está completo en disco
+    (subida reanudable, app/media/uploads.py): se hashea y se mueve a un
+    nombre nuevo de _tmp, igual al que dejaría stream_to_tmp.
+    """
+    ext, is_video, profile = classify_upload(filename, content_type, kind)
+    with open(src, "rb") as f:
+        sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+    size = os.path.getsize(src)
+    tmp_path = os.path.join(TMP_DIR, f"{uuid.uuid4().hex}.bin")
+    os.replace(src, tmp_path)
+    rel = content_rel(UPLOAD_TARGETS[kind][0], sha256, profile, ext)
+    return StagedUpload(tmp_path, rel, is_video, size, sha256, profile)
+
+
+async def stage_post_media(file: UploadFile) -> StagedUpload:
+    """
+    Primer paso de una publicación: upload → _tmp + ruta final en /media/posts.
+    El procesamiento (lento para videos) lo hace finish_post_media.
+    """
+    return await _stage_media(file, "post")
+
+
+def finish_post_media(tmp_src: str, rel: str, is_video: bool) -> None:
+    """
+    - Si es video → normaliza con FFmpeg a .mp4 (baseline/yuv420p/faststart).
+    - Si es imagen → se mueve tal cual (rename).
+    """
+    _finish_media(tmp_src, rel, _normalize_video if is_video else None)
+
+
 def save_comment_media(file: UploadFile) -> str:
     """
     Guarda imagen/gif/foto que el usuario adjunta en un comentario.
@@ -208,34 +395,19 @@ def save_comment_media(file: UploadFile) -> str:
     return rel
 
 
-def save_clip_media(file: UploadFile) -> str:
+async def stage_clip_media(file: UploadFile) -> StagedUpload:
     """
-    Guarda un clip de Vibes en /media/clips:
-    - Si es video → normaliza + recorta a máx 120s.
-    - Si es imagen → copia tal cual.
-    Devuelve la ruta relativa (p. ej. 'clips/xxxx.mp4').
+    Primer paso de un clip: upload → _tmp + ruta final en /media/clips.
     """
-    filename = file.filename or "clip.bin"
-    ext = os.path.splitext(filename)[1].lower()
-    is_video = _is_video(file, ext)
+    return await _stage_media(file, "clip")
 
-    tmp_src = _write_tmp(file)
-    try:
-        if is_video:
-            rel, dst = _new_rel("clips", ".mp4")
-            _normalize_clip_video(tmp_src, dst)
-            return rel
-        else:
-            if ext not in IMAGE_EXTS:
-                ext = ".jpg"
-            rel, dst = _new_rel("clips", ext)
-            shutil.copyfile(tmp_src, dst)
-            return rel
-    finally:
-        try:
-            os.remove(tmp_src)
-        except FileNotFoundError:
-            pass
+
+def finish_clip_media(tmp_src: str, rel: str, is_video: bool) -> None:
+    """
+    - Si es video → normaliza + recorta a máx 120s.
+    - Si es imagen → se mueve tal cual (rename).
+    """
+    _finish_media(tmp_src, rel, _normalize_clip_video if is_video else None)
 
 
 def delete_post_media(rel: str | None) -> None:
@@ -245,6 +417,7 @@ def delete_post_media(rel: str | None) -> None:
     """
     if not rel:
         return
+    invalidate_media(rel)
     abs_path = os.path.join(MEDIA_DIR, rel)
     try:
         os.remove(abs_path)
@@ -3,8 +3,10 @@ from __future__ import annotations
 import os, hashlib, time
 from mimetypes import guess_type
 from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import FileResponse, Response
 from app.core.config import settings
+from app.media.cache import file_meta_cache, hot_object_cache, MEDIA, HLS
 
 router = APIRouter()
 
@@ -12,8 +14,7 @@ def _etag(stat: os.stat_result) -> str:
     base = f"{stat.st_mtime_ns}-{stat.st_size}".encode()
     return hashlib.md5(base).hexdigest()  # suficiente para cache
 
-def _headers(abs_path: str) -> dict:
-    stat = os.stat(abs_path)
+def _headers(abs_path: str, stat: os.stat_result) -> dict:
     etag = _etag(stat)
     ct, _ = guess_type(abs_path)
     return {
@@ -27,29 +28,143 @@ def _headers(abs_path: str) -> dict:
         "Cross-Origin-Resource-Policy": "cross-origin",
     }
 
-@router.head("/media/{path:path}")
-async def head_media(path: str, request: Request):
-    abs_path = os.path.join(settings.MEDIA_DIR, path)
-    if not os.path.isfile(abs_path):
+def _resolve(base_dir: str, path: str) -> str:
+    """
+    Ruta absoluta dentro de base_dir (404 si no existe o se sale con ../).
+    Tampoco se sirve nada bajo un componente oculto: /hls/.staging-* (HLS a
+    medio armar) y /hls/.trash-* (pendiente de borrar), ver app/media/hls.py.
+    """
+    if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
         raise HTTPException(status_code=404, detail="file not found")
-    headers = _headers(abs_path)
+    base = os.path.realpath(base_dir)
+    abs_path = os.path.realpath(os.path.join(base, path))
+    if not abs_path.startswith(base + os.sep) or not os.path.isfile(abs_path):
+        raise HTTPException(status_code=404, detail="file not found")
+    return abs_path
+
+class _CachedFileResponse(FileResponse):
+    """
+    FileResponse con ETag/Last-Modified ya calculados (del cache): no
+    vuelve a hacer stat ni MD5, solo agrega Content-Length.
+    """
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        self.headers.setdefault("content-length", str(stat_result.st_size))
+
+def _ident(stat: os.stat_result) -> tuple[int, int, int]:
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def _lookup(base: str, base_dir: str, path: str) -> tuple[str, os.stat_result, dict]:
+    """
+    (ruta absoluta, stat, headers) de un archivo servido. Hit del cache =
+    un solo os.stat para validar que sigue siendo el mismo archivo; miss =
+    _resolve + stat + headers, y se guarda (app/media/cache.py).
+    """
+    entry = file_meta_cache.get(base, path)
+    if entry is not None:
+        abs_path, ident, headers = entry
+        try:
+            stat = os.stat(abs_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and _ident(stat) == ident:
+            file_meta_cache.hit()
+            return abs_path, stat, headers
+        file_meta_cache.stale_entry(base, path)
+    abs_path = _resolve(base_dir, path)
+    stat = os.stat(abs_path)
+    headers = _headers(abs_path, stat)
+    file_meta_cache.put(base, path, (abs_path, _ident(stat), headers))
+    return abs_path, stat, headers
+
+def _head(abs_path: str, stat: os.stat_result, headers: dict, request: Request) -> Response:
     # Soporte condicional simple
     inm = request.headers.get("if-none-match")
     if inm and inm == headers["ETag"]:
         return Response(status_code=304, headers=headers)
     # Content-Length lo añade FileResponse, pero aquí devolvemos vacío:
-    size = os.path.getsize(abs_path)
-    headers["Content-Length"] = str(size)
-    return Response(status_code=200, headers=headers)
+    return Response(status_code=200, headers={**headers, "Content-Length": str(stat.st_size)})
 
-@router.get("/media/{path:path}")
-async def stream_media(path: str, request: Request):
-    abs_path = os.path.join(settings.MEDIA_DIR, path)
-    if not os.path.isfile(abs_path):
-        raise HTTPException(status_code=404, detail="file not found")
-    headers = _headers(abs_path)
+def _byte_range(value: str, size: int) -> tuple[int, int] | None:
+    """
+    "bytes=a-b" / "bytes=a-" / "bytes=-n" → (inicio, fin) inclusive.
+    None = se ignora el Range (multi-rango o mal formado) y va completo.
+    ValueError = fuera del archivo (416).
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (p.strip() for p in spec.partition("-"))
+    if not sep or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+    if not first:
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(int(last), size - 1) if last else size - 1
+
+def _memory_response(data: bytes, headers: dict, request: Request) -> Response:
+    """
+    Respuesta desde el tier en memoria: completa (200) o un rango (206),
+    con los mismos headers que FileResponse.
+    """
+    size = len(data)
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    span = None
+    if rng and (if_range is None or if_range in (headers["ETag"], headers["Last-Modified"])):
+        try:
+            span = _byte_range(rng, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if span is None:
+        hot_object_cache.served(size)
+        return Response(data, headers=headers)
+    start, end = span
+    hot_object_cache.served(end - start + 1)
+    return Response(
+        data[start:end + 1],
+        status_code=206,
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+    )
+
+async def _stream(base: str, base_dir: str, path: str, request: Request) -> Response:
+    abs_path, stat, headers = _lookup(base, base_dir, path)
     inm = request.headers.get("if-none-match")
     if inm and inm == headers["ETag"]:
         return Response(status_code=304, headers=headers)
+    # 🔥 objetos chicos y calientes (segmentos, playlists, avatares) desde RAM
+    if hot_object_cache.eligible(stat.st_size):
+        key, ident = (base, path), _ident(stat)
+        data = hot_object_cache.get(key, ident)
+        if data is None:
+            # lectura del archivo fuera del event loop
+            data = await run_in_threadpool(hot_object_cache.load, key, ident, abs_path, stat.st_size)
+        if data is not None:
+            return _memory_response(data, headers, request)
     # Starlette maneja Range (200/206) y sendfile bajo el capó
-    return FileResponse(abs_path, headers=headers)
+    return _CachedFileResponse(
+        abs_path, headers=headers, media_type=headers["Content-Type"], stat_result=stat
+    )
+
+@router.head("/media/{path:path}")
+async def head_media(path: str, request: Request):
+    return _head(*_lookup(MEDIA, settings.MEDIA_DIR, path), request)
+
+@router.get("/media/{path:path}")
+async def stream_media(path: str, request: Request):
+    return await _stream(MEDIA, settings.MEDIA_DIR, path, request)
+
+# 🎞️ HLS: playlists y segmentos. Con HLS_SINGLE_FILE cada segmento es un
+# rango (EXT-X-BYTERANGE) del .m4s de su calidad → 206 Partial Content.
+@router.head("/hls/{path:path}")
+async def head_hls(path: str, request: Request):
+    return _head(*_lookup(HLS, settings.HLS_DIR, path), request)
+
+@router.get("/hls/{path:path}")
+async def stream_hls(path: str, request: Request):
+    return await _stream(HLS, settings.HLS_DIR, path, request)
@@ -0,0 +1,473 @@
+# app/media/sweeper.py
+"""
+Barrido de archivos huérfanos en /media y /hls: lo que quedó en disco sin
+ninguna fila que lo referencie (posts/clips borrados a medias, uploads
+cortados en _tmp, HLS de assets que ya no existen, avatares reemplazados...).
+
+    python -m app.media.sweeper                 # dry-run: solo reporta
+    python -m app.media.sweeper --delete        # borra (con rate limit)
+
+Qué se compara:
+  - posts/, clips/, comments/, avatars/ contra posts.media_path,
+    clips.media_path, comments.media, profiles.avatar/cover y
+    media_assets.media_path. Se compara por "dueño" (<dir>/<nombre hasta
+    el primer punto>), así el poster, el preview y las variantes WebP de un
+    archivo referenciado (<key>.poster.jpg, <key>.w320.webp) también cuentan.
+  - hls/<key>/ contra posts.hls_key (o el id en posts viejos), clips.hls_key
+    y la clave de cada asset; un HLS en estado failed no cuenta.
+  - _tmp/ contra los jobs queued/running (payload.src) y las subidas
+    reanudables abiertas (upload-<id>.part).
+
+Nunca se toca nada más nuevo que MEDIA_SWEEP_MIN_AGE_HOURS (uploads en
+curso, jobs que todavía no insertaron su fila) y la edad se vuelve a mirar
+justo antes de borrar. El disco se recorre en lotes de MEDIA_SWEEP_BATCH
+entradas (scandir, sin listar carpetas enteras en memoria) y los borrados
+van a MEDIA_SWEEP_DELETES_PER_SECOND como máximo (cada archivo de un HLS
+cuenta), para no competir por IO con la API ni con FFmpeg.
+
+El task periódico (MEDIA_SWEEP_INTERVAL_HOURS) es por proceso: con varios
+workers de uvicorn conviene activarlo en uno solo, o usar el CLI por cron.
+"""
+from __future__ import annotations
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+
+from sqlalchemy import select, or_
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.clips.models import Clip
+from app.comments.models import Comment
+from app.feed.models import Post
+from app.media.hls import STAGING_PREFIX, TRASH_PREFIX
+from app.media.models import MediaAsset, MediaJob, UploadSession
+from app.media.status import HLS_FAILED, JOB_QUEUED, JOB_RUNNING
+from app.media.storage import media_key
+from app.media.uploads import part_path
+from app.profile.models import Profile
+
+log = logging.getLogger("uvicorn")
+
+# carpetas de /media con archivos sueltos que referencia la DB
+MEDIA_AREAS = ("posts", "clips", "comments", "avatars")
+HLS_AREA = "hls"
+TMP_AREA = "_tmp"
+
+
+@dataclass
+class AreaReport:
+    scanned: int = 0
+    orphans: int = 0
+    bytes: int = 0
+    deleted: int = 0
+    errors: int = 0
+
+
+class _Throttle:
+    """
+    Rate limit de borrados: a lo sumo `rate` por segundo (0 = sin límite).
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self.interval
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _owner(rel: str | None) -> str | None:
+    """
+    "posts/abc.w320.webp" → "posts/abc". Acepta también "/media/posts/abc.jpg".
+    """
+    if not rel:
+        return None
+    rel = rel.strip()
+    if "://" in rel:
+        return None  # URL externa (p.ej. GIF remoto en un comentario)
+    rel = rel.lstrip("/")
+    if rel.startswith("media/"):
+        rel = rel[len("media/"):]
+    d, name = os.path.split(rel)
+    return f"{d}/{name.split('.', 1)[0]}" if d else None
+
+
+async def _stream_values(db, stmt, batch: int):
+    result = await db.stream(stmt.execution_options(yield_per=batch))
+    async for row in result:
+        yield row
+
+
+async def load_references(db, batch: int) -> tuple[set[str], set[str], set[str]]:
+    """
+    Lo que la DB todavía usa: (dueños en /media, claves de HLS, nombres en _tmp).
+    Las filas se leen por lotes (server-side cursor), no todas de una vez.
+    """
+    owners: set[str] = set()
+    for col in (
+        Post.media_path,
+        Clip.media_path,
+        Comment.media,
+        Profile.avatar,
+        Profile.cover,
+        MediaAsset.media_path,
+    ):
+        async for (value,) in _stream_values(db, select(col).where(col.is_not(None)), batch):
+            owner = _owner(value)
+            if owner:
+                owners.add(owner)
+
+    hls_keys: set[str] = set()
+    alive = lambda col: or_(col.is_(None), col != HLS_FAILED)  # noqa: E731
+    async for post_id, key in _stream_values(
+        db, select(Post.id, Post.hls_key).where(alive(Post.hls_status)), batch
+    ):
+        hls_keys.add(key or str(post_id))
+    async for (key,) in _stream_values(
+        db,
+        select(Clip.hls_key).where(Clip.hls_key.is_not(None), alive(Clip.hls_status)),
+        batch,
+    ):
+        hls_keys.add(key)
+    async for (path,) in _stream_values(
+        db, select(MediaAsset.media_path).where(alive(MediaAsset.hls_status)), batch
+    ):
+        hls_keys.add(media_key(path))
+
+    tmp_names: set[str] = set()
+    async for (payload,) in _stream_values(
+        db,
+        select(MediaJob.payload).where(MediaJob.state.in_((JOB_QUEUED, JOB_RUNNING))),
+        batch,
+    ):
+        src = (payload or {}).get("src")
+        if src:
+            tmp_names.add(os.path.basename(src))
+    # subidas reanudables en curso (las vencidas las borra upload_reaper)
+    async for (session_id,) in _stream_values(db, select(UploadSession.id), batch):
+        tmp_names.add(os.path.basename(part_path(session_id)))
+
+    return owners, hls_keys, tmp_names
+
+
+def _scan(path: str, batch: int):
+    """
+    Entradas de una carpeta en lotes de `batch` (scandir es perezoso).
+    """
+    try:
+        it = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with it:
+        chunk = []
+        for entry in it:
+            chunk.append(entry)
+            if len(chunk) >= batch:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _dir_stats(path: str) -> tuple[int, float]:
+    """
+    (bytes, mtime más reciente) de una carpeta de HLS.
+    """
+    size, newest = 0, os.stat(path).st_mtime
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            size += st.st_size
+            newest = max(newest, st.st_mtime)
+    return size, newest
+
+
+class Sweep:
+    """
+    Una pasada del barrido sobre el disco (síncrona: corre en un thread).
+    """
+
+    def __init__(
+        self,
+        owners: set[str],
+        hls_keys: set[str],
+        tmp_names: set[str],
+        *,
+        delete: bool,
+        min_age_hours: float,
+        batch: int,
+        rate: float,
+        verbose: bool = False,
+        stop: threading.Event | None = None,
+    ):
+        self.owners = owners
+        self.hls_keys = hls_keys
+        self.tmp_names = tmp_names
+        self.delete = delete
+        self.batch = max(1, batch)
+        self.verbose = verbose
+        self.cutoff = time.time() - min_age_hours * 3600
+        self.throttle = _Throttle(rate)
+        self.stop = stop or threading.Event()
+        self.report: dict[str, AreaReport] = {}
+
+    def _check(self) -> None:
+        if self.stop.is_set():
+            raise _Stopped()
+
+    def _remove(self, path: str, rep: AreaReport) -> None:
+        self.throttle.wait()
+        try:
+            # la edad se vuelve a mirar: pudo reescribirse desde el scandir
+            if os.stat(path).st_mtime > self.cutoff:
+                return
+            os.remove(path)
+            rep.deleted += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            rep.errors += 1
+            log.warning(f"🧹 No se pudo borrar {path}: {e!r}")
+
+    def _remove_tree(self, path: str, ino: int, rep: AreaReport) -> None:
+        """
+        Borra una carpeta de HLS. Justo antes se vuelve a mirar que sea la
+        misma del scan (inode: un republish la reemplaza con rename) y su
+        edad, y se aparta con rename a .trash-* antes de vaciarla: un
+        publish concurrente nunca encuentra una carpeta a medio borrar.
+        """
+        self._check()
+        trash = os.path.join(
+            os.path.dirname(path),
+            f"{TRASH_PREFIX}{os.path.basename(path)}-{uuid.uuid4().hex[:8]}",
+        )
+        try:
+            if os.stat(path).st_ino != ino:
+                return
+            if _dir_stats(path)[1] > self.cutoff:
+                return
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            rep.errors += 1
+            log.warning(f"🧹 No se pudo borrar {path}: {e!r}")
+            return
+
+        for root, dirs, files in os.walk(trash, topdown=False):
+            for name in files:
+                self.throttle.wait()
+                try:
+                    os.remove(os.path.join(root, name))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    rep.errors += 1
+                    log.warning(f"🧹 No se pudo borrar {root}/{name}: {e!r}")
+            for name in dirs:
+                try:
+                    os.rmdir(os.path.join(root, name))
+                except OSError:
+                    pass
+        try:
+            os.rmdir(trash)
+            rep.deleted += 1
+        except OSError as e:
+            rep.errors += 1
+            log.warning(f"🧹 No se pudo borrar {trash}: {e!r}")
+
+    def _orphan(self, area: str, name: str, size: int, rep: AreaReport) -> bool:
+        rep.orphans += 1
+        rep.bytes += size
+        if self.verbose:
+            print(f"  {'🗑️ ' if self.delete else '· '}{area}/{name} ({size // 1024}KB)")
+        return self.delete
+
+    def _sweep_files(self, area: str, is_referenced) -> None:
+        rep = self.report.setdefault(area, AreaReport())
+        base = os.path.join(settings.MEDIA_DIR, area)
+        for chunk in _scan(base, self.batch):
+            for entry in chunk:
+                self._check()
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                rep.scanned += 1
+                if st.st_mtime > self.cutoff or is_referenced(entry.name):
+                    continue
+                if self._orphan(area, entry.name, st.st_size, rep):
+                    self._remove(entry.path, rep)
+
+    def _sweep_hls(self) -> None:
+        rep = self.report.setdefault(HLS_AREA, AreaReport())
+        for chunk in _scan(settings.HLS_DIR, self.batch):
+            for entry in chunk:
+                self._check()
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                # staging/trash de publish_hls: los limpia cleanup_hls_staging
+                if entry.name.startswith((STAGING_PREFIX, TRASH_PREFIX)):
+                    continue
+                rep.scanned += 1
+                if entry.name in self.hls_keys:
+                    continue
+                try:
+                    size, newest = _dir_stats(entry.path)
+                    ino = entry.inode()
+                except FileNotFoundError:
+                    continue
+                if newest > self.cutoff:
+                    continue
+                if self._orphan(HLS_AREA, entry.name + "/", size, rep):
+                    self._remove_tree(entry.path, ino, rep)
+
+    def run(self) -> dict[str, AreaReport]:
+        try:
+            for area in MEDIA_AREAS:
+                self._sweep_files(
+                    area, lambda name, a=area: f"{a}/{name.split('.', 1)[0]}" in self.owners
+                )
+            self._sweep_hls()
+            self._sweep_files(TMP_AREA, lambda name: name in self.tmp_names)
+        except _Stopped:
+            pass
+        return self.report
+
+
+async def sweep_orphans(
+    *,
+    delete: bool = False,
+    min_age_hours: float | None = None,
+    batch: int | None = None,
+    rate: float | None = None,
+    verbose: bool = False,
+    stop: threading.Event | None = None,
+) -> dict[str, AreaReport]:
+    """
+    Lee las referencias de la DB y barre el disco en un thread.
+    Devuelve el reporte por carpeta (scanned/orphans/bytes/deleted/errors).
+    """
+    batch = batch or settings.MEDIA_SWEEP_BATCH
+    async with AsyncSessionLocal() as db:
+        owners, hls_keys, tmp_names = await load_references(db, batch)
+    sweep = Sweep(
+        owners,
+        hls_keys,
+        tmp_names,
+        delete=delete,
+        min_age_hours=(
+            settings.MEDIA_SWEEP_MIN_AGE_HOURS if min_age_hours is None else min_age_hours
+        ),
+        batch=batch,
+        rate=settings.MEDIA_SWEEP_DELETES_PER_SECOND if rate is None else rate,
+        verbose=verbose,
+        stop=stop,
+    )
+    return await asyncio.to_thread(sweep.run)
+
+
+def format_report(report: dict[str, AreaReport], delete: bool) -> str:
+    lines = []
+    total = AreaReport()
+    for area, rep in report.items():
+        lines.append(
+            f"  {area:<9} {rep.scanned:>7} vistos  {rep.orphans:>6} huérfanos  "
+            f"{rep.bytes / 1024 / 1024:>9.1f} MB"
+            + (f"  {rep.deleted} borrados" if delete else "")
+            + (f"  {rep.errors} errores" if rep.errors else "")
+        )
+        for k, v in asdict(rep).items():
+            setattr(total, k, getattr(total, k) + v)
+    verb = "liberados" if delete else "recuperables (dry-run)"
+    lines.append(
+        f"🧹 {total.orphans} huérfanos, {total.bytes / 1024 / 1024:.1f} MB {verb}"
+    )
+    return "\n".join(lines)
+
+
+class MediaSweeper:
+    """
+    Task periódico del barrido (MEDIA_SWEEP_INTERVAL_HOURS > 0).
+    """
+
+    def __init__(self, interval_hours: float, delete: bool):
+        self.interval = interval_hours * 3600
+        self.delete = delete
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await sweep_orphans(delete=self.delete, stop=self._stop)
+                log.info(format_report(report, self.delete))
+            except Exception as e:
+                log.error(f"❌ Barrido de media falló: {e!r}")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # corta el thread del barrido en el próximo archivo
+            self._stop.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+media_sweeper = MediaSweeper(
+    interval_hours=settings.MEDIA_SWEEP_INTERVAL_HOURS,
+    delete=settings.MEDIA_SWEEP_DELETE,
+)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Barre archivos huérfanos de /media y /hls.")
+    ap.add_argument("--delete", action="store_true", help="borrar (sin esto: dry-run)")
+    ap.add_argument("--min-age", type=float, default=None, help="horas (default: config)")
+    ap.add_argument("--batch", type=int, default=None, help="entradas/filas por lote")
+    ap.add_argument("--rate", type=float, default=None, help="borrados por segundo (0 = sin límite)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="listar cada huérfano")
+    args = ap.parse_args()
+
+    report = await sweep_orphans(
+        delete=args.delete,
+        min_age_hours=args.min_age,
+        batch=args.batch,
+        rate=args.rate,
+        verbose=args.verbose,
+    )
+    print(format_report(report, args.delete))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+# app/media/thumbs.py
+"""
+Poster y preview animado de un video, para que el feed pinte algo antes
+de empezar a bajar el HLS/MP4:
+
+- poster:  1 frame en JPEG (ancho ≤ POSTER_MAX_WIDTH)
+- preview: PREVIEW_SECONDS en WebP animado, PREVIEW_HEIGHT px, PREVIEW_FPS
+
+Se sacan del MP4 ya normalizado (H.264 baseline: decodificar unos pocos
+segundos es barato) y quedan junto a él (posts/<key>.poster.jpg, ...),
+así se sirven con el mismo cache inmutable que el MP4.
+"""
+from __future__ import annotations
+
+import os
+import logging
+
+from app.core.config import settings
+from app.media.hls import _ffmpeg
+from app.media.scheduler import run_ffmpeg, thread_args
+from app.media.storage import poster_rel, preview_rel
+
+log = logging.getLogger("uvicorn")
+
+
+def _poster_offset(summary: dict | None) -> float:
+    # el frame 0 suele ser negro o un fundido: ~1s (o antes, si es muy corto)
+    duration = (summary or {}).get("duration") or 0
+    return round(min(1.0, duration / 4), 3) if duration else 0.0
+
+
+def _extract(cmd: list[str], dst_abs: str, what: str) -> bool:
+    proc = run_ffmpeg(cmd, what)
+    if proc.returncode != 0 or not os.path.exists(dst_abs):
+        log.error(f"❌ No se pudo generar {what}: {(proc.stderr or '').strip()[-300:]}")
+        try:
+            os.remove(dst_abs)
+        except FileNotFoundError:
+            pass
+        return False
+    return True
+
+
+def make_poster(mp4_abs: str, dst_abs: str, summary: dict | None = None) -> bool:
+    cmd = [
+        _ffmpeg(),
+        "-y",
+        "-v",
+        "error",
+        "-ss",
+        str(_poster_offset(summary)),
+        "-i",
+        mp4_abs,
+        *thread_args(),
+        "-vf",
+        f"scale='min({settings.POSTER_MAX_WIDTH},iw)':-2",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "3",
+        "-an",
+        dst_abs,
+    ]
+    return _extract(cmd, dst_abs, "el poster")
+
+
+def make_preview(mp4_abs: str, dst_abs: str) -> bool:
+    cmd = [
+        _ffmpeg(),
+        "-y",
+        "-v",
+        "error",
+        "-t",
+        str(settings.PREVIEW_SECONDS),
+        "-i",
+        mp4_abs,
+        *thread_args(),
+        "-vf",
+        f"fps={settings.PREVIEW_FPS},scale=-2:'min({settings.PREVIEW_HEIGHT},ih)'",
+        "-an",
+        "-c:v",
+        "libwebp_anim",
+        "-loop",
+        "0",
+        "-quality",
+        "60",
+        "-compression_level",
+        "4",
+        dst_abs,
+    ]
+    return _extract(cmd, dst_abs, "el preview")
+
+
+def make_thumbnails(
+    rel: str, summary: dict | None = None
+) -> tuple[str | None, str | None]:
+    """
+    Poster + preview del MP4 en /media/<rel>. Best-effort: si alguno falla
+    el video igual se publica, solo sin ese campo.
+    Devuelve (poster_rel, preview_rel); None el que no se pudo generar.
+    """
+    mp4_abs = os.path.join(settings.MEDIA_DIR, rel)
+    poster, preview = poster_rel(rel), preview_rel(rel)
+    ok_poster = make_poster(mp4_abs, os.path.join(settings.MEDIA_DIR, poster), summary)
+    ok_preview = make_preview(mp4_abs, os.path.join(settings.MEDIA_DIR, preview))
+    return (poster if ok_poster else None), (preview if ok_preview else None)
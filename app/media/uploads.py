@@ -0,0 +1,271 @@
+# app/media/uploads.py
+"""
+Subidas reanudables para videos grandes desde el celular.
+
+Con un solo multipart, si la conexión se cae a mitad hay que mandar el
+archivo entero otra vez. Protocolo (rutas en app/media/router.py):
+
+    POST   /api/media/uploads/                 {kind, filename, size, content_type}
+           → {id, offset: 0, chunk_size, ...}
+    PUT    /api/media/uploads/{id}/?offset=N   body = bytes crudos del bloque
+           → {offset}  (lo confirmado hasta ahora)
+    GET    /api/media/uploads/{id}/            → {offset} para retomar tras un corte
+    DELETE /api/media/uploads/{id}/            cancela
+
+y para terminar se publica como siempre (POST /api/feed/ o /api/clips/)
+mandando upload_id en vez de file: ahí el .part se hashea, pasa a ser un
+StagedUpload y sigue el mismo camino que un multipart (dedupe por
+contenido, job de media, etc.).
+
+Los bloques se escriben directo en _tmp/upload-<id>.part en su offset; el
+offset confirmado vive en upload_sessions. Si el cliente se desconecta a
+mitad de un PUT se confirma lo que alcanzó a llegar. Las sesiones sin
+actividad en UPLOAD_SESSION_TTL_HOURS las borra upload_reaper (fila y .part).
+"""
+from __future__ import annotations
+
+import os
+import uuid
+import asyncio
+import logging
+from datetime import timedelta
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.media.models import UploadSession
+from app.media.repository import (
+    advance_upload,
+    create_upload_session,
+    delete_expired_upload_sessions,
+    delete_upload_session,
+    get_upload_session,
+)
+from app.media.storage import (
+    TMP_DIR,
+    UPLOAD_TARGETS,
+    StagedUpload,
+    UploadTooLarge,
+    classify_upload,
+    discard_staged,
+    max_upload_bytes,
+    stage_assembled,
+)
+
+log = logging.getLogger("uvicorn")
+
+
+class UploadSessionError(ValueError):
+    """Sesión inexistente/ajena, offset inválido o upload incompleto."""
+
+    def __init__(self, status_code: int, detail: str, offset: int | None = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.offset = offset
+
+
+def _ttl() -> timedelta:
+    return timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+def chunk_max_bytes() -> int:
+    return settings.UPLOAD_CHUNK_MAX_MB * 1024 * 1024
+
+
+def part_path(session_id: str) -> str:
+    return os.path.join(TMP_DIR, f"upload-{session_id}.part")
+
+
+def _create_part(path: str) -> None:
+    open(path, "wb").close()
+
+
+async def create_upload(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    kind: str,
+    filename: str | None,
+    content_type: str | None,
+    size: int,
+) -> UploadSession:
+    """
+    Abre una sesión: valida tipo/tamaño contra los mismos límites que el
+    multipart y crea el .part vacío. No hace commit.
+    """
+    if kind not in UPLOAD_TARGETS:
+        raise UploadSessionError(400, "invalid kind")
+    if size <= 0:
+        raise UploadSessionError(400, "invalid size")
+    _ext, is_video, _profile = classify_upload(filename, content_type, kind)
+    limit = max_upload_bytes(is_video)
+    if size > limit:
+        raise UploadTooLarge(limit)
+
+    session_id = uuid.uuid4().hex
+    await run_in_threadpool(_create_part, part_path(session_id))
+    return await create_upload_session(
+        db,
+        session_id=session_id,
+        user_id=user_id,
+        kind=kind,
+        filename=filename,
+        content_type=content_type,
+        is_video=is_video,
+        size=size,
+        ttl=_ttl(),
+    )
+
+
+async def get_user_upload(db: AsyncSession, session_id: str, user_id: int) -> UploadSession:
+    upload = await get_upload_session(db, session_id)
+    # la de otro usuario se responde igual que una inexistente
+    if upload is None or upload.user_id != user_id:
+        raise UploadSessionError(404, "upload not found")
+    return upload
+
+
+async def write_chunk(
+    db: AsyncSession,
+    upload: UploadSession,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+) -> int:
+    """
+    Escribe el bloque en el .part a partir de `offset` y confirma lo escrito.
+    offset > lo confirmado → 409 (el cliente tiene que consultar y retomar);
+    offset < lo confirmado → se reescriben los mismos bytes (reenvío).
+    Devuelve el offset confirmado. Hace commit.
+    """
+    if offset < 0 or offset > upload.received:
+        raise UploadSessionError(409, "offset mismatch", upload.received)
+
+    limit = chunk_max_bytes()
+    path = part_path(upload.id)
+    try:
+        out = await run_in_threadpool(open, path, "r+b")
+    except FileNotFoundError:
+        raise UploadSessionError(409, "upload data missing")
+
+    written = 0
+    error: Exception | None = None
+    try:
+        await run_in_threadpool(out.seek, offset)
+        async for chunk in chunks:
+            if written + len(chunk) > limit:
+                error = UploadTooLarge(limit)
+                break
+            if offset + written + len(chunk) > upload.size:
+                error = UploadSessionError(400, "chunk exceeds upload size", upload.received)
+                break
+            await run_in_threadpool(out.write, chunk)
+            written += len(chunk)
+    except ClientDisconnect:
+        # se confirma lo que llegó: el cliente retoma desde ahí
+        pass
+    finally:
+        await run_in_threadpool(out.close)
+
+    received = upload.received
+    if written:
+        received = await advance_upload(db, upload.id, offset, offset + written, _ttl())
+        await db.commit()
+        if received is None:
+            raise UploadSessionError(404, "upload not found")
+    if error is not None:
+        raise error
+    return received
+
+
+async def finalize_upload(
+    db: AsyncSession, session_id: str, user_id: int, kind: str
+) -> StagedUpload:
+    """
+    Última parte: el .part completo pasa a ser un StagedUpload (hash +
+    ruta por contenido), igual que stage_post_media / stage_clip_media.
+    La sesión se borra con el commit del post/clip. No hace commit.
+    """
+    upload = await get_user_upload(db, session_id, user_id)
+    if upload.kind != kind:
+        raise UploadSessionError(400, "upload kind mismatch")
+    if upload.received < upload.size:
+        raise UploadSessionError(409, "upload incomplete", upload.received)
+    try:
+        staged = await run_in_threadpool(
+            stage_assembled,
+            part_path(upload.id),
+            upload.filename,
+            upload.content_type,
+            kind,
+        )
+    except FileNotFoundError:
+        await delete_upload_session(db, upload.id)
+        await db.commit()
+        raise UploadSessionError(409, "upload data missing")
+    await delete_upload_session(db, upload.id)
+    return staged
+
+
+async def cancel_upload(db: AsyncSession, upload: UploadSession) -> None:
+    await delete_upload_session(db, upload.id)
+    await db.commit()
+    await run_in_threadpool(discard_staged, part_path(upload.id))
+
+
+def upload_out(upload: UploadSession) -> dict:
+    return {
+        "id": upload.id,
+        "kind": upload.kind,
+        "size": upload.size,
+        "offset": upload.received,
+        "chunk_size": chunk_max_bytes(),
+        "expires_at": upload.expires_at,
+    }
+
+
+class UploadReaper:
+    """
+    Task de fondo: borra las sesiones expiradas y sus .part.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def reap(self) -> int:
+        async with AsyncSessionLocal() as db:
+            ids = await delete_expired_upload_sessions(db)
+            await db.commit()
+        for session_id in ids:
+            await asyncio.to_thread(discard_staged, part_path(session_id))
+        return len(ids)
+
+    async def _run(self):
+        while True:
+            try:
+                n = await self.reap()
+                if n:
+                    log.info(f"📶 {n} subidas reanudables expiradas eliminadas.")
+            except Exception as e:
+                log.error(f"❌ Limpieza de subidas expiradas falló: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+upload_reaper = UploadReaper(interval=settings.UPLOAD_SESSION_REAP_SECONDS)
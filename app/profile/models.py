@@ -1,6 +1,7 @@
 # app/profile/models.py
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy import String, Integer, Date, DateTime, func, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
 from app.db.base import Base
 
 class Profile(Base):
@@ -16,6 +17,8 @@ class Profile(Base):
     birth_date: Mapped[Date | None] = mapped_column(Date, nullable=True)
     sex: Mapped[str | None] = mapped_column(String(16), nullable=True)
     avatar: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # 🖼️ variantes WebP del avatar (manifest de app/media/images.py)
+    avatar_variants: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     cover: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
@@ -8,10 +8,13 @@ from app.users import service as svc
 from app.core.security import decode_access_token
 from app.users.repository import get_by_id
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 
 # extras para media y perfil
 from app.media.storage import save_local
+from app.media.images import make_image_variants, variant_urls
 from app.profile.repository import get_by_user_id, create_profile
+from app.feed.cache import post_card_cache
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -93,6 +96,8 @@ async def me_media(
 
     # guarda archivo en /media/avatars/xxxx.ext
     rel_path = save_local(file, subdir="avatars")
+    # versiones WebP chicas: el avatar se pinta a 40px en cada card
+    variants = await run_in_threadpool(make_image_variants, rel_path)
 
     # asegura perfil y actualiza avatar
     prof = await get_by_user_id(db, user_id)
@@ -100,8 +105,16 @@ async def me_media(
         prof = await create_profile(db, user_id)
 
     prof.avatar = rel_path
+    prof.avatar_variants = variants
     await db.flush()
     await db.commit()
     await db.refresh(prof)
 
-    return {"avatar": rel_path, "url": f"/media/{rel_path}"}
+    # los cards del feed llevan el avatar del autor
+    post_card_cache.invalidate_author(user_id)
+
+    return {
+        "avatar": rel_path,
+        "url": f"/media/{rel_path}",
+        "variants": variant_urls(variants),
+    }
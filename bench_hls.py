@@ -0,0 +1,154 @@
+# bench_hls.py
+"""
+Benchmark del ladder HLS: secuencial (3 FFmpeg) vs una sola decodificación.
+
+Uso:
+    python bench_hls.py                 # usa los HLS de ejemplo en media/hls/
+    python bench_hls.py video1.mp4 ...  # o tus propios videos
+    python bench_hls.py --runs 3
+
+Para cada video mide, por modo:
+  - wall: tiempo real (s)
+  - cpu:  segundos de CPU (user + sys) de los procesos FFmpeg hijos
+  - KB:   tamaño del HLS generado
+Los dos modos usan el mismo plan_ladder y los mismos encoders
+(ladder_output_args: CRF + maxrate): solo cambian las decodificaciones.
+Los HLS se generan en una carpeta temporal (no toca media/hls).
+El resultado también se guarda en bench_output.txt.
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from app.core.config import settings
+from app.media import hls
+from app.media.probe import probe, summarize
+
+
+def _children_cpu() -> float:
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+def _sample_sources(tmpdir: str) -> list[str]:
+    """
+    El repo no trae MP4 originales: reconstruimos uno por post a partir de
+    la variante 480p de media/hls/<id>/ (concat sin recodificar).
+    """
+    out = []
+    for vdir in sorted(glob.glob(os.path.join(settings.HLS_DIR, "*", "480p"))):
+        # layout actual (<name>/index.m3u8) o el de los HLS viejos
+        playlist = os.path.join(vdir, "index.m3u8")
+        if not os.path.exists(playlist):
+            playlist = os.path.join(vdir, "480p.m3u8")
+        if not os.path.exists(playlist):
+            continue
+        post = os.path.basename(os.path.dirname(vdir))
+        dst = os.path.join(tmpdir, f"sample_{post}.mp4")
+        proc = subprocess.run(
+            [hls._ffmpeg(), "-y", "-v", "error", "-i", playlist, "-c", "copy", dst],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode == 0:
+            out.append(dst)
+    return out
+
+
+def _duration(src: str) -> float:
+    proc = subprocess.run(
+        [hls._ffmpeg(), "-hide_banner", "-i", src], capture_output=True, text=True
+    )
+    for line in proc.stderr.splitlines():
+        line = line.strip()
+        if line.startswith("Duration:"):
+            h, m, s = line.split(",")[0].split()[1].split(":")
+            return int(h) * 3600 + int(m) * 60 + float(s)
+    return 0.0
+
+
+def _dir_kb(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total // 1024
+
+
+def _run(fn, src: str, key: str, summary: dict | None) -> tuple[float, float, int]:
+    hls.delete_hls(key)
+    cpu0, t0 = _children_cpu(), time.perf_counter()
+    fn(src, key, summary)
+    wall, cpu = time.perf_counter() - t0, _children_cpu() - cpu0
+    size = _dir_kb(hls.hls_abs_dir(key))
+    hls.delete_hls(key)
+    return wall, cpu, size
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("sources", nargs="*")
+    ap.add_argument("--runs", type=int, default=1)
+    ap.add_argument("--out", default="bench_output.txt")
+    args = ap.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_hls_")
+    try:
+        sources = args.sources or _sample_sources(tmpdir)
+        if not sources:
+            sys.exit("No hay videos de ejemplo (media/hls/*/480p) ni se pasaron rutas.")
+
+        # los HLS del benchmark van a la carpeta temporal
+        settings.HLS_DIR = os.path.join(tmpdir, "hls")
+
+        modes = [
+            ("sequential", hls.generate_hls_ladder_sequential),
+            ("single-decode", hls.generate_hls_ladder),
+        ]
+        lines = [
+            f"preset={'veryfast' if settings.HLS_FAST_TRANSCODE else 'medium'} "
+            f"crf={settings.HLS_CRF} seg={settings.HLS_SEG_SECONDS}s "
+            f"runs={args.runs} cpus={os.cpu_count()}",
+            f"{'clip':<22}{'dur(s)':>8}  {'mode':<14}{'wall(s)':>9}{'cpu(s)':>9}{'KB':>9}",
+        ]
+        totals = {name: [0.0, 0.0, 0] for name, _ in modes}
+
+        for src in sources:
+            dur = _duration(src)
+            # el mismo plan (ladder + tune) para los dos modos
+            summary = summarize(probe(src))
+            for name, fn in modes:
+                best = min(
+                    (_run(fn, src, f"bench_{name}", summary) for _ in range(args.runs)),
+                    key=lambda r: r[0],
+                )
+                for i in range(3):
+                    totals[name][i] += best[i]
+                lines.append(
+                    f"{os.path.basename(src):<22}{dur:>8.1f}  {name:<14}"
+                    f"{best[0]:>9.2f}{best[1]:>9.2f}{best[2]:>9}"
+                )
+                print(lines[-1], flush=True)
+
+        seq_w, seq_c, seq_kb = totals["sequential"]
+        one_w, one_c, one_kb = totals["single-decode"]
+        lines.append(
+            f"TOTAL sequential wall={seq_w:.2f}s cpu={seq_c:.2f}s {seq_kb}KB | "
+            f"single-decode wall={one_w:.2f}s cpu={one_c:.2f}s {one_kb}KB | "
+            f"speedup wall x{seq_w / one_w:.2f} cpu x{seq_c / one_c:.2f}"
+        )
+        report = "\n".join(lines) + "\n"
+        print(lines[-1])
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(report)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()